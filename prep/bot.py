@@ -1,17 +1,24 @@
 import re
 import os
+import time
 import uuid
 import logging
+import functools
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
-from main import process_video
+from main import download_video, process_downloaded
+from prepare_files.prepare_files import probe_duration
+from bot_scheduler import FairScheduler, SchedulerError
 from dotenv import load_dotenv
 load_dotenv()
 USER_FOLDER = os.getenv("USER_FOLDER")
 from rag_llm.llm_client import LLMClient
+from rag_llm.query_scope import parse_scoped_query
+from rag_llm.ollama_pool import get_pool
 from telegram.helpers import escape_markdown
 import asyncio
-processing_lock = asyncio.Lock()
+# Администраторы (id или username через запятую) — им доступны /queue и /jobs
+BOT_ADMINS = {item.strip().lstrip("@") for item in (os.getenv("BOT_ADMINS") or "").split(",") if item.strip()}
 
 
 # Логирование
@@ -39,10 +46,24 @@ def generate_user_folder(user):
 
 
 llm_client = LLMClient()
+# Очередь задач: лимиты на пользователя и справедливое деление воркеров между видео и вопросами
+scheduler = FairScheduler.from_env()
+
+
+def is_admin(user):
+    return str(user.id) in BOT_ADMINS or (user.username or "") in BOT_ADMINS
+
+
+def format_duration(seconds):
+    seconds = int(seconds or 0)
+    return f"{seconds // 60} мин {seconds % 60} с" if seconds >= 60 else f"{seconds} с"
 
 # Обработчик команды /start
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("Привет! Пришли мне ссылку на видео или запрос, начинающийся с '$'.")
+    await update.message.reply_text(
+        "Привет! Пришли мне ссылку на видео (можно с тегами: ссылка #1с #проводки) или запрос, начинающийся с '$'.\n"
+        "Область поиска: $[video:название] вопрос, $[date:2025-03] вопрос, $[tag:проводки] вопрос, $[mine] вопрос."
+    )
 
 # Обработчик сообщений
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -50,13 +71,21 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text.strip()
 
     if text.startswith('$'):
-        query = text[1:].strip()
+        # Префиксы области поиска ([video:...], [date:...], [mine] ...) уходят в фильтр Chroma
+        query, scope = parse_scoped_query(text[1:].strip(), user_id=user.id)
         return_with_sources = True  # параметр для включения возврата источников в ответе
         try:
-            response = llm_client.generate_with_retrieval(
-                question = query,
-                return_with_sources = return_with_sources,
-                mode = "assistant"
+            # LLM вызывается в потоке планировщика: бот не блокируется, вопросы не обгоняют лимит
+            response = await scheduler.run(
+                user.id, "question",
+                functools.partial(
+                    llm_client.generate_with_retrieval,
+                    question = query,
+                    return_with_sources = return_with_sources,
+                    mode = "assistant",
+                    scope = scope
+                ),
+                label = query[:60],
             )
             if return_with_sources:
                 answer_text = escape_markdown(response.get("answer", "Извините, я не смог сформировать ответ"), version=2)
@@ -82,6 +111,8 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 answer_text = response if isinstance(response, str) else "Извините, я не смог сформировать ответ"
                 logging.info(f"Ответ пользователю {user.id} {answer_text}")
                 await update.message.reply_text(answer_text)
+        except SchedulerError as e:
+            await update.message.reply_text(str(e))
         except Exception as e:
             logging.error(f"Ошибка при генерации ответа LLM для пользователя {user.id}: {e}")
             await update.message.reply_text("Произошла ошибка при обработке вашего запроса.")
@@ -91,36 +122,109 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Это не похоже на ссылку. Пожалуйста, пришли корректную ссылку на видео.")
         return
 
-    await update.message.reply_text("Начинаю обработку видео. Это может занять несколько минут...")
+    # Ссылка и теги темы: "https://... #1с #проводки"
+    url, *rest = text.split()
+    tags = [word.lstrip("#") for word in rest if word.startswith("#") and len(word) > 1]
+
+    def download():
+        # Папка создаётся, только когда задача принята и дошла очередь
+        return download_video(url, generate_user_folder(user))
+
+    try:
+        job = scheduler.submit(user.id, "download", download, label = url)
+    except SchedulerError as e:
+        await update.message.reply_text(str(e))
+        return
+
+    position = scheduler.position(job)
+    if position:
+        await update.message.reply_text(f"Ссылка принята, в очереди на скачивание: {position}-я.")
+    else:
+        await update.message.reply_text("Начинаю обработку видео. Это может занять несколько минут...")
+
+    loop = asyncio.get_running_loop()
 
-    # Генерируем папку для пользователя
-    folder = generate_user_folder(user)
+    def progress(message):
+        # Вызывается из рабочего потока конвейера — отправляем сообщение через цикл бота
+        asyncio.run_coroutine_threadsafe(update.message.reply_text(message), loop)
 
     try:
-        # Передаём ссылку и папку в обработку
-        docx_path = process_video(text, folder)
-
-        # Извлекаем имя файла из полного пути
-        filename = os.path.basename(docx_path)
-        
-        with open(docx_path, 'rb') as docx_file:
-            await update.message.reply_document(
-                document=docx_file,
-                filename=filename  # используем извлечённое имя файла
+        saved_path = await job.future
+
+        # Длительность по ffprobe — оценка стоимости: короткие записи обрабатываются раньше
+        duration = await asyncio.to_thread(probe_duration, saved_path)
+        job = scheduler.submit(
+            user.id, "video", functools.partial(process_downloaded, as_stream = True),
+            saved_path, url, progress, user.id, tags,
+            cost = duration, label = os.path.basename(saved_path), limited = False,
+        )
+        position = scheduler.position(job)
+        if position:
+            await update.message.reply_text(
+                f"Файл скачан ({format_duration(duration)}), в очереди на обработку: {position}-й."
             )
+        # Документ собран в памяти — отправляем поток, без записи в папку пользователя
+        docx_stream = await job.future
+
+        await update.message.reply_document(
+            document=docx_stream,
+            filename=docx_stream.name
+        )
 
     except Exception as e:
         logging.error(f"Ошибка при обработке видео для пользователя {user.id}: {e}")
         await update.message.reply_text("Произошла ошибка при обработке видео.")
 
+# /queue — глубина очередей по классам (только для администраторов)
+async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.message.from_user):
+        await update.message.reply_text("Команда доступна только администраторам.")
+        return
+    snap = scheduler.snapshot()
+    lines = [f"Воркеры заняты: {snap['running']} из {snap['workers']}"]
+    for kind, info in snap["classes"].items():
+        lines.append(
+            f"{kind}: ждут {info['waiting']}, выполняются {info['running']} из {info['concurrency']}, вес {info['weight']:g}"
+        )
+    stats = snap["stats"]
+    lines.append(
+        f"Принято {stats['submitted']}, готово {stats['completed']}, ошибок {stats['failed']}, "
+        f"отклонено по лимиту {stats['rate_limited']}, по очереди {stats['queue_full']}"
+    )
+    await update.message.reply_text("\n".join(lines))
+
+# /jobs — выполняющиеся и ожидающие задачи (только для администраторов)
+async def jobs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.message.from_user):
+        await update.message.reply_text("Команда доступна только администраторам.")
+        return
+    running, waiting = scheduler.jobs()
+    now = time.monotonic()
+    lines = ["Выполняются:"]
+    lines += [
+        f"#{j.id} {j.kind} · {j.user_id} · {format_duration(now - j.started)} · {j.label}" for j in running
+    ] or ["—"]
+    lines.append(f"Ожидают ({len(waiting)}):")
+    lines += [
+        f"#{j.id} {j.kind} · {j.user_id} · ждёт {format_duration(now - j.submitted)} · оценка {format_duration(j.cost)} · {j.label}"
+        for j in waiting[:15]
+    ] or ["—"]
+    await update.message.reply_text("\n".join(lines))
+
 # Запуск бота
 def run_bot():
     BOT_TOKEN = os.getenv("BOT_TOKEN")
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    # concurrent_updates: обработчики не ждут друг друга, порядок работы задаёт планировщик
+    app = ApplicationBuilder().token(BOT_TOKEN).concurrent_updates(True).build()
 
     app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("queue", queue_command))
+    app.add_handler(CommandHandler("jobs", jobs_command))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
+    # Модель Ollama загружается заранее, в фоне: первый вопрос не ждёт её загрузки
+    get_pool().warm_up()
+
     print("Бот запущен...")
     app.run_polling()
 
@@ -0,0 +1,266 @@
+"""
+Планировщик задач бота: между handle_message и конвейером / LLM.
+
+  • лимиты на пользователя — token bucket на класс работы (ссылки в час, вопросы в минуту)
+    и не больше MAX_PENDING_PER_USER задач в очереди и в работе одновременно;
+  • классы работы — question, download, video — со своим лимитом параллельности
+    и весом; общий лимит воркеров делится между классами взвешенно-справедливо
+    (start-time fair queuing по оценке стоимости задачи): поток вопросов не
+    блокирует видео, а видео не заставляют вопросы ждать по полчаса;
+  • внутри класса — сначала задачи пользователей, у которых ничего не выполняется,
+    затем короткие (стоимость видео — длительность по ffprobe); ожидание постепенно
+    поднимает приоритет, чтобы длинные записи не ждали бесконечно.
+
+Задачи — обычные синхронные функции, выполняются в потоках (asyncio.to_thread);
+сам планировщик работает в цикле событий бота и потокобезопасности не требует.
+"""
+import asyncio
+import itertools
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class SchedulerError(Exception):
+    pass
+
+
+KIND_NAMES = {"question": "вопросов", "download": "ссылок", "video": "записей"}
+
+
+class RateLimited(SchedulerError):
+    def __init__(self, kind: str, retry_after: float) -> None:
+        super().__init__(f"Слишком много {KIND_NAMES.get(kind, kind)} подряд, повторите через {int(retry_after) + 1} с")
+        self.kind = kind
+        self.retry_after = retry_after
+
+
+class QueueFull(SchedulerError):
+    def __init__(self, limit: int) -> None:
+        super().__init__(f"У вас уже {limit} задач в очереди, дождитесь их завершения")
+        self.limit = limit
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше burst про запас."""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, n: float = 1.0) -> Tuple[bool, float]:
+        """(взят ли токен, через сколько секунд появится нужное количество)."""
+        self._refill()
+        if self.tokens >= n:
+            self.tokens -= n
+            return True, 0.0
+        return False, (n - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+@dataclass
+class WorkClass:
+    weight: float                       # доля общих воркеров при конкуренции
+    concurrency: int                    # не больше задач класса одновременно
+    default_cost: float                 # оценка стоимости (секунды работы), если не передана
+    rate_per_second: float = 0.0        # лимит на пользователя; 0 — без лимита
+    burst: float = 1.0
+
+
+@dataclass
+class Job:
+    id: int
+    user_id: Any
+    kind: str
+    label: str
+    cost: float
+    func: Callable[..., Any]
+    args: Tuple[Any, ...]
+    future: "asyncio.Future"
+    submitted: float = field(default_factory=time.monotonic)
+    started: Optional[float] = None
+
+
+class FairScheduler:
+    AGING_SECONDS = 600.0     # за столько ожидания оценка стоимости уменьшается вдвое
+
+    def __init__(
+        self,
+        classes: Dict[str, WorkClass],
+        workers: int = 3,
+        max_pending_per_user: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.classes = classes
+        self.workers = workers
+        self.max_pending_per_user = max_pending_per_user
+        self._clock = clock
+        self._waiting: Dict[str, List[Job]] = {kind: [] for kind in classes}
+        self._running: Dict[int, Job] = {}
+        self._buckets: Dict[Tuple[Any, str], TokenBucket] = {}
+        self._finish: Dict[str, float] = {kind: 0.0 for kind in classes}   # виртуальное время окончания класса
+        self._vtime = 0.0
+        self._ids = itertools.count(1)
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "rate_limited": 0, "queue_full": 0}
+
+    @classmethod
+    def from_env(cls) -> "FairScheduler":
+        env = lambda key, default: float(os.getenv(key) or default)
+        classes = {
+            # вопросы короткие и частые — большой вес, чтобы не стояли за видео
+            "question": WorkClass(weight=env("QUESTION_WEIGHT", 4), concurrency=int(env("QUESTION_CONCURRENCY", 2)),
+                                  default_cost=15, rate_per_second=env("RATE_QUESTIONS_PER_MIN", 6) / 60, burst=5),
+            # новые ссылки: лимит на пользователя считается здесь, на скачивании
+            "download": WorkClass(weight=2, concurrency=2, default_cost=60,
+                                  rate_per_second=env("RATE_VIDEOS_PER_HOUR", 6) / 3600, burst=3),
+            # обработка скачанного файла (GPU): стоимость — длительность записи
+            "video": WorkClass(weight=1, concurrency=int(env("VIDEO_CONCURRENCY", 1)), default_cost=1800),
+        }
+        return cls(classes, workers=int(env("SCHED_WORKERS", 3)), max_pending_per_user=int(env("MAX_PENDING_PER_USER", 3)))
+
+    # -----------------------
+    # ПОСТАНОВКА В ОЧЕРЕДЬ
+    # -----------------------
+    def _pending_of(self, user_id: Any) -> int:
+        waiting = sum(1 for jobs in self._waiting.values() for j in jobs if j.user_id == user_id)
+        return waiting + sum(1 for j in self._running.values() if j.user_id == user_id)
+
+    def submit(
+        self,
+        user_id: Any,
+        kind: str,
+        func: Callable[..., Any],
+        *args: Any,
+        cost: Optional[float] = None,
+        label: str = "",
+        limited: bool = True,
+    ) -> Job:
+        """
+        Ставит задачу в очередь; результат — await job.future.
+        limited=False — продолжение уже принятой задачи (без лимитов пользователя).
+        """
+        work = self.classes[kind]
+        if limited:
+            if self._pending_of(user_id) >= self.max_pending_per_user:
+                self.stats["queue_full"] += 1
+                raise QueueFull(self.max_pending_per_user)
+            if work.rate_per_second > 0:
+                bucket = self._buckets.get((user_id, kind))
+                if bucket is None:
+                    bucket = self._buckets[(user_id, kind)] = TokenBucket(work.rate_per_second, work.burst, self._clock)
+                ok, retry_after = bucket.try_take()
+                if not ok:
+                    self.stats["rate_limited"] += 1
+                    raise RateLimited(kind, retry_after)
+
+        job = Job(
+            id=next(self._ids), user_id=user_id, kind=kind, label=label,
+            cost=float(cost if cost is not None else work.default_cost),
+            func=func, args=args, future=asyncio.get_running_loop().create_future(),
+            submitted=self._clock(),
+        )
+        self._waiting[kind].append(job)
+        self.stats["submitted"] += 1
+        self._dispatch()
+        return job
+
+    async def run(self, user_id: Any, kind: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await self.submit(user_id, kind, func, *args, **kwargs).future
+
+    # -----------------------
+    # ВЫБОР СЛЕДУЮЩЕЙ ЗАДАЧИ
+    # -----------------------
+    def _running_count(self, kind: Optional[str] = None, user_id: Any = None) -> int:
+        return sum(
+            1 for j in self._running.values()
+            if (kind is None or j.kind == kind) and (user_id is None or j.user_id == user_id)
+        )
+
+    def _priority(self, job: Job, now: float) -> Tuple[int, float, int]:
+        aged_cost = job.cost / (1.0 + (now - job.submitted) / self.AGING_SECONDS)
+        return self._running_count(user_id=job.user_id), aged_cost, job.id
+
+    def _next(self) -> Optional[Job]:
+        best_kind, best_start = None, None
+        for kind, jobs in self._waiting.items():
+            work = self.classes[kind]
+            if not jobs or self._running_count(kind) >= work.concurrency:
+                continue
+            start = max(self._vtime, self._finish[kind])
+            if best_start is None or start < best_start:
+                best_kind, best_start = kind, start
+        if best_kind is None:
+            return None
+
+        now = self._clock()
+        jobs = self._waiting[best_kind]
+        job = min(jobs, key=lambda j: self._priority(j, now))
+        jobs.remove(job)
+        self._finish[best_kind] = best_start + job.cost / self.classes[best_kind].weight
+        self._vtime = best_start
+        return job
+
+    def _dispatch(self) -> None:
+        while len(self._running) < self.workers:
+            job = self._next()
+            if job is None:
+                return
+            job.started = self._clock()
+            self._running[job.id] = job
+            asyncio.get_running_loop().create_task(self._execute(job))
+
+    async def _execute(self, job: Job) -> None:
+        try:
+            result = await asyncio.to_thread(job.func, *job.args)
+        except Exception as e:
+            self.stats["failed"] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.stats["completed"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._running.pop(job.id, None)
+            self._dispatch()
+
+    # -----------------------
+    # СОСТОЯНИЕ (для /queue и /jobs)
+    # -----------------------
+    def position(self, job: Job) -> int:
+        """Место задачи в очереди своего класса (0 — уже выполняется)."""
+        if job.started is not None:
+            return 0
+        now = self._clock()
+        ordered = sorted(self._waiting[job.kind], key=lambda j: self._priority(j, now))
+        return ordered.index(job) + 1 if job in ordered else 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": len(self._running),
+            "classes": {
+                kind: {
+                    "waiting": len(self._waiting[kind]),
+                    "running": self._running_count(kind),
+                    "concurrency": work.concurrency,
+                    "weight": work.weight,
+                }
+                for kind, work in self.classes.items()
+            },
+            "stats": dict(self.stats),
+        }
+
+    def jobs(self) -> Tuple[List[Job], List[Job]]:
+        """(выполняются, ждут) — ждущие в порядке выбора внутри класса."""
+        now = self._clock()
+        waiting = [j for jobs in self._waiting.values() for j in sorted(jobs, key=lambda j: self._priority(j, now))]
+        return sorted(self._running.values(), key=lambda j: j.started or 0.0), waiting
@@ -0,0 +1,71 @@
+"""
+Бенчмарк дедупликации скриншотов: размер DOCX и время сохранения до и после.
+Кадры вставляются в заданном порядке (как после абзацев); «до» — исходные файлы
+как есть, «после» — через FrameDeduper.
+
+Пример (из каталога prep):
+    python -m create_file.bench_frame_dedupe --frames "out/screenshot_*.png"
+"""
+import argparse
+import glob
+import io
+import os
+import tempfile
+import time
+
+from docx import Document
+from docx.shared import Mm
+
+from create_file.frame_dedupe import FrameDeduper
+
+
+def build(frames, deduper=None):
+    doc = Document()
+    inserted = 0
+    t0 = time.perf_counter()
+    for i, path in enumerate(frames, start=1):
+        doc.add_paragraph(f"\tАбзац {i}")
+        if deduper is not None:
+            data = deduper.add(path)
+            if data is None:
+                continue
+            path = io.BytesIO(data)
+        doc.add_picture(path, width=Mm(165))
+        inserted += 1
+    build_seconds = time.perf_counter() - t0
+    out = tempfile.NamedTemporaryFile(suffix=".docx", delete=False).name
+    t0 = time.perf_counter()
+    doc.save(out)
+    save_seconds = time.perf_counter() - t0
+    size = os.path.getsize(out)
+    os.remove(out)
+    return inserted, size, build_seconds, save_seconds
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", nargs="+", required=True, help="Файлы кадров (можно маской), в порядке вставки")
+    ap.add_argument("--threshold", type=int, default=None)
+    ap.add_argument("--drop-consecutive", action="store_true", help="Повторы подряд не вставлять (режим skip)")
+    args = ap.parse_args(argv)
+
+    frames = [p for pattern in args.frames for p in sorted(glob.glob(pattern))]
+    if not frames:
+        raise SystemExit("Нет кадров")
+
+    for label, deduper in [
+        ("как есть", None),
+        ("дедупликация", FrameDeduper(
+            **({} if args.threshold is None else {"threshold": args.threshold}),
+            drop_consecutive=args.drop_consecutive,
+        )),
+    ]:
+        inserted, size, build_seconds, save_seconds = build(frames, deduper)
+        print(f"{label:14s} картинок {inserted:3d} | DOCX {size / 1e6:7.2f} МБ | "
+              f"подготовка {build_seconds:6.2f} с | сохранение {save_seconds:6.2f} с")
+        if deduper is not None:
+            print("  " + deduper.report())
+
+
+if __name__ == "__main__":
+    main()
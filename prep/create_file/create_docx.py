@@ -4,15 +4,20 @@ from docx import Document
 from docx.shared import Mm
 import os
 import sys
-import json
 import re
+import io
+import time
 
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
-URL_LLM = os.getenv("URL_LLM")
-USER_LLM = os.getenv("USER_LLM")
-PASSWORD_LLM = os.getenv("PASSWORD_LLM") 
 MODEL = os.getenv("MODEL")
+# Подписи BLIP к кадрам документа (в alt-текст картинки) и бюджет времени на все кадры
+DOCX_CAPTIONS = os.getenv("DOCX_CAPTIONS")
+CAPTION_TIME_BUDGET = float(os.getenv("CAPTION_TIME_BUDGET") or 120)
+# Выбор скриншотов: scenes — по смене экрана (LLM только для неясных случаев), llm — LLM на каждый абзац
+DOCX_SCREENSHOTS = os.getenv("DOCX_SCREENSHOTS") or "scenes"
+# Повторы экрана: reuse — вставлять ту же картинку (без роста DOCX), skip — подряд идущий повтор не вставлять, off — как есть
+DOCX_DEDUPE = os.getenv("DOCX_DEDUPE") or "reuse"
 
 # Добавляем родительский каталог в пути поиска модулей
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -23,18 +28,19 @@ sys.path.insert(0, parent_dir)
 from text_to_paragraphs.text_to_paragraphs import text_to_paragraphs
 from picture_description.picture_description import picture_description
 from text_modifier.text_modifier import TextModify
+from transcription_audio.transcript_io import iter_segments
+from create_file.scene_detection import detect_scene_changes, select_screenshots
+from create_file.frame_dedupe import FrameDeduper, decode_image, encode_for_display
 
-# === LLM для разбиения на разделы ===
-from langchain_ollama import OllamaLLM
-import base64
-
-encoded_credentials = base64.b64encode(f"{USER_LLM}:{PASSWORD_LLM}".encode()).decode()
-headers = {'Authorization': f'Basic {encoded_credentials}'}
+# === LLM: общий клиент Ollama (пул соединений, keep_alive, лимиты параллельности) ===
+# Вход шагов документа полностью задан транскриптом — ответы кешируются (LLM_CACHE)
+from rag_llm.ollama_pool import get_llm
+from rag_llm.llm_cache import get_cache
 
 
 def image_is_required(paragraph):
 
-    llm = OllamaLLM(model=MODEL, temperature=0.1, base_url=URL_LLM, client_kwargs={'headers': headers})
+    llm = get_llm(MODEL, temperature=0.1, cache=True)
     # prompt = "Тебе необходимо определить требует ли текст добавления картинки. " \
     # "Необходимо ориентироваться на слова (или их аналоги, догадывайся по смыслу): показать, отбор, перейти, посмотрите, сейчас на экране, открыть, выберем, нажмем, нажать .  " \
     # "Если нужна картинка ответь 1 если не нужна ответь 0. Только результат без пояснений. " \
@@ -59,14 +65,16 @@ def image_is_required(paragraph):
         
     return response
 
-def table_segments_time(json_file_path):
-    with open(json_file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    rows = []
+def iter_table_segments_time(json_file_path):
+    """
+    Разбивает сегменты транскрипта на предложения: (предложение, end сегмента).
+    Принимает JSON из Transcription.save_json, JSON Lines или .tsb (TranscriptStore);
+    для .jsonl и .tsb работает потоково, не держа транскрипт в памяти.
+    """
     buffer = ""  # сюда складываем "висящее" начало предложения
+    seg = None
 
-    for i, seg in enumerate(data.get("segments", [])):
+    for i, seg in enumerate(iter_segments(json_file_path, with_words=False)):
         text = seg["text"].strip()
 
         # добавляем "хвост" из предыдущего сегмента, если он был
@@ -89,13 +97,15 @@ def table_segments_time(json_file_path):
             if sent:
                 if not sent.endswith((".", "!", "?")):
                     sent += "."
-                rows.append((sent, seg["end"]))
+                yield (sent, seg["end"])
 
     # на всякий случай — если файл закончился, а buffer остался
     if buffer:
-        rows.append((buffer, data["segments"][-1]["end"]))
+        yield (buffer, seg["end"])
+
 
-    return rows
+def table_segments_time(json_file_path):
+    return list(iter_table_segments_time(json_file_path))
 
 def get_sections_from_llm(paragraphs, max_paragraphs_per_chunk=20):
     """
@@ -108,7 +118,7 @@ def get_sections_from_llm(paragraphs, max_paragraphs_per_chunk=20):
       - или до конца текста, если это последний раздел.
     Это гарантирует, что все абзацы будут включены без пропусков.
     """
-    llm = OllamaLLM(model=MODEL, temperature=0.1, base_url=URL_LLM, client_kwargs={'headers': headers})
+    llm = get_llm(MODEL, temperature=0.1, cache=True)
 
     # Собираем все найденные точки начала разделов: {номер_абзаца: название}
     section_starts = {}
@@ -227,7 +237,50 @@ class create_docx:
         self.video_path = video_path
         self.UseTextModify = UseTextModify
 
-    def get_docx(self):
+    def screenshot_times(self, paragraphs_table):
+        """
+        {номер абзаца: секунда кадра}. По умолчанию — по сменам экрана в видео,
+        LLM спрашивается только для абзацев со слабыми сменами; при ошибке анализа
+        видео или DOCX_SCREENSHOTS=llm — LLM для каждого абзаца.
+        """
+        if DOCX_SCREENSHOTS != "llm":
+            try:
+                changes = detect_scene_changes(self.video_path)
+            except Exception as e:
+                print(f"Не удалось найти смены экрана ({e}), выбираем скриншоты через LLM.")
+            else:
+                selected, stats = select_screenshots(
+                    [end_time for _, end_time in paragraphs_table],
+                    changes,
+                    is_required=lambda idx: '1' in str(image_is_required(paragraphs_table[idx - 1][0])),
+                )
+                print(f"Смен экрана: {len(changes)}. Скриншоты: по смене {stats['scene']}, "
+                      f"по решению LLM {stats['llm']}, не нужны {stats['skipped']}.")
+                return selected
+
+        paragraphs_time_scr = {}
+        for idx, row in enumerate(paragraphs_table, start=1):
+            paragraph, end_time = row  # ("текст", end)
+
+            image_is_required_result = image_is_required(paragraph)
+
+            #if image_is_required_result == "1\n" or image_is_required_result == "1" or image_is_required_result == 1:
+            if '1' in str(image_is_required_result):
+                # Проверяем, есть ли уже такой end_time в словаре
+                existing_keys = [k for k, v in paragraphs_time_scr.items() if v == end_time]
+
+                if existing_keys:
+                    # Если уже есть, удаляем старый ключ и вставляем новый
+                    old_key = existing_keys[0]
+                    del paragraphs_time_scr[old_key]
+                    paragraphs_time_scr[idx] = end_time
+                else:
+                    # Если нет — добавляем
+                    paragraphs_time_scr[idx] = end_time
+
+        return paragraphs_time_scr
+
+    def _build(self):
         json_file_path = self.json_file_path
         UseTextModify = self.UseTextModify
 
@@ -235,10 +288,6 @@ class create_docx:
             raise FileNotFoundError(f"Файл {json_file_path} не найден.")
 
         doc = Document()
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-
-        full_text = data.get('full_text', '')
 
         # === Шаг 1: Поиск "сейчас на экране" в segments ===
         # table_time_screen = []
@@ -260,37 +309,21 @@ class create_docx:
         # === Шаг 2: Разбиваем текст на абзацы ===
         
         #1
-        segments_time = table_segments_time(json_file_path)
-        class_text_to_paragraphs = text_to_paragraphs(full_text, segments_time)
-        paragraphs_table = class_text_to_paragraphs.get_text_to_paragraphs_table()        
+        # Предложения читаются потоково, абзацы считаются окнами — память не растёт с длиной записи
+        class_text_to_paragraphs = text_to_paragraphs("", iter_table_segments_time(json_file_path))
+        paragraphs_table = class_text_to_paragraphs.get_text_to_paragraphs_table()
         paragraphs = [p[0] for p in paragraphs_table]
 
+        # Скриншоты нужны, только если есть видео
         paragraphs_time_scr = {}
-
-        for idx, row in enumerate(paragraphs_table, start=1):
-            paragraph, end_time = row  # ("текст", end)
-
-            image_is_required_result = image_is_required(paragraph)
-
-            #if image_is_required_result == "1\n" or image_is_required_result == "1" or image_is_required_result == 1:
-            if '1' in str(image_is_required_result):
-                # Проверяем, есть ли уже такой end_time в словаре
-                existing_keys = [k for k, v in paragraphs_time_scr.items() if v == end_time]
-
-                if existing_keys:
-                    # Если уже есть, удаляем старый ключ и вставляем новый
-                    old_key = existing_keys[0]
-                    del paragraphs_time_scr[old_key]
-                    paragraphs_time_scr[idx] = end_time
-                else:
-                    # Если нет — добавляем
-                    paragraphs_time_scr[idx] = end_time
+        if self.video_path != "" and os.path.isfile(self.video_path):
+            paragraphs_time_scr = self.screenshot_times(paragraphs_table)
 
         if UseTextModify==True:
             print("Проводим улучшение текста...")
+            # Абзацы правятся параллельно, уже поправленные берутся из кеша
             text_modifier = TextModify()
-            for i in range(len(paragraphs)):
-                paragraphs[i] = text_modifier.improve_text(paragraphs[i])
+            paragraphs = text_modifier.improve_texts(paragraphs)
             
 
         # === Шаг 3: LLM разбивает на разделы (сохраняем оригинальные абзацы) ===
@@ -317,6 +350,20 @@ class create_docx:
         # === Шаг 4: Формируем документ с разделами и картинками ===
         video_path = self.video_path
         current_paragraph_index = 0  # Считаем, сколько абзацев текста уже вставлено
+        inserted_pictures = []  # (картинка в документе, её байты) — для подписей одним батчем
+        # Почти одинаковые кадры — один раз, пережатые под ширину показа
+        deduper = FrameDeduper(drop_consecutive=DOCX_DEDUPE == "skip") if DOCX_DEDUPE != "off" else None
+
+        def add_frame(frame):
+            # Кадр кодируется один раз (cv2.imencode) и идёт в документ из памяти
+            if deduper is not None:
+                data = deduper.add(frame)
+                if data is None:
+                    return
+            else:
+                data, _ = encode_for_display(frame, frame.shape[1])
+            picture = doc.add_picture(io.BytesIO(data), width=Mm(165))
+            inserted_pictures.append((picture, data))
 
         if video_path != "" and os.path.isfile(video_path):
             class_picture_description = picture_description()
@@ -338,47 +385,41 @@ class create_docx:
                             # Проверяем, нужно ли вставить картинку ПОСЛЕ этого абзаца
                             if current_paragraph_index in paragraphs_time_scr:
                                 time_screen = paragraphs_time_scr[current_paragraph_index]
+                                # Доли секунды сохраняем: кадр по смене экрана берётся сразу после перехода
                                 total_seconds = int(time_screen)
                                 hours = total_seconds // 3600
                                 minutes = (total_seconds % 3600) // 60
-                                seconds = total_seconds % 60
-                                formatted_time = f"{hours:02}:{minutes:02}:{seconds:02}"
-                                frame_at_time = class_picture_description.save_frame_at_time(
-                                    video_path, formatted_time
-                                )
-                                doc.add_picture(frame_at_time, width=Mm(165))
+                                seconds = total_seconds % 60 + (time_screen - total_seconds)
+                                formatted_time = f"{hours:02}:{minutes:02}:{seconds:06.3f}"
+                                frame_at_time = class_picture_description.grab_frame_at_time(video_path, formatted_time)
+                                if frame_at_time is not None:
+                                    add_frame(frame_at_time)
 
             # --- Режим B: Нет упоминаний — равномерные кадры ---
             else:
                 print("Нет упоминаний. Добавляем 5 равномерных кадров.")
                 try:
-                    total_duration = data['segments'][-1]['end']
+                    total_duration = paragraphs_table[-1][1]
                 except (IndexError, KeyError, TypeError):
                     raise ValueError("Не удалось определить длительность видео.")
 
                 time_stamps = [total_duration * i / 6 for i in range(1, 6)]
-                frame_paths = []
-                import uuid
-                import shutil
+                frames = []  # кадры в памяти (BGR)
 
-                base_temp_name = "frame.jpg"
-                video_dir = os.path.dirname(video_path)
                 for i, t in enumerate(time_stamps):
                     total_seconds = int(t)
                     hours = total_seconds // 3600
                     minutes = (total_seconds % 3600) // 60
                     seconds = total_seconds % 60
                     formatted_time = f"{hours:02}:{minutes:02}:{seconds:02}"
-                    temp_frame = class_picture_description.save_frame_at_time(video_path, formatted_time)
-                    unique_path = f"temp_frame_{i}_{uuid.uuid4().hex[:8]}.jpg"
-                    output_path = os.path.join(video_dir, unique_path)
-                    shutil.copy(temp_frame, output_path)
-                    frame_paths.append(output_path)
+                    frame = class_picture_description.grab_frame_at_time(video_path, formatted_time)
+                    if frame is not None:
+                        frames.append(frame)
 
                 # Определяем, после каких **общих** абзацев вставлять картинки
                 total_paragraphs = len(paragraphs)
                 image_positions = []
-                num_images = len(frame_paths)
+                num_images = len(frames)
                 for i in range(1, num_images + 1):
                     pos = int(round((i / (num_images + 1)) * total_paragraphs))
                     pos = max(1, min(pos, total_paragraphs))
@@ -395,7 +436,19 @@ class create_docx:
 
                             if current_paragraph_index in image_positions:
                                 img_idx = image_positions.index(current_paragraph_index)
-                                doc.add_picture(frame_paths[img_idx], width=Mm(165))
+                                add_frame(frames[img_idx])
+
+            if DOCX_CAPTIONS == "True" and inserted_pictures:
+                # Все кадры документа — батчами за один вызов, модель BLIP грузится один раз;
+                # повторно вставленный экран (те же байты) подписывается один раз
+                unique = list({id(data): data for _, data in inserted_pictures}.values())
+                captions = dict(zip(map(id, unique), class_picture_description.get_picture_descriptions(
+                    [decode_image(data) for data in unique], time_budget=CAPTION_TIME_BUDGET
+                )))
+                for picture, data in inserted_pictures:
+                    caption = captions.get(id(data))
+                    if caption:
+                        picture._inline.docPr.set("descr", caption)
 
         else:
             # Режим C: Только текст
@@ -406,8 +459,47 @@ class create_docx:
                         para_text = paragraphs[par_num - 1]
                         doc.add_paragraph('\t' + para_text)
 
-        # === Шаг 5: Сохранение ===
-        docx_file_path = os.path.splitext(json_file_path)[0] + '.docx'
-        doc.save(docx_file_path)
-        print(f"Документ с разделами сохранён: {docx_file_path}")
-        return docx_file_path
\ No newline at end of file
+        return doc, deduper
+
+    def _save(self, doc, deduper, target):
+        """Сохраняет в путь или поток и печатает размер и время сохранения."""
+        save_started = time.perf_counter()
+        doc.save(target)
+        save_seconds = time.perf_counter() - save_started
+        docx_size = target.getbuffer().nbytes if isinstance(target, io.BytesIO) else os.path.getsize(target)
+        if deduper is not None and deduper.stats.frames:
+            stats = deduper.stats
+            # Без дедупликации каждый кадр встраивался бы целиком
+            estimated = docx_size - stats.bytes_out + stats.bytes_in
+            print(deduper.report())
+            print(f"DOCX: {docx_size / 1e6:.1f} МБ (без дедупликации ≈ {estimated / 1e6:.1f} МБ), "
+                  f"сохранение {save_seconds:.2f} с")
+        else:
+            print(f"DOCX: {docx_size / 1e6:.1f} МБ, сохранение {save_seconds:.2f} с")
+        llm_cache = get_cache()
+        if llm_cache is not None:
+            print(llm_cache.report())
+
+    @property
+    def docx_file_path(self):
+        return os.path.splitext(self.json_file_path)[0] + '.docx'
+
+    def get_docx(self):
+        """Собирает документ и сохраняет его рядом с транскриптом; возвращает путь."""
+        doc, deduper = self._build()
+        self._save(doc, deduper, self.docx_file_path)
+        print(f"Документ с разделами сохранён: {self.docx_file_path}")
+        return self.docx_file_path
+
+    def get_docx_stream(self):
+        """
+        Собирает документ в памяти: BytesIO (позиция в начале, name — имя файла)
+        для отправки ботом без записи в папку пользователя.
+        """
+        doc, deduper = self._build()
+        buffer = io.BytesIO()
+        self._save(doc, deduper, buffer)
+        buffer.name = os.path.basename(self.docx_file_path)
+        buffer.seek(0)
+        print(f"Документ с разделами собран в памяти: {buffer.name}")
+        return buffer
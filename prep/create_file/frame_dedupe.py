@@ -0,0 +1,137 @@
+"""
+Дедупликация и пережатие скриншотов перед вставкой в DOCX.
+
+Кадр уменьшается до ширины, с которой он показывается в документе (165 мм при
+DPI точек на дюйм), и кодируется в PNG или JPEG — что меньше (PNG предпочтительнее
+для интерфейса: чёткий текст без артефактов). По уменьшенному кадру считается
+dHash; кадр, отличающийся от уже вставленного не больше чем на THRESHOLD бит,
+считается тем же экраном:
+  • вставляются те же байты, что и в первый раз: python-docx по SHA-1
+    содержимого переиспользует уже встроенную картинку, размер DOCX не растёт;
+  • с drop_consecutive=True повтор подряд за тем же экраном не вставляется вовсе.
+Кадры принимаются массивами (BGR) и возвращаются закодированными байтами —
+на диск ничего не пишется.
+"""
+import os
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+HASH_SIZE = 16          # dHash 16x16 = 256 бит: мелкие различия форм 1С различимы
+THRESHOLD = 12          # расстояние Хэмминга, бит, до которого кадры считаются одинаковыми
+DISPLAY_WIDTH_MM = 165
+DPI = 150
+JPEG_QUALITY = 85
+PNG_COMPRESSION = 3     # 9 даёт на ~7% меньше, но в 15 раз медленнее
+PNG_PREFERENCE = 1.25   # PNG берётся, если он не больше чем в 1.25 раза тяжелее JPEG
+
+
+def dhash(gray: np.ndarray, size: int = HASH_SIZE) -> int:
+    """Разностный хеш: знак разницы соседних пикселей в уменьшенном кадре."""
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def display_width_px(width_mm: float = DISPLAY_WIDTH_MM, dpi: int = DPI) -> int:
+    return int(round(width_mm / 25.4 * dpi))
+
+
+def encode_for_display(image: np.ndarray, width_px: int) -> Tuple[bytes, str]:
+    """(байты, расширение): кадр по ширине показа в документе, PNG или JPEG — что выгоднее."""
+    if image.shape[1] > width_px:
+        height = int(round(image.shape[0] * width_px / image.shape[1]))
+        image = cv2.resize(image, (width_px, height), interpolation=cv2.INTER_AREA)
+    ok_png, png = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION])
+    ok_jpg, jpg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+    if not ok_jpg or (ok_png and len(png) <= len(jpg) * PNG_PREFERENCE):
+        return png.tobytes(), ".png"
+    return jpg.tobytes(), ".jpg"
+
+
+def decode_image(data: bytes) -> np.ndarray:
+    """Закодированная картинка -> кадр BGR (например, для подписи BLIP)."""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+@dataclass
+class DedupeStats:
+    frames: int = 0
+    unique: int = 0
+    dropped: int = 0          # повтор предыдущего экрана — не вставлен
+    reused: int = 0           # возврат к экрану — вставлен уже встроенный файл
+    bytes_in: int = 0         # вставлялось бы без дедупликации (для файлов — исходный размер)
+    bytes_out: int = 0        # встроенные в документ (каждая уникальная картинка — один раз)
+    seconds: float = 0.0
+
+
+@dataclass
+class _Screen:
+    hash: int
+    data: bytes
+
+
+class FrameDeduper:
+    def __init__(self, threshold: int = THRESHOLD, width_mm: float = DISPLAY_WIDTH_MM, dpi: int = DPI,
+                 drop_consecutive: bool = False) -> None:
+        self.threshold = threshold
+        self.width_px = display_width_px(width_mm, dpi)
+        self.drop_consecutive = drop_consecutive
+        self.stats = DedupeStats()
+        self._screens: List[_Screen] = []
+        self._last: Optional[_Screen] = None
+
+    def _find(self, h: int) -> Optional[_Screen]:
+        best = min(self._screens, key=lambda s: hamming(s.hash, h), default=None)
+        if best is not None and hamming(best.hash, h) <= self.threshold:
+            return best
+        return None
+
+    def add(self, frame: Union[np.ndarray, str]) -> Optional[bytes]:
+        """
+        Байты картинки для doc.add_picture(BytesIO(...)) или None, если кадр повторяет
+        только что вставленный экран. frame — кадр BGR или путь к файлу.
+        """
+        t0 = time.perf_counter()
+        try:
+            source_size = None
+            if isinstance(frame, (str, os.PathLike)):
+                source_size = os.path.getsize(frame)
+                frame = cv2.imread(frame)
+            if frame is None:
+                return None
+            self.stats.frames += 1
+            h = dhash(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+            screen = self._find(h)
+            if screen is not None:
+                self.stats.bytes_in += source_size or len(screen.data)
+                if self.drop_consecutive and screen is self._last:
+                    self.stats.dropped += 1
+                    return None
+                self.stats.reused += 1
+                self._last = screen
+                return screen.data
+
+            data, _ = encode_for_display(frame, self.width_px)
+            self.stats.bytes_in += source_size or len(data)
+            screen = _Screen(h, data)
+            self._screens.append(screen)
+            self._last = screen
+            self.stats.unique += 1
+            self.stats.bytes_out += len(data)
+            return data
+        finally:
+            self.stats.seconds += time.perf_counter() - t0
+
+    def report(self) -> str:
+        s = self.stats
+        return (f"Кадров {s.frames}: уникальных {s.unique}, повторов пропущено {s.dropped}, "
+                f"переиспользовано {s.reused}; картинки {s.bytes_in / 1e6:.1f} МБ → {s.bytes_out / 1e6:.1f} МБ "
+                f"за {s.seconds:.2f} с")
@@ -0,0 +1,199 @@
+"""
+Выбор моментов для скриншотов по смене картинки на экране, а не по LLM.
+
+Видео декодируется один раз в уменьшенном сером виде (ffmpeg: fps + scale, без
+полного разрешения в памяти), разница соседних кадров считается векторно в NumPy
+пачками кадров. Оценка смены — доля пикселей, изменившихся заметнее
+PIXEL_THRESHOLD: курсор и мигание каретки дают доли процента, открытие формы
+или переход в другое окно — десятки процентов. Вспышки подряд (анимация меню,
+прокрутка) сливаются в одну смену с временем окончания перехода.
+
+Абзац получает скриншот, если во время него (от конца предыдущего абзаца до
+его конца) экран сменился сильно; если смен не было — скриншот не нужен; только
+при слабых сменах решает LLM (image_is_required).
+"""
+import subprocess
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SAMPLE_FPS = 2.0          # кадров в секунду для анализа
+FRAME_WIDTH = 160         # ширина уменьшенного кадра, px
+PIXEL_THRESHOLD = 24      # изменение яркости пикселя, которое считается изменением
+MIN_SCORE = 0.005         # доля изменившихся пикселей: ниже — шум (курсор, каретка)
+STRONG_SCORE = 0.08       # выше — точно новый экран, LLM не нужен
+MIN_GAP = 1.5             # смены ближе друг к другу, с, — один переход
+SETTLE = 0.5              # отступ от смены, с: кадр берётся после окончания перехода
+CHUNK_FRAMES = 256        # кадров в одной векторной пачке
+
+
+@dataclass
+class SceneChange:
+    time: float           # секунда, к которой переход закончился
+    score: float          # доля изменившихся пикселей (максимум за переход)
+    start: float = -1.0   # секунда начала перехода (для слитых вспышек раньше time)
+
+    def __post_init__(self) -> None:
+        if self.start < 0:
+            self.start = self.time
+
+
+def _iter_frames_ffmpeg(video_path: str, sample_fps: float, width: int) -> Iterator[np.ndarray]:
+    cmd = [
+        "ffmpeg", "-v", "error", "-i", video_path,
+        "-vf", f"fps={sample_fps},scale={width}:-2,format=gray",
+        "-f", "rawvideo", "-",
+    ]
+    probe = subprocess.check_output([
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=width,height", "-of", "csv=p=0", video_path,
+    ], stderr=subprocess.DEVNULL).decode("utf-8").strip().splitlines()[0]
+    src_w, src_h = (int(x) for x in probe.split(",")[:2])
+    height = int(round(src_h * width / src_w / 2)) * 2
+    frame_size = width * height
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            buf = proc.stdout.read(frame_size)
+            if len(buf) < frame_size:
+                break
+            yield np.frombuffer(buf, dtype=np.uint8).reshape(height, width)
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+def _iter_frames_cv2(video_path: str, sample_fps: float, width: int) -> Iterator[np.ndarray]:
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Не удалось открыть видео {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    step = max(1, int(round(fps / sample_fps)))
+    index = 0
+    try:
+        while True:
+            # grab без преобразования кадра — для пропускаемых кадров
+            if index % step:
+                if not cap.grab():
+                    break
+            else:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                height = max(2, int(round(frame.shape[0] * width / frame.shape[1])))
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                yield cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+            index += 1
+    finally:
+        cap.release()
+
+
+def iter_frames(video_path: str, sample_fps: float = SAMPLE_FPS, width: int = FRAME_WIDTH) -> Iterator[np.ndarray]:
+    """Уменьшенные серые кадры с частотой sample_fps: через ffmpeg, без него — через OpenCV."""
+    try:
+        frames = _iter_frames_ffmpeg(video_path, sample_fps, width)
+        first = next(frames, None)
+    except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+        yield from _iter_frames_cv2(video_path, sample_fps, width)
+        return
+    if first is None:
+        # ffmpeg есть, но кадры не отдал — пробуем OpenCV
+        yield from _iter_frames_cv2(video_path, sample_fps, width)
+        return
+    yield first
+    yield from frames
+
+
+def change_scores(frames: Iterator[np.ndarray], pixel_threshold: int = PIXEL_THRESHOLD,
+                  chunk: int = CHUNK_FRAMES) -> np.ndarray:
+    """Оценка смены для каждого кадра относительно предыдущего (для первого — 0)."""
+    scores = [np.zeros(1, dtype=np.float32)]
+    previous = None
+    buffer: List[np.ndarray] = []
+
+    def flush() -> None:
+        nonlocal previous
+        stack = np.stack(buffer).astype(np.int16)
+        if previous is not None:
+            stack = np.concatenate([previous[None], stack])
+        changed = np.abs(np.diff(stack, axis=0)) > pixel_threshold
+        scores.append(changed.mean(axis=(1, 2), dtype=np.float32))
+        previous = stack[-1]
+        buffer.clear()
+
+    for frame in frames:
+        if previous is None and not buffer:
+            previous = frame.astype(np.int16)
+            continue
+        buffer.append(frame)
+        if len(buffer) >= chunk:
+            flush()
+    if buffer:
+        flush()
+    return np.concatenate(scores) if previous is not None else np.zeros(0, dtype=np.float32)
+
+
+def find_changes(scores: np.ndarray, sample_fps: float = SAMPLE_FPS, min_score: float = MIN_SCORE,
+                 min_gap: float = MIN_GAP) -> List[SceneChange]:
+    """Точки смены: кадры с оценкой выше min_score, близкие вспышки сливаются в один переход."""
+    changes: List[SceneChange] = []
+    for index in np.flatnonzero(scores >= min_score):
+        t = float(index) / sample_fps
+        score = float(scores[index])
+        if changes and t - changes[-1].time <= min_gap:
+            changes[-1] = SceneChange(t, max(score, changes[-1].score), changes[-1].start)
+        else:
+            changes.append(SceneChange(t, score))
+    return changes
+
+
+def detect_scene_changes(video_path: str, sample_fps: float = SAMPLE_FPS, width: int = FRAME_WIDTH,
+                         min_score: float = MIN_SCORE) -> List[SceneChange]:
+    scores = change_scores(iter_frames(video_path, sample_fps, width))
+    changes = find_changes(scores, sample_fps, min_score)
+    # Начальный экран — тоже «смена»: первый абзац может его показывать
+    return [SceneChange(0.0, 1.0)] + [c for c in changes if c.time > 0]
+
+
+def select_screenshots(
+    paragraph_ends: Sequence[float],
+    changes: Sequence[SceneChange],
+    strong_score: float = STRONG_SCORE,
+    settle: float = SETTLE,
+    is_required: Optional[Callable[[int], bool]] = None,
+) -> Tuple[Dict[int, float], Dict[str, int]]:
+    """
+    {номер абзаца (с 1): секунда скриншота} и счётчики решений.
+    Сильная смена во время абзаца — скриншот; смен нет — без скриншота;
+    только слабые — решает is_required(номер абзаца) (без него — скриншот не нужен).
+    Время — конец абзаца, но не раньше settle после последней смены в нём
+    и не позже начала следующего перехода.
+    """
+    times = np.array([c.time for c in changes], dtype=np.float64)
+    selected: Dict[int, float] = {}
+    stats = {"scene": 0, "llm": 0, "skipped": 0}
+    start = -1.0
+    for idx, end in enumerate(paragraph_ends, start=1):
+        lo = int(np.searchsorted(times, start, side="right"))
+        hi = int(np.searchsorted(times, end, side="right"))
+        start = max(start, end)
+        if lo >= hi:
+            stats["skipped"] += 1
+            continue
+        if max(c.score for c in changes[lo:hi]) >= strong_score:
+            stats["scene"] += 1
+        elif is_required is not None and is_required(idx):
+            stats["llm"] += 1
+        else:
+            stats["skipped"] += 1
+            continue
+        last = changes[hi - 1].time
+        shot = max(float(end), last + settle)
+        if hi < len(changes):
+            shot = min(shot, max(last, changes[hi].start - settle))
+        selected[idx] = shot
+    return selected, stats
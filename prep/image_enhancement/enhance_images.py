@@ -2,47 +2,353 @@
 
 import os
 import glob
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
 import torch
 from PIL import Image
 from RealESRGAN import RealESRGAN
 
 
+class _ImageJob:
+    """Изображение в конвейере: вход, собираемый выход и замеры по этапам."""
+
+    def __init__(self, path, output_path, pixels):
+        self.path = path
+        self.output_path = output_path
+        self.pixels = pixels            # uint8, H x W x 3
+        self.output = None              # uint8, H*scale x W*scale x 3
+        self.tiles_left = 0
+        self.failed = False             # ошибка модели — оставшиеся тайлы не считаются
+        self.read_s = 0.0
+        self.infer_s = 0.0
+        self.write_s = 0.0
+
+
 class ImageEnhancer:
     """
     Класс для повышения разрешения изображений с помощью Real-ESRGAN.
+
+    Конвейер enhance_all: пул чтения декодирует изображения, модель считает тайлы
+    фиксированного размера (память не зависит от размера картинки) батчами — тайлы
+    разных изображений идут в один проход, соседние тайлы перекрываются и склеиваются
+    плавным переходом, пул записи кодирует и сохраняет результат. В памяти
+    одновременно не больше MAX_INFLIGHT изображений. Уже обработанные файлы
+    (по mtime/размеру, при их изменении — по SHA-1) пропускаются.
     """
 
-    def __init__(self, upload_folder='./upload/', result_folder='./result/', scale=4):
+    TILE_SIZE = 192        # сторона тайла на входе, px — ограничивает память модели
+    TILE_OVERLAP = 16      # перекрытие соседних тайлов, px на входе
+    BATCH_SIZE = 4         # тайлов за один проход модели
+    READERS = 2
+    WRITERS = 2
+    MAX_INFLIGHT = 4       # изображений одновременно в памяти (прочитаны, но ещё не сохранены)
+    MANIFEST = ".enhance_manifest.json"
+    EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".tif", ".tiff")
+
+    def __init__(self, upload_folder='./upload/', result_folder='./result/', scale=4,
+                 tile_size=None, tile_overlap=None, batch_size=None, readers=None, writers=None, half=None):
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         print(f"🖥 Используемое устройство: {self.device}")
 
         self.upload_folder = upload_folder
         self.result_folder = result_folder
+        self.scale = scale
+        self.tile_size = int(tile_size or self.TILE_SIZE)
+        self.tile_overlap = int(self.TILE_OVERLAP if tile_overlap is None else tile_overlap)
+        if not 0 <= self.tile_overlap < self.tile_size // 2:
+            raise ValueError("tile_overlap должен быть меньше половины tile_size")
+        self.batch_size = int(batch_size or self.BATCH_SIZE)
+        self.readers = int(readers or self.READERS)
+        self.writers = int(writers or self.WRITERS)
+        # fp16 на GPU — вдвое меньше памяти на тайл
+        self.half = (self.device.type == 'cuda') if half is None else (half and self.device.type == 'cuda')
 
         os.makedirs(self.result_folder, exist_ok=True)
 
         print("📥 Инициализируем модель...")
         self.model = RealESRGAN(self.device, scale=scale)
-        self.model.load_weights('weights/RealESRGAN_x4.pth', download=True)
+        self.model.load_weights(f'weights/RealESRGAN_x{scale}.pth', download=True)
         self.model.model.to(self.device).eval()
+        if self.half:
+            self.model.model.half()
+
+    # -----------------------
+    # ПРОПУСК НЕИЗМЕНИВШИХСЯ
+    # -----------------------
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.result_folder, self.MANIFEST)
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        tmp = self._manifest_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self._manifest_path)
+
+    @staticmethod
+    def _sha1(path):
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    def _output_path(self, path):
+        return os.path.join(self.result_folder, os.path.basename(path))
+
+    def _up_to_date(self, path, manifest):
+        entry = manifest.get(os.path.basename(path))
+        if not entry or entry.get('scale') != self.scale or not os.path.isfile(self._output_path(path)):
+            return False
+        st = os.stat(path)
+        if entry.get('mtime') == st.st_mtime and entry.get('size') == st.st_size:
+            return True
+        # mtime изменился (копирование, checkout) — сверяем содержимое
+        if entry.get('sha1') == self._sha1(path):
+            entry.update(mtime=st.st_mtime, size=st.st_size)
+            return True
+        return False
+
+    # -----------------------
+    # ТАЙЛЫ
+    # -----------------------
+    @staticmethod
+    def _starts(size, tile, step):
+        if size <= tile:
+            return [0]
+        starts = list(range(0, size - tile, step))
+        starts.append(size - tile)
+        return starts
 
-    def enhance_all(self):
-        """Обрабатывает все изображения в указанной папке."""
-        image_paths = glob.glob(os.path.join(self.upload_folder, '*'))
+    def _tiles(self, height, width):
+        """(y0, x0, h, w, перекрытие сверху, перекрытие слева) в пикселях входа, построчно."""
+        t = self.tile_size
+        step = t - self.tile_overlap
+        ys = self._starts(height, t, step)
+        xs = self._starts(width, t, step)
+        for yi, y0 in enumerate(ys):
+            th = min(t, height - y0)
+            ov_y = ys[yi - 1] + min(t, height - ys[yi - 1]) - y0 if yi else 0
+            for xi, x0 in enumerate(xs):
+                tw = min(t, width - x0)
+                ov_x = xs[xi - 1] + min(t, width - xs[xi - 1]) - x0 if xi else 0
+                yield y0, x0, th, tw, ov_y, ov_x
+
+    def _blend(self, job, patch, y0, x0, ov_y, ov_x):
+        """Вставка тайла: в полосах перекрытия с левым/верхним соседом — линейный переход."""
+        s = self.scale
+        ph, pw = patch.shape[:2]
+        region = job.output[y0 * s:y0 * s + ph, x0 * s:x0 * s + pw]
+        if not ov_y and not ov_x:
+            region[...] = patch
+            return
+        weight = np.ones((ph, pw), dtype=np.float32)
+        if ov_x:
+            weight[:, :ov_x * s] *= np.linspace(0, 1, ov_x * s + 2, dtype=np.float32)[1:-1][None, :]
+        if ov_y:
+            weight[:ov_y * s, :] *= np.linspace(0, 1, ov_y * s + 2, dtype=np.float32)[1:-1][:, None]
+        weight = weight[..., None]
+        region[...] = (patch * weight + region * (1.0 - weight) + 0.5).astype(np.uint8)
+
+    def _infer(self, patches):
+        """Батч тайлов tile x tile (uint8) -> батч увеличенных тайлов (uint8)."""
+        x = torch.from_numpy(np.stack(patches)).to(self.device).permute(0, 3, 1, 2).float().div_(255)
+        if self.half:
+            x = x.half()
+        with torch.inference_mode():
+            y = self.model.model(x)
+        return y.float().clamp_(0, 1).mul_(255).round_().byte().permute(0, 2, 3, 1).cpu().numpy()
+
+    def _run_batch(self, batch):
+        t0 = time.perf_counter()
+        results = self._infer([item[1] for item in batch])
+        share = (time.perf_counter() - t0) / len(batch)
+        finished = []
+        s = self.scale
+        for (job, _, (y0, x0, th, tw, ov_y, ov_x)), out in zip(batch, results):
+            self._blend(job, out[:th * s, :tw * s], y0, x0, ov_y, ov_x)
+            job.infer_s += share
+            job.tiles_left -= 1
+            if job.tiles_left == 0:
+                finished.append(job)
+        return finished
+
+    def _tile_patches(self, job):
+        t = self.tile_size
+        h, w = job.pixels.shape[:2]
+        for spec in self._tiles(h, w):
+            y0, x0, th, tw = spec[:4]
+            patch = job.pixels[y0:y0 + th, x0:x0 + tw]
+            if th < t or tw < t:
+                # картинка меньше тайла — добиваем краем до общего размера батча
+                patch = np.pad(patch, ((0, t - th), (0, t - tw), (0, 0)), mode='edge')
+            yield job, patch, spec
+
+    # -----------------------
+    # ЧТЕНИЕ / ЗАПИСЬ
+    # -----------------------
+    def _read(self, path):
+        t0 = time.perf_counter()
+        with Image.open(path) as image:
+            pixels = np.asarray(image.convert('RGB'))
+        job = _ImageJob(path, self._output_path(path), pixels)
+        job.read_s = time.perf_counter() - t0
+        return job
+
+    def _write(self, job):
+        t0 = time.perf_counter()
+        Image.fromarray(job.output).save(job.output_path)
+        job.write_s = time.perf_counter() - t0
+        return job
+
+    # -----------------------
+    # КОНВЕЙЕР
+    # -----------------------
+    def enhance_all(self, image_paths=None, force=False):
+        """
+        Обрабатывает все изображения в указанной папке (или переданный список путей).
+        force=True — не пропускать уже обработанные. Возвращает сводку с замерами.
+        """
+        if image_paths is None:
+            image_paths = sorted(
+                p for p in glob.glob(os.path.join(self.upload_folder, '*'))
+                if os.path.isfile(p) and p.lower().endswith(self.EXTENSIONS)
+            )
         print(f"🖼 Найдено изображений: {len(image_paths)}")
 
-        for path in image_paths:
+        manifest = self._load_manifest()
+        todo = [p for p in image_paths if force or not self._up_to_date(p, manifest)]
+        skipped = len(image_paths) - len(todo)
+        if skipped:
+            print(f"⏭ Без изменений, пропущено: {skipped}")
+
+        lock = threading.Lock()
+        done, failed = [], []
+        pending_paths = deque(todo)
+        reads = deque()          # (путь, future) в порядке очереди
+        writes = set()
+        in_inference = 0
+        batch = []
+        t_start = time.perf_counter()
+
+        def on_written(future, job):
             try:
-                print(f"🚀 Обрабатываем: {path}")
-                image = Image.open(path).convert('RGB')
+                future.result()
+            except Exception as e:
+                print(f"❌ Ошибка при сохранении {job.path}: {e}")
+                with lock:
+                    failed.append(job.path)
+                return
+            st = os.stat(job.path)
+            h, w = job.pixels.shape[:2]
+            total = job.read_s + job.infer_s + job.write_s
+            with lock:
+                manifest[os.path.basename(job.path)] = {
+                    'mtime': st.st_mtime, 'size': st.st_size, 'sha1': self._sha1(job.path), 'scale': self.scale,
+                }
+                done.append(job)
+            print(f"✅ Сохранено: {job.output_path} — {w}x{h} → {w * self.scale}x{h * self.scale}, "
+                  f"чтение {job.read_s:.2f} с, модель {job.infer_s:.2f} с, запись {job.write_s:.2f} с "
+                  f"({h * w / 1e6 / max(total, 1e-9):.2f} Мп/с)")
+            job.pixels = job.output = None   # память освобождается сразу после записи
 
-                # Прогоняем через модель
-                sr_image = self.model.predict(image)
+        try:
+            with ThreadPoolExecutor(self.readers) as readers, ThreadPoolExecutor(self.writers) as writers:
 
-                base_name = os.path.basename(path)
-                output_path = os.path.join(self.result_folder, base_name)
-                sr_image.save(output_path)
-                print(f"✅ Сохранено: {output_path}")
+                def top_up():
+                    nonlocal writes
+                    writes = {f for f in writes if not f.done()}
+                    while pending_paths and len(reads) + in_inference + len(writes) < self.MAX_INFLIGHT:
+                        path = pending_paths.popleft()
+                        reads.append((path, readers.submit(self._read, path)))
 
-            except Exception as e:
-                print(f"❌ Ошибка при обработке {path}: {e}")
\ No newline at end of file
+                def flush(items):
+                    nonlocal in_inference
+                    items = [item for item in items if not item[0].failed]
+                    if not items:
+                        return
+                    try:
+                        finished = self._run_batch(items)
+                    except Exception as e:
+                        # батч смешивает тайлы нескольких изображений — ни одно из них не досчитать
+                        jobs = list({id(item[0]): item[0] for item in items}.values())
+                        for job in jobs:
+                            print(f"❌ Ошибка модели на {job.path}: {e}")
+                            job.failed = True
+                            job.pixels = job.output = None
+                            failed.append(job.path)
+                        in_inference -= len(jobs)
+                        return
+                    for job in finished:
+                        in_inference -= 1
+                        future = writers.submit(self._write, job)
+                        future.add_done_callback(lambda f, job=job: on_written(f, job))
+                        writes.add(future)
+
+                top_up()
+                while reads or pending_paths:
+                    if not reads:
+                        if batch:
+                            # места заняты изображениями, чьи тайлы ждут в неполном батче
+                            # (батч больше всех тайлов в памяти) — досчитываем его сейчас
+                            flush(batch)
+                            batch = []
+                        else:
+                            # все места заняты записью — ждём, пока освободится хотя бы одно
+                            wait(writes, return_when=FIRST_COMPLETED)
+                        top_up()
+                        continue
+                    path, future = reads.popleft()
+                    try:
+                        job = future.result()
+                    except Exception as e:
+                        print(f"❌ Ошибка при обработке {path}: {e}")
+                        failed.append(path)
+                        top_up()
+                        continue
+                    print(f"🚀 Обрабатываем: {path}")
+                    h, w = job.pixels.shape[:2]
+                    job.output = np.zeros((h * self.scale, w * self.scale, 3), dtype=np.uint8)
+                    job.tiles_left = sum(1 for _ in self._tiles(h, w))
+                    in_inference += 1
+                    top_up()   # следующее изображение читается, пока считается это
+                    for item in self._tile_patches(job):
+                        batch.append(item)
+                        if len(batch) == self.batch_size:
+                            flush(batch)
+                            batch = []
+                            top_up()
+                            if job.failed:
+                                break
+                if batch:
+                    flush(batch)
+                wait(writes)
+        finally:
+            # уже сохранённые изображения не пересчитываются при следующем запуске, даже после сбоя
+            self._save_manifest(manifest)
+
+        elapsed = time.perf_counter() - t_start
+        summary = {
+            'found': len(image_paths),
+            'enhanced': len(done),
+            'skipped': skipped,
+            'failed': len(failed),
+            'seconds': round(elapsed, 2),
+            'images_per_s': round(len(done) / elapsed, 3) if elapsed and done else 0.0,
+        }
+        print(f"📊 Готово: {summary['enhanced']} из {len(todo)} за {summary['seconds']} с "
+              f"({summary['images_per_s']} изобр./с), пропущено {skipped}, ошибок {len(failed)}")
+        return summary
@@ -1,11 +1,30 @@
 # main.py
 
+import argparse
+
 from enhance_images import ImageEnhancer
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Повышение разрешения изображений (Real-ESRGAN)")
+    parser.add_argument('--upload', default='upload', help="Папка с исходными изображениями (например, скриншоты для DOCX)")
+    parser.add_argument('--result', default='result', help="Папка для результатов")
+    parser.add_argument('--scale', type=int, default=4)
+    parser.add_argument('--tile', type=int, default=ImageEnhancer.TILE_SIZE, help="Сторона тайла, px (меньше — меньше памяти)")
+    parser.add_argument('--overlap', type=int, default=ImageEnhancer.TILE_OVERLAP)
+    parser.add_argument('--batch', type=int, default=ImageEnhancer.BATCH_SIZE, help="Тайлов за проход модели")
+    parser.add_argument('--readers', type=int, default=ImageEnhancer.READERS)
+    parser.add_argument('--writers', type=int, default=ImageEnhancer.WRITERS)
+    parser.add_argument('--force', action='store_true', help="Обработать заново и неизменившиеся файлы")
+    args = parser.parse_args()
+
     enhancer = ImageEnhancer(
-        upload_folder='upload',
-        result_folder='result',
-        scale=4
+        upload_folder=args.upload,
+        result_folder=args.result,
+        scale=args.scale,
+        tile_size=args.tile,
+        tile_overlap=args.overlap,
+        batch_size=args.batch,
+        readers=args.readers,
+        writers=args.writers,
     )
-    enhancer.enhance_all()
\ No newline at end of file
+    enhancer.enhance_all(force=args.force)
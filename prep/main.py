@@ -2,7 +2,9 @@ from prepare_files.prepare_files import prepare_files
 from transcription_audio.transcription import Transcription
 from rag_documetn_chunker.document_chunker import DocumentChunker
 from rag_db.rag_index_to_chroma_db import RagIndexer
+from rag_db.chunk_metadata import source_metadata
 from create_file.create_docx import create_docx
+from rag_llm.ollama_pool import get_pool
 from download_audio_video.download_audio_video import SynologyDownloader, YandexDownloader
 from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
@@ -11,9 +13,12 @@ import os
 
 CREATE_RAG = os.getenv("CREATE_RAG")
 MODEL_WHISPER = os.getenv("MODEL_WHISPER")
+WHISPER_VAD = os.getenv("WHISPER_VAD")
+CHUNK_MAX_TOKENS = os.getenv("CHUNK_MAX_TOKENS")
+RAG_PER_USER_COLLECTIONS = os.getenv("RAG_PER_USER_COLLECTIONS")
 
-def process_video(url, folder):
-
+def download_video(url, folder):
+    """Скачивание записи по ссылке (Яндекс.Диск или QuickConnect / Synology) в folder."""
      # 0. Скачивание файла
     if "yandex" in url or "disk.yandex" in url:
         print("🖥 Определён источник: Яндекс.Диск")
@@ -27,6 +32,30 @@ def process_video(url, folder):
             saved_path = executor.submit(lambda: SynologyDownloader(url, folder).download()).result()
     #download = YandexDownloader(url, folder)
     print(f"[LOG] YandexDownloader результат: {saved_path}")
+    return saved_path
+
+
+def process_video(url, folder, progress=None, uploader=None, tags=()):
+    """
+    Полный конвейер по ссылке. progress (если задан) — функция str -> None,
+    которой сообщаются промежуточные этапы (например, для сообщений в Telegram).
+    uploader и tags попадают в метаданные чанков — по ним фильтруется поиск.
+    """
+    saved_path = download_video(url, folder)
+    return process_downloaded(saved_path, url, progress, uploader, tags)
+
+
+def process_downloaded(saved_path, url=None, progress=None, uploader=None, tags=(), as_stream=False):
+    """
+    Конвейер для уже скачанного файла: подготовка, транскрибация, DOCX, индексация.
+    Бот вызывает этапы по отдельности: длительность файла известна только после
+    скачивания, и по ней планировщик ставит короткие записи раньше длинных.
+    as_stream=True — вернуть DOCX в памяти (BytesIO с именем файла) вместо пути.
+    """
+    def notify(message):
+        print(f"[LOG] {message}")
+        if progress:
+            progress(message)
 
     # 1. Подготовка аудиофайлов из видео
     prep = prepare_files(saved_path)
@@ -37,16 +66,24 @@ def process_video(url, folder):
     
     # 2. Транскрибация аудиофайла
     prompt = "Техническая документация на русском языке. Используйте корректную пунктуацию, соблюдайте терминологию 1С, излагайте содержание техническим языком. Термины: 1С, НСИ, БИТ финанс, проведение документа, проводки, конфигурация, обработка, запрос, документ, справочник, модуль:"
-    transcription = Transcription(model_name= MODEL_WHISPER, prompt = prompt)
-    transcription_json = transcription.save_json(audio_file)
-    print(f"[LOG] Transcription результат: {transcription_json}")
-    transcription_docs = transcription.as_documents()
-    print(f"[LOG] Transcription as_documents количество: {len(transcription_docs)}")
+    transcription = Transcription(model_name= MODEL_WHISPER, prompt = prompt, use_vad = WHISPER_VAD == "True")
+    # Части пишутся сразу в .jsonl и .tsb — сегменты и слова всей записи в памяти не собираются
+    transcription_jsonl = os.path.splitext(audio_file)[0] + ".jsonl"
+    transcription_store = os.path.splitext(audio_file)[0] + ".tsb"
+    transcription_files = transcription.transcribe_to_files(
+        audio_file,
+        jsonl_path = transcription_jsonl,
+        store_path = transcription_store,
+        on_part = lambda part: notify(f"Транскрибация: готова часть {part['part']} из {part['parts_total']}"),
+    )
+    print(f"[LOG] Transcription результат: {transcription_files}")
     transcription.unload()
     
     # 3. Создание DOCX из транскрипта
-    class_create_docx = create_docx(transcription_json, video_file)
-    paragraph = class_create_docx.get_docx()
+    notify("Транскрибация завершена, собираю документ...")
+    # .tsb читается лениво через mmap — память при сборке не зависит от длины записи
+    class_create_docx = create_docx(transcription_store, video_file)
+    paragraph = class_create_docx.get_docx_stream() if as_stream else class_create_docx.get_docx()
     print(f"[LOG] create_docx результат: {paragraph}")
     
     # 3.5 Проверка на тестовый режим
@@ -54,12 +91,17 @@ def process_video(url, folder):
         print("[ERROR] Не создаем чанки, измените флаг чтобы создавать")
         return paragraph
 
-    # 4. Создание чанков из транскрипта
+    # 4. Создание чанков из транскрипта (Document только с текстом сегментов, из .tsb)
+    transcription_docs = transcription.as_documents(transcription_store)
+    print(f"[LOG] Transcription as_documents количество: {len(transcription_docs)}")
     if not transcription_docs:
         print("[ERROR] Нет документов для создания чанков.")
         return paragraph
     
-    chunker = DocumentChunker(chunk_size=3, chunk_overlap=0.5)
+    if CHUNK_MAX_TOKENS:
+        chunker = DocumentChunker(max_tokens=int(CHUNK_MAX_TOKENS))
+    else:
+        chunker = DocumentChunker(chunk_size=3, chunk_overlap=0.5)
     chunks = chunker.chunk(transcription_docs)
     print(f"[LOG] DocumentChunker количество чанков: {len(chunks)}")
     for chunk in chunks[:3]:
@@ -68,7 +110,15 @@ def process_video(url, folder):
 
     # 5. Индексация чанков в CromaDB
     indexer = RagIndexer()
-    manifest = indexer.index(chunks)
+    metadata = source_metadata(
+        source_url = url,
+        uploader = uploader,
+        duration = transcription_docs[-1].metadata.get("end"),
+        tags = tags,
+    )
+    # При RAG_PER_USER_COLLECTIONS чанки дублируются в коллекцию автора — запросы «только мои» идут в неё
+    scope = str(uploader) if uploader is not None and RAG_PER_USER_COLLECTIONS == "True" else None
+    manifest = indexer.index(chunks, extra_metadata = metadata, scope = scope)
     print(f"[LOG] RagIndexer manifest: {manifest}")
 
     return paragraph
@@ -78,4 +128,5 @@ if __name__ == "__main__":
     video_path = 'Просковья инструкция_PV.mp4'
     #url = "https://pro-1c-virtualnas.quickconnect.to/d/s/14Fcxa6WJMw96JQUCRB7lPLEuIoRptvU/zFh_5S--OFIGZs-B0NaiNL_icd4HlUOm-s7SAj3ZJcgw"
     url = "https://disk.yandex.ru/i/KzF8C83q_JbcPw"
+    get_pool().warm_up()    # модель грузится, пока скачивается и распознаётся запись
     process_video(url)
@@ -0,0 +1,79 @@
+"""
+Бенчмарк подписей BLIP: секунды на кадр при разных лучах, длине, батче и квантизации.
+Первая строка — прежний режим (загрузка модели на каждый кадр, 10 лучей, max_length=500),
+только на первых --legacy кадрах: он слишком медленный для всего набора.
+
+Пример (из каталога prep):
+    python -m picture_description.bench_captioner --frames out/frames/*.png
+    python -m picture_description.bench_captioner --video input.mp4 --count 40
+"""
+import argparse
+import glob
+import time
+
+import cv2
+import torch
+from transformers import BlipForConditionalGeneration, BlipProcessor
+
+from picture_description.picture_description import BlipCaptioner
+
+
+def frames_from_video(path, count):
+    cap = cv2.VideoCapture(path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    for i in range(count):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(total * (i + 0.5) / count))
+        ok, frame = cap.read()
+        if ok:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+
+def legacy_caption(image):
+    """Прежний get_picture_description: загрузка модели на каждый вызов."""
+    processor = BlipProcessor.from_pretrained(BlipCaptioner.MODEL_NAME)
+    model = BlipForConditionalGeneration.from_pretrained(BlipCaptioner.MODEL_NAME)
+    inputs = processor(images=BlipCaptioner._as_image(image), return_tensors="pt")
+    with torch.no_grad():
+        out = model.generate(**inputs, max_length=500, num_beams=10)
+    return processor.decode(out[0], skip_special_tokens=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", nargs="*", default=[], help="Файлы кадров (можно маской)")
+    ap.add_argument("--video", default=None, help="Или взять кадры из видео")
+    ap.add_argument("--count", type=int, default=32)
+    ap.add_argument("--legacy", type=int, default=2, help="Кадров для прежнего режима (0 — пропустить)")
+    ap.add_argument("--configs", nargs="+", default=["1:30:8:0", "3:40:8:0", "3:40:8:1", "5:60:8:0"],
+                    help="лучи:токены:батч:квантизация")
+    args = ap.parse_args(argv)
+
+    images = [p for pattern in args.frames for p in sorted(glob.glob(pattern))]
+    if args.video:
+        images += frames_from_video(args.video, args.count)
+    if not images:
+        raise SystemExit("Нет кадров: укажите --frames или --video")
+
+    print(f"Кадров: {len(images)}")
+    if args.legacy:
+        t0 = time.perf_counter()
+        sample = [legacy_caption(img) for img in images[:args.legacy]]
+        per_frame = (time.perf_counter() - t0) / len(sample)
+        print(f"  прежний режим          {per_frame:7.2f} с/кадр | {sample[0]}")
+
+    for config in args.configs:
+        beams, tokens, batch, quantize = (int(x) for x in config.split(":"))
+        captioner = BlipCaptioner(num_beams=beams, max_new_tokens=tokens, batch_size=batch, quantize=bool(quantize))
+        captioner.caption(images[:1])   # загрузка модели — вне замера
+        t0 = time.perf_counter()
+        captions = captioner.caption(images)
+        per_frame = (time.perf_counter() - t0) / len(images)
+        print(f"  лучи {beams} токены {tokens:3d} батч {batch:2d}{' int8' if captioner.quantize else '     '} "
+              f"{per_frame:7.2f} с/кадр | {captions[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,101 @@
+import os
+import threading
+import time
+
 import torch
 from PIL import Image
 from transformers import BlipProcessor, BlipForConditionalGeneration
 
 import cv2
 import requests
-import os
-
-class picture_description:
-    def __init__(self):
-        а = 1
-        #self.video_path = self.file_path
-        #self.time_str = self.time_str
-    
-    def get_picture_description(self, file_path):
 
-        # Загрузка модели и процессора
-        processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-large")
-        model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-large")
 
-        # Загрузка изображения
-        image = Image.open(file_path)
+class BlipCaptioner:
+    """
+    Подписи к кадрам моделью BLIP. Модель загружается один раз на процесс (при первом
+    вызове) и подписывает кадры батчами — один проход модели на BATCH_SIZE кадров.
+    Скорость/качество — числом лучей и длиной подписи; на CPU можно включить
+    динамическую int8-квантизацию линейных слоёв (быстрее в 1.5–2 раза).
+    Настройки по умолчанию — из CAPTION_BEAMS, CAPTION_MAX_TOKENS, CAPTION_BATCH, CAPTION_QUANTIZE.
+    """
+    MODEL_NAME = "Salesforce/blip-image-captioning-large"
+
+    _models = {}                 # (имя, устройство, квантизация) -> (processor, model)
+    _lock = threading.Lock()
+
+    def __init__(self, model_name=None, num_beams=None, max_new_tokens=None, batch_size=None, quantize=None, device=None):
+        self.model_name = model_name or self.MODEL_NAME
+        self.num_beams = int(num_beams or os.getenv("CAPTION_BEAMS") or 3)
+        self.max_new_tokens = int(max_new_tokens or os.getenv("CAPTION_MAX_TOKENS") or 40)
+        self.batch_size = int(batch_size or os.getenv("CAPTION_BATCH") or 8)
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        if quantize is None:
+            quantize = os.getenv("CAPTION_QUANTIZE") == "True"
+        self.quantize = bool(quantize) and self.device == "cpu"   # квантизация torch — только CPU
+
+    def _load(self):
+        key = (self.model_name, self.device, self.quantize)
+        with self._lock:
+            if key not in self._models:
+                print(f"[LOG] BlipCaptioner: загружаю {self.model_name} ({self.device}{', int8' if self.quantize else ''})")
+                processor = BlipProcessor.from_pretrained(self.model_name)
+                dtype = torch.float16 if self.device == "cuda" else torch.float32
+                model = BlipForConditionalGeneration.from_pretrained(self.model_name, torch_dtype=dtype)
+                model.eval()
+                if self.quantize:
+                    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                model.to(self.device)
+                self._models[key] = (processor, model)
+            return self._models[key]
+
+    @staticmethod
+    def _as_image(item):
+        """Путь к файлу, PIL.Image или кадр OpenCV (BGR)."""
+        if isinstance(item, Image.Image):
+            return item.convert("RGB")
+        if isinstance(item, (str, os.PathLike)):
+            with Image.open(item) as image:
+                return image.convert("RGB")
+        return Image.fromarray(cv2.cvtColor(item, cv2.COLOR_BGR2RGB))
+
+    def caption(self, images, time_budget=None):
+        """
+        Подписи в порядке images. time_budget (секунды) — после его исчерпания
+        оставшиеся кадры не подписываются (None на их местах).
+        """
+        processor, model = self._load()
+        captions = [None] * len(images)
+        t0 = time.perf_counter()
+        for start in range(0, len(images), self.batch_size):
+            if time_budget is not None and time.perf_counter() - t0 > time_budget:
+                print(f"[LOG] BlipCaptioner: бюджет {time_budget} с исчерпан, подписано {start} из {len(images)}")
+                break
+            batch = [self._as_image(item) for item in images[start:start + self.batch_size]]
+            inputs = processor(images=batch, return_tensors="pt").to(self.device)
+            if self.device == "cuda":
+                inputs["pixel_values"] = inputs["pixel_values"].half()
+            with torch.inference_mode():
+                out = model.generate(**inputs, num_beams=self.num_beams, max_new_tokens=self.max_new_tokens)
+            captions[start:start + len(batch)] = [c.strip() for c in processor.batch_decode(out, skip_special_tokens=True)]
+        return captions
 
-        # Подготовка входных данных
-        inputs = processor(images=image, return_tensors="pt")
 
-        # Генерация описания с измененными параметрами
-        with torch.no_grad():
-            out = model.generate(**inputs, max_length=500, num_beams=10, temperature=0.7)
+class picture_description:
+    def __init__(self, captioner=None):
+        # Общий подписчик — модель BLIP не перезагружается на каждый кадр
+        self.captioner = captioner or BlipCaptioner()
 
-        # Декодирование и вывод результата
-        description = processor.decode(out[0], skip_special_tokens=True)
+    def get_picture_description(self, file_path):
+        return self.captioner.caption([file_path])[0]
 
-        # Вывод результата
-        return description
-    
-    def save_frame_at_time(self, video_path, time_str):
+    def get_picture_descriptions(self, file_paths, time_budget=None):
+        """Подписи ко всем кадрам документа батчами."""
+        return self.captioner.caption(list(file_paths), time_budget=time_budget)
 
-        hours, minutes, seconds = map(int, time_str.split(':'))
-        total_seconds = hours * 3600 + minutes * 60 + seconds
+    def grab_frame_at_time(self, video_path, time_str):
+        """Кадр (BGR, numpy) на момент "ЧЧ:ММ:СС" или "ЧЧ:ММ:СС.ммм"; None, если не удалось."""
+        hours, minutes, seconds = time_str.split(':')
+        total_seconds = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
 
         cap = cv2.VideoCapture(video_path)
 
@@ -45,38 +103,41 @@ class picture_description:
             print("Не удалось открыть видеофайл")
             return None
 
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        duration = frame_count / fps
-
-        #print(f"Общее количество кадров: {frame_count}")
-        #print(f"Длительность видео (в секундах): {duration}")
+        try:
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            duration = frame_count / fps
+
+            if total_seconds > duration:
+                print("Указанное время превышает длительность видео.")
+                return None
+
+            cap.set(cv2.CAP_PROP_POS_MSEC, total_seconds * 1000)
+            ret, frame = cap.read()
+            if not ret:
+                print("Не удалось извлечь кадр")
+                print(f"Текущая позиция в миллисекундах: {cap.get(cv2.CAP_PROP_POS_MSEC)}")
+                return None
+            return frame
+        finally:
+            cap.release()
 
-        if total_seconds > duration:
-            print("Указанное время превышает длительность видео.")
+    def save_frame_at_time(self, video_path, time_str, output_image_path=None):
+        frame = self.grab_frame_at_time(video_path, time_str)
+        if frame is None:
             return None
+        # По умолчанию — screenshot.png рядом с видео (перезаписывается каждым вызовом)
+        if output_image_path is None:
+            output_image_path = os.path.join(os.path.dirname(video_path), 'screenshot.png')
+        cv2.imwrite(output_image_path, frame)
+        return output_image_path
 
-        cap.set(cv2.CAP_PROP_POS_MSEC, total_seconds * 1000)
-
-        ret, frame = cap.read()
-
-        if ret:
-            # Получаем директорию из пути к видео
-            video_dir = os.path.dirname(video_path)
-            output_image_path = os.path.join(video_dir, 'screenshot.png')
-            cv2.imwrite(output_image_path, frame)
-            #print(f"Кадр сохранен как {output_image_path}")
-            cap.release()
-            return output_image_path
-        else:
-            print("Не удалось извлечь кадр")
-            print(f"Текущая позиция в миллисекундах: {cap.get(cv2.CAP_PROP_POS_MSEC)}")
-            cap.release()
-            return None
-        
     def description_frame_at_time(self, video_path, time_str):
 
-        picture_path = self.save_frame_at_time(video_path, time_str)
-        description_picture = self.get_picture_description(picture_path)
+        # Кадр подписывается из памяти, без screenshot.png на диске
+        frame = self.grab_frame_at_time(video_path, time_str)
+        if frame is None:
+            return None
+        description_picture = self.get_picture_description(frame)
 
         return description_picture
\ No newline at end of file
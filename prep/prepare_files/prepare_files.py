@@ -3,8 +3,40 @@ import os
 import shutil
 import ffmpeg
 
-# Константа: максимальная длительность в секундах (например, 30 минуты)
-MAX_DURATION = 1800  # 30 минуты
+from dotenv import load_dotenv, find_dotenv
+load_dotenv(find_dotenv())
+
+# Максимальная длительность в секундах (по умолчанию 30 минут).
+# MAX_DURATION=0 в окружении — режим длинных записей: файл не обрезается,
+# последующие этапы обрабатывают его окнами с ограниченным потреблением памяти.
+MAX_DURATION = int(os.getenv("MAX_DURATION") or 1800)
+
+
+def _duration_limit_kwargs():
+    """Аргумент t для ffmpeg.input, если длительность ограничена."""
+    return {"t": MAX_DURATION} if MAX_DURATION > 0 else {}
+
+
+def probe_duration(file_name):
+    """
+    Длительность файла в секундах по ffprobe (с учётом обрезки до MAX_DURATION)
+    или None, если ffprobe не смог её определить.
+    """
+    try:
+        output = subprocess.check_output([
+            "ffprobe", "-v", "error",
+            "-show_entries", "format=duration",
+            "-of", "default=nokey=1:noprint_wrappers=1",
+            file_name
+        ], stderr=subprocess.DEVNULL).decode('utf-8').strip()
+        duration = float(output)
+    except (subprocess.CalledProcessError, ValueError, OSError):
+        return None
+    return min(duration, MAX_DURATION) if MAX_DURATION > 0 else duration
+
+
+def _limit_note():
+    return f"обрезан до {MAX_DURATION} секунд" if MAX_DURATION > 0 else "без ограничения длительности"
 
 
 class prepare_files:
@@ -15,7 +47,7 @@ class prepare_files:
         """
         Анализирует тип файла (видео или аудио), обрабатывает его соответствующим образом,
         сохраняет результаты рядом с исходным файлом и возвращает пути к ним.
-        Если файл длиннее MAX_DURATION, он автоматически обрезается.
+        Если файл длиннее MAX_DURATION, он автоматически обрезается (MAX_DURATION=0 — без обрезки).
 
         :return: dict {'video': str or '', 'audio': str or ''}
         """
@@ -102,11 +134,12 @@ class prepare_files:
         cmd = ["ffmpeg", "-y", "-i", self.file_name]
 
         # Добавляем ограничение по времени
-        cmd += ["-t", str(MAX_DURATION)]  # Обрезаем до MAX_DURATION секунд
+        if MAX_DURATION > 0:
+            cmd += ["-t", str(MAX_DURATION)]  # Обрезаем до MAX_DURATION секунд
 
         if codec == 'h264' and ext == '.mp4':
             # Даже если формат правильный, всё равно может быть нужно обрезать
-            print(f"Файл уже mp4+h264, но будет обрезан до {MAX_DURATION} секунд -> {output_path}")
+            print(f"Файл уже mp4+h264, копируем дорожку ({_limit_note()}) -> {output_path}")
             cmd += [
                 "-c:v", "copy",  # копируем без перекодирования
                 "-c:a", "aac", "-b:a", "128k",
@@ -114,14 +147,14 @@ class prepare_files:
             ]
         else:
             if use_nvenc:
-                print(f"GPU ускорение доступно. Конвертируем и обрезаем до {MAX_DURATION} секунд -> {output_path}")
+                print(f"GPU ускорение доступно. Конвертируем ({_limit_note()}) -> {output_path}")
                 cmd += [
                     "-c:v", "h264_nvenc", "-preset", "fast", "-cq", "23",
                     "-c:a", "aac", "-b:a", "128k",
                     output_path
                 ]
             else:
-                print(f"GPU недоступно. Используем CPU, обрезаем до {MAX_DURATION} секунд -> {output_path}")
+                print(f"GPU недоступно. Используем CPU ({_limit_note()}) -> {output_path}")
                 cmd += [
                     "-c:v", "libx264", "-preset", "ultrafast", "-crf", "23",
                     "-c:a", "aac", "-b:a", "128k",
@@ -129,7 +162,7 @@ class prepare_files:
                 ]
 
         subprocess.run(cmd, check=True)
-        print(f"Конвертация и обрезка завершены -> {output_path}")
+        print(f"Конвертация завершена -> {output_path}")
         return output_path
 
     def extract_clean_audio(self, output_audio_path=None):
@@ -146,7 +179,7 @@ class prepare_files:
             # Шаг 1: Извлечь первые MAX_DURATION секунд аудио
             (
                 ffmpeg
-                .input(self.file_name, t=MAX_DURATION)  # Ограничиваем длительность
+                .input(self.file_name, **_duration_limit_kwargs())  # Ограничиваем длительность
                 .output(temp_raw_audio, ac=1, ar=16000, format="wav")
                 .overwrite_output()
                 .run(capture_stdout=True, capture_stderr=True)
@@ -178,7 +211,7 @@ class prepare_files:
                 if os.path.exists(temp_file):
                     os.remove(temp_file)
 
-            print(f"Аудио успешно извлечено, очищено и обрезано до {MAX_DURATION} секунд -> {output_audio_path}")
+            print(f"Аудио успешно извлечено и очищено ({_limit_note()}) -> {output_audio_path}")
             return output_audio_path
 
         except ffmpeg.Error as e:
@@ -201,7 +234,7 @@ class prepare_files:
             # Шаг 1: Привести к нужному формату и обрезать
             (
                 ffmpeg
-                .input(self.file_name, t=MAX_DURATION)  # Обрезка до MAX_DURATION
+                .input(self.file_name, **_duration_limit_kwargs())  # Обрезка до MAX_DURATION
                 .output(temp_raw_audio, ac=1, ar=16000, format="wav")
                 .overwrite_output()
                 .run(capture_stdout=True, capture_stderr=True)
@@ -233,7 +266,7 @@ class prepare_files:
                 if os.path.exists(temp_file):
                     os.remove(temp_file)
 
-            print(f"Аудио очищено и обрезано до {MAX_DURATION} секунд -> {output_audio_path}")
+            print(f"Аудио очищено ({_limit_note()}) -> {output_audio_path}")
             return output_audio_path
 
         except ffmpeg.Error as e:
@@ -0,0 +1,104 @@
+"""
+Бенчмарк поиска с областью: латентность запроса к Chroma без фильтра, с where
+по видео, с where по автору и по отдельной коллекции автора (index_batches(scope=...)).
+
+Векторы и метаданные синтетические (случайные нормированные векторы), поэтому
+эмбеддер не нужен — меряется только сама база. Коллекции создаются во временном
+каталоге и удаляются после замера.
+
+Пример:
+    python -m prep.rag_db.bench_scoped --sizes 10000 100000
+    python -m prep.rag_db.bench_scoped --sizes 1000000 --queries 50 --persist_dir /data/bench_chroma
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from prep.rag_db.chunk_metadata import scoped_collection_name
+
+INSERT_BATCH = 5000
+
+
+def _vectors(rng: np.random.Generator, n: int, dim: int) -> np.ndarray:
+    v = rng.standard_normal((n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def build(client, name: str, size: int, dim: int, videos: int, uploaders: int, seed: int = 0):
+    """Основная коллекция и коллекция одного автора (uploader u0) — как при RAG_PER_USER_COLLECTIONS."""
+    rng = np.random.default_rng(seed)
+    main = client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+    scoped = client.get_or_create_collection(name=scoped_collection_name(name, "u0"), metadata={"hnsw:space": "cosine"})
+    t0 = time.perf_counter()
+    for offset in range(0, size, INSERT_BATCH):
+        n = min(INSERT_BATCH, size - offset)
+        ids = [str(offset + i) for i in range(n)]
+        vecs = _vectors(rng, n, dim)
+        metas = [{
+            "video_key": f"v{(offset + i) % videos}",
+            "uploader": f"u{(offset + i) % videos % uploaders}",   # у каждого видео один автор
+            "ingest_day": 20250101 + (offset + i) % 28,
+        } for i in range(n)]
+        main.add(ids=ids, embeddings=vecs.tolist(), metadatas=metas)
+        own = [i for i, m in enumerate(metas) if m["uploader"] == "u0"]
+        if own:
+            scoped.add(ids=[ids[i] for i in own], embeddings=vecs[own].tolist(), metadatas=[metas[i] for i in own])
+    print(f"[LOG] {name}: {size} векторов за {time.perf_counter() - t0:.1f} c, у автора u0 — {scoped.count()}")
+    return main, scoped
+
+
+def _latency(collection, queries: np.ndarray, k: int, where=None):
+    times = []
+    for q in queries:
+        t0 = time.perf_counter()
+        collection.query(query_embeddings=[q.tolist()], n_results=k, where=where)
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return times[len(times) // 2], times[min(len(times) - 1, int(0.95 * len(times)))]
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10000, 1000000])
+    ap.add_argument("--dim", type=int, default=384, help="Размерность (e5-large — 1024)")
+    ap.add_argument("--videos", type=int, default=1000)
+    ap.add_argument("--uploaders", type=int, default=50)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--persist_dir", default=None, help="Каталог для Chroma (по умолчанию временный)")
+    args = ap.parse_args(argv)
+
+    path = args.persist_dir or tempfile.mkdtemp(prefix="bench_scoped_")
+    client = chromadb.PersistentClient(path=path)
+    rng = np.random.default_rng(1)
+    try:
+        for size in args.sizes:
+            name = f"bench_{size}"
+            main_col, scoped = build(client, name, size, args.dim, args.videos, args.uploaders)
+            queries = _vectors(rng, args.queries, args.dim)
+            video = f"v{random.Random(size).randrange(args.videos)}"
+            cases = [
+                ("без фильтра", main_col, None),
+                ("where video_key", main_col, {"video_key": video}),
+                ("where uploader", main_col, {"uploader": "u0"}),
+                ("where uploader+дата", main_col, {"$and": [{"uploader": "u0"}, {"ingest_day": {"$gte": 20250110}}]}),
+                ("коллекция автора", scoped, None),
+            ]
+            print(f"\n{size} векторов, dim {args.dim}, k {args.k}")
+            for label, col, where in cases:
+                p50, p95 = _latency(col, queries, args.k, where)
+                print(f"  {label:22s} p50 {p50:8.2f} мс | p95 {p95:8.2f} мс")
+            client.delete_collection(name)
+            client.delete_collection(scoped.name)
+    finally:
+        if args.persist_dir is None:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Бенчмарк бэкендов векторного хранилища: скорость записи (векторов/с), размер на диске,
+QPS запросов без фильтра и с where, recall@k относительно точного поиска numpy.
+Для hnsw recall и QPS замеряются при нескольких ef.
+
+Векторы синтетические (кластеры вокруг случайных центров), эмбеддер не нужен.
+
+Пример:
+    python -m prep.rag_db.bench_vector_store --size 100000
+    python -m prep.rag_db.bench_vector_store --size 200000 --dim 1024 --ef 32 64 128 256
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from prep.rag_db.vector_store import open_backend
+
+BATCH = 1000
+
+
+def _vectors(rng, centers, n, spread=0.5):
+    """Векторы вокруг центров тем — как у эмбеддингов текста (равномерный шум — худший случай для HNSW)."""
+    v = centers[rng.integers(len(centers), size=n)] + spread * rng.standard_normal((n, centers.shape[1])).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def ingest(store, data, videos):
+    t0 = time.perf_counter()
+    for offset in range(0, len(data), BATCH):
+        part = data[offset:offset + BATCH]
+        ids = [str(offset + i) for i in range(len(part))]
+        metas = [{"video_key": f"v{(offset + i) % videos}", "start": float(i)} for i in range(len(part))]
+        store.upsert(ids, part, metas, ["passage: чанк " + i for i in ids])
+    store.persist()
+    return time.perf_counter() - t0
+
+
+def run_queries(store, queries, k, where=None):
+    found = []
+    t0 = time.perf_counter()
+    for q in queries:
+        found.append([int(i) for i in store.query(q, k, where)["ids"]])
+    return len(queries) / (time.perf_counter() - t0), found
+
+
+def recall(found, exact):
+    hits = sum(len(set(f) & set(e)) for f, e in zip(found, exact))
+    return hits / max(1, sum(len(e) for e in exact))
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--size", type=int, default=100000)
+    ap.add_argument("--dim", type=int, default=384, help="Размерность (e5-large — 1024)")
+    ap.add_argument("--videos", type=int, default=200)
+    ap.add_argument("--topics", type=int, default=500, help="Число центров, вокруг которых лежат векторы")
+    ap.add_argument("--spread", type=float, default=0.7, help="Разброс вокруг центра (относительно нормы центра)")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--backends", nargs="+", default=["chroma", "hnsw"])
+    ap.add_argument("--ef", type=int, nargs="+", default=[32, 64, 128], help="Значения ef для hnsw")
+    args = ap.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.topics, args.dim)).astype(np.float32) / np.sqrt(args.dim)
+    data = _vectors(rng, centers, args.size, args.spread / np.sqrt(args.dim))
+    queries = _vectors(rng, centers, args.queries, args.spread / np.sqrt(args.dim))
+    video = "v7"
+    in_video = np.array([i % args.videos == 7 for i in range(args.size)])
+
+    # Точный ответ для recall: косинус = скалярное произведение нормированных векторов
+    sims = queries @ data.T
+    exact = np.argsort(-sims, axis=1)[:, :args.k].tolist()
+    video_ids = np.flatnonzero(in_video)
+    exact_video = video_ids[np.argsort(-sims[:, video_ids], axis=1)[:, :args.k]].tolist()
+
+    print(f"{args.size} векторов, dim {args.dim}, k {args.k}, запросов {args.queries}")
+    for kind in args.backends:
+        path = tempfile.mkdtemp(prefix=f"bench_{kind}_")
+        try:
+            store = open_backend(kind, path).get_or_create("bench")
+            seconds = ingest(store, data, args.videos)
+            print(f"\n{kind}: запись {args.size / seconds:9.0f} век/с ({seconds:.1f} c), на диске {_dir_size(path) / 2**20:.1f} МБ")
+            settings = args.ef if kind == "hnsw" else [None]
+            for ef in settings:
+                if ef is not None:
+                    store.ef = ef
+                qps, found = run_queries(store, queries, args.k)
+                qps_f, found_f = run_queries(store, queries, args.k, {"video_key": video})
+                label = f"ef {ef:4d}" if ef is not None else "        "
+                print(f"  {label} | без фильтра {qps:8.1f} QPS recall {recall(found, exact):.3f} | "
+                      f"where video {qps_f:8.1f} QPS recall {recall(found_f, exact_video):.3f}")
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Файл чанков для передачи от чанкера к индексатору вместо pickle.
+
+Формат — JSON Lines (одна строка — один чанк: {"page_content", "metadata"}) и рядом
+индекс <файл>.idx: смещения строк как uint64. Писать можно по одному чанку по мере
+их появления, читать — батчами, не загружая весь файл; индекс даёт число чанков и
+доступ к чанку по номеру без чтения файла целиком. В отличие от pickle, загрузка
+файла из общей папки не исполняет код.
+
+Пример:
+    with ChunkFileWriter("out/chunks.jsonl") as w:
+        for chunk in chunker.chunk_stream(docs):
+            w.write(chunk)
+    for batch in ChunkFileReader("out/chunks.jsonl").iter_batches(64):
+        ...
+"""
+import json
+import os
+import sys
+from array import array
+from typing import Iterable, Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+INDEX_SUFFIX = ".idx"
+
+
+class ChunkFileWriter:
+    FLUSH_EVERY = 256     # чанков между сбросами буферов (читатель видит готовые строки)
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._f = open(path, "wb")
+        self._idx = open(path + INDEX_SUFFIX, "wb")
+        self._offsets = array("Q")
+        self._pos = 0
+        self.count = 0
+
+    def write(self, doc: Document) -> None:
+        line = json.dumps(
+            {"page_content": doc.page_content, "metadata": doc.metadata or {}},
+            ensure_ascii=False,
+        ).encode("utf-8") + b"\n"
+        self._offsets.append(self._pos)
+        self._f.write(line)
+        self._pos += len(line)
+        self.count += 1
+        if len(self._offsets) >= self.FLUSH_EVERY:
+            self.flush()
+
+    def write_many(self, docs: Iterable[Document]) -> int:
+        for d in docs:
+            self.write(d)
+        return self.count
+
+    def flush(self) -> None:
+        # сначала данные, потом индекс: каждое смещение в .idx указывает на дописанную строку
+        self._f.flush()
+        if sys.byteorder != "little":
+            self._offsets.byteswap()
+        self._offsets.tofile(self._idx)
+        self._idx.flush()
+        self._offsets = array("Q")
+
+    def close(self) -> None:
+        self.flush()
+        self._f.close()
+        self._idx.close()
+
+    def __enter__(self) -> "ChunkFileWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def write_chunks(path: str, docs: Iterable[Document]) -> int:
+    """Записывает чанки в файл; возвращает их количество."""
+    with ChunkFileWriter(path) as w:
+        return w.write_many(docs)
+
+
+class ChunkFileReader:
+    def __init__(self, path: str) -> None:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Не найден файл с чанками: {path}")
+        self.path = path
+
+    def _offsets(self) -> Optional[array]:
+        idx_path = self.path + INDEX_SUFFIX
+        if not os.path.isfile(idx_path):
+            return None
+        offsets = array("Q")
+        with open(idx_path, "rb") as f:
+            data = f.read()
+        offsets.frombytes(data[:len(data) - len(data) % offsets.itemsize])
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        return offsets
+
+    def __len__(self) -> int:
+        offsets = self._offsets()
+        if offsets is not None:
+            return len(offsets)
+        with open(self.path, "rb") as f:
+            return sum(1 for line in f if line.endswith(b"\n"))
+
+    @staticmethod
+    def _to_doc(line: bytes) -> Document:
+        item = json.loads(line)
+        return Document(page_content=item["page_content"], metadata=item.get("metadata") or {})
+
+    def get(self, i: int) -> Document:
+        offsets = self._offsets()
+        if offsets is None:
+            raise FileNotFoundError(f"Нет индекса {self.path + INDEX_SUFFIX}")
+        with open(self.path, "rb") as f:
+            f.seek(offsets[i])
+            return self._to_doc(f.readline())
+
+    def __iter__(self) -> Iterator[Document]:
+        """Построчное чтение; недописанная последняя строка пропускается."""
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    yield self._to_doc(line)
+
+    def iter_batches(self, batch_size: int) -> Iterator[List[Document]]:
+        batch: List[Document] = []
+        for doc in self:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
@@ -0,0 +1,86 @@
+"""
+Фильтруемые метаданные чанков в Chroma и ключи, по которым их ищут.
+
+Значения метаданных в Chroma — только скаляры, поэтому:
+  • video_key  — нормализованное имя записи (точное равенство вместо поиска подстроки);
+  • ingest_day — дата загрузки числом YYYYMMDD (диапазоны через $gte/$lte);
+  • теги       — булевы поля tag_<тег> плюс строка tags для отображения.
+"""
+import re
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+_KEY_RE = re.compile(r"[^\w]+")
+
+
+def video_key(audio_title: str) -> str:
+    """Имя файла без расширения и суффиксов _PV/_PA, без регистра и знаков."""
+    stem = Path(str(audio_title)).stem
+    stem = re.sub(r"(_P[AV])+$", "", stem)
+    return _KEY_RE.sub("_", stem.lower()).strip("_")
+
+
+def tag_key(tag: str) -> str:
+    return "tag_" + _KEY_RE.sub("_", tag.lower().lstrip("#")).strip("_")
+
+
+def day_number(value: str) -> int:
+    """'2025-03-07' → 20250307."""
+    return int(date.fromisoformat(value).strftime("%Y%m%d"))
+
+
+def source_metadata(
+    source_url: Optional[str] = None,
+    uploader: Optional[Any] = None,
+    duration: Optional[float] = None,
+    tags: Iterable[str] = (),
+    ingest_date: Optional[date] = None,
+) -> Dict[str, Any]:
+    """Метаданные источника, общие для всех чанков одной записи."""
+    ingest_date = ingest_date or date.today()
+    meta: Dict[str, Any] = {
+        "ingest_date": ingest_date.isoformat(),
+        "ingest_day": int(ingest_date.strftime("%Y%m%d")),
+    }
+    if source_url:
+        meta["source_url"] = source_url
+    if uploader is not None:
+        meta["uploader"] = str(uploader)
+    if duration is not None:
+        meta["duration"] = float(duration)
+    tags = [t for t in tags if t]
+    if tags:
+        meta["tags"] = ",".join(t.lstrip("#") for t in tags)
+        for t in tags:
+            meta[tag_key(t)] = True
+    return meta
+
+
+def scoped_collection_name(collection: str, scope: str) -> str:
+    """Имя коллекции области (например, автора): только [a-zA-Z0-9_-], не длиннее 63 символов."""
+    safe = re.sub(r"[^a-zA-Z0-9_-]+", "_", str(scope)).strip("_") or "scope"
+    return f"{collection}__{safe}"[:63].rstrip("_-")
+
+
+def matches(meta: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Проверка метаданных по тому же where — для результатов, найденных не через Chroma (BM25, hnswlib)."""
+    if not where:
+        return True
+    if "$and" in where:
+        return all(matches(meta, w) for w in where["$and"])
+    for key, cond in where.items():
+        value = meta.get(key)
+        if isinstance(cond, dict):
+            for op, arg in cond.items():
+                if value is None:
+                    return False
+                if op == "$gte" and not value >= arg:
+                    return False
+                if op == "$lte" and not value <= arg:
+                    return False
+                if op == "$eq" and value != arg:
+                    return False
+        elif value != cond:
+            return False
+    return True
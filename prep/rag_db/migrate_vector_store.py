@@ -0,0 +1,84 @@
+"""
+Перенос коллекций между бэкендами векторного хранилища (chroma <-> hnsw)
+без повторного расчёта эмбеддингов: векторы, метаданные и тексты читаются
+страницами и записываются в целевое хранилище.
+
+Пример (из каталога prep):
+    python -m rag_db.migrate_vector_store --src chroma --dst hnsw --persist_dir vectorstore
+    python -m rag_db.migrate_vector_store --src hnsw --dst chroma --collections audio_chunks
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from .vector_store import VectorBackend, open_backend
+
+PAGE = 1000
+
+
+def migrate_collection(src: VectorBackend, dst: VectorBackend, name: str, page: int = PAGE, replace: bool = False) -> Dict[str, Any]:
+    source = src.get(name)
+    if replace:
+        try:
+            dst.delete(name)
+        except Exception:
+            pass
+    target = dst.get_or_create(name)
+
+    t0 = time.perf_counter()
+    copied, offset = 0, 0
+    while True:
+        batch = source.get(include=("embeddings", "documents", "metadatas"), limit=page, offset=offset)
+        if not len(batch["ids"]):
+            break
+        target.upsert(list(batch["ids"]), batch["embeddings"], list(batch["metadatas"]), list(batch["documents"]))
+        copied += len(batch["ids"])
+        offset += len(batch["ids"])
+        print(f"[LOG] {name}: перенесено {copied}")
+    target.persist()
+
+    stats = {
+        "collection": name,
+        "copied": copied,
+        "source_count": source.count(),
+        "target_count": target.count(),
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+    if stats["target_count"] != stats["source_count"]:
+        print(f"[ERROR] {name}: в источнике {stats['source_count']}, в цели {stats['target_count']}")
+    return stats
+
+
+def migrate(
+    src_kind: str,
+    dst_kind: str,
+    persist_dir: str,
+    dst_persist_dir: Optional[str] = None,
+    collections: Optional[List[str]] = None,
+    replace: bool = False,
+) -> List[Dict[str, Any]]:
+    if src_kind == dst_kind and (dst_persist_dir or persist_dir) == persist_dir:
+        raise ValueError("Источник и цель совпадают.")
+    src = open_backend(src_kind, persist_dir)
+    dst = open_backend(dst_kind, dst_persist_dir or persist_dir)
+    names = collections or src.list_names()
+    return [migrate_collection(src, dst, name, replace=replace) for name in names]
+
+
+def _cli() -> None:
+    ap = argparse.ArgumentParser(description="Перенос коллекций между chroma и hnsw")
+    ap.add_argument("--src", required=True, choices=["chroma", "hnsw"])
+    ap.add_argument("--dst", required=True, choices=["chroma", "hnsw"])
+    ap.add_argument("--persist_dir", default="vectorstore", help="Каталог исходного хранилища")
+    ap.add_argument("--dst_persist_dir", default=None, help="Каталог цели (по умолчанию тот же)")
+    ap.add_argument("--collections", nargs="*", default=None, help="По умолчанию — все коллекции источника")
+    ap.add_argument("--replace", action="store_true", help="Удалить коллекцию в цели перед переносом")
+    args = ap.parse_args()
+
+    stats = migrate(args.src, args.dst, args.persist_dir, args.dst_persist_dir, args.collections, args.replace)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    _cli()
@@ -3,20 +3,26 @@ import argparse
 import json
 import hashlib
 import pickle
-from typing import List, Dict, Any, Tuple, Optional
+import queue
+import threading
+from typing import Iterable, Iterator, List, Dict, Any, Tuple, Optional
 
-import chromadb
 from langchain_core.documents import Document
 from langchain_huggingface import HuggingFaceEmbeddings
 
+from .chunk_file import ChunkFileReader
+from .chunk_metadata import scoped_collection_name, video_key
+from .vector_store import VectorStore, open_backend
+
 
 class RagIndexer:
     """
-    Класс-обёртка для индексирования чанков (LangChain Document) в ChromaDB.
+    Класс-обёртка для индексирования чанков (LangChain Document) в векторное хранилище
+    (ChromaDB или hnswlib — см. vector_store.open_backend).
 
     Использование из кода:
         indexer = RagIndexer(persist_dir="vectorstore", collection="audio_chunks", batch_size=64, device=None)
-        manifest = indexer.index(pkl_path="out/chunks.pkl")
+        manifest = indexer.index_from_file("out/chunks.jsonl")
     """
 
     def __init__(
@@ -25,33 +31,37 @@ class RagIndexer:
         collection: str = "audio_chunks",
         batch_size: int = 64,
         device: Optional[str] = None,
+        model_name: str = "intfloat/multilingual-e5-large",
+        backend: Optional[str] = None,
     ) -> None:
         # Переменная окружения CHROMA_PERSIST_DIR имеет приоритет
         self.persist_dir = os.getenv("CHROMA_PERSIST_DIR", persist_dir)
         self.collection_name = collection
         self.batch_size = batch_size
         self.device = device
+        self.model_name = model_name
 
-        # Инициализация эмбеддера e5-large (нормализация включена)
+        # Инициализация эмбеддера (по умолчанию e5-large, нормализация включена)
         model_kwargs: Dict[str, Any] = {}
         if device:
             model_kwargs["device"] = device
         self.embeddings = HuggingFaceEmbeddings(
-            model_name="intfloat/multilingual-e5-large",
+            model_name=model_name,
             model_kwargs=model_kwargs,
             encode_kwargs={"normalize_embeddings": True},
         )
 
-        # Клиент Chroma с persist
-        self.client = chromadb.PersistentClient(path=self.persist_dir)
-        try:
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"hnsw:space": "cosine"},  # на случай новых версий
-            )
-        except TypeError:
-            # Для старых версий chromadb без metadata
-            self.collection = self.client.get_or_create_collection(name=self.collection_name)
+        # Хранилище с persist (VECTOR_BACKEND: chroma по умолчанию или hnsw)
+        self.backend = open_backend(backend, self.persist_dir)
+        self.use_collection(self.collection_name)
+
+    def use_collection(self, collection: str) -> None:
+        """Переключает индексацию на другую коллекцию без повторной загрузки эмбеддера."""
+        self.collection_name = collection
+        self.collection = self._get_or_create(collection)
+
+    def _get_or_create(self, name: str) -> VectorStore:
+        return self.backend.get_or_create(name)
 
     # -----------------------
     # ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ
@@ -64,6 +74,7 @@ class RagIndexer:
 
     @staticmethod
     def load_docs(pkl_path: str) -> List[Document]:
+        """Старый формат (pickle) — только для своих файлов: загрузка pickle исполняет код."""
         with open(pkl_path, "rb") as f:
             return pickle.load(f)
 
@@ -78,60 +89,138 @@ class RagIndexer:
         for i in range(0, len(xs), bs):
             yield xs[i:i+bs]
 
+    @staticmethod
+    def prefetch(batches: Iterable[List[Document]], depth: int = 2) -> Iterator[List[Document]]:
+        """
+        Читает следующие батчи в отдельном потоке, пока текущий считается моделью
+        (torch отпускает GIL). В очереди не больше depth батчей — память ограничена.
+        """
+        q: "queue.Queue" = queue.Queue(maxsize=depth)
+        done = object()
+        stop = threading.Event()
+
+        def _put(item) -> bool:
+            # Потребитель мог остановиться (ошибка индексации, закрытие генератора) —
+            # не ждём места в полной очереди вечно
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def _reader():
+            try:
+                for batch in batches:
+                    if not _put(batch):
+                        return
+            except Exception as e:  # ошибку чтения отдаём в основной поток
+                _put(e)
+                return
+            _put(done)
+
+        threading.Thread(target=_reader, name="rag-prefetch", daemon=True).start()
+        try:
+            while True:
+                item = q.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+
     # -----------------------
     # ОСНОВНОЙ МЕТОД ИНДЕКСАЦИИ
     # -----------------------
-    def index(self, docs: List[Document]) -> Dict[str, Any]:
-        if not docs:
+    def index_batches(
+        self,
+        batches: Iterable[List[Document]],
+        extra_metadata: Optional[Dict[str, Any]] = None,
+        scope: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Индексирует поток батчей: каждый батч эмбеддится и записывается сразу,
+        поэтому в памяти — только текущий батч, а не весь корпус.
+
+        extra_metadata — метаданные источника для всех чанков (см. chunk_metadata.source_metadata).
+        scope — если задан, чанки дополнительно пишутся в коллекцию области
+        (например, автора): запросы «только мои» ищут в маленьком индексе.
+        """
+        count = 0
+        audio_titles = set()
+        scoped_name = scoped_collection_name(self.collection_name, scope) if scope else None
+        scoped = self._get_or_create(scoped_name) if scoped_name else None
+
+        for docs in batches:
+            ids, metas, texts = [], [], []
+
+            # e5 best practice — префикс 'passage: '
+            for d in docs:
+                meta = dict(d.metadata or {})
+                audio_title = meta.get("audio_title", "")
+                meta.setdefault("video_key", video_key(audio_title))
+                if extra_metadata:
+                    meta.update(extra_metadata)
+                start = float(meta.get("start", 0.0))
+                end = float(meta.get("end", 0.0))
+
+                the_id = self.stable_id(audio_title, start, end, d.page_content)
+                ids.append(the_id)
+                metas.append(meta)
+                texts.append("passage: " + d.page_content.strip())
+                audio_titles.add(audio_title)
+
+            vectors: List[List[float]] = self.embeddings.embed_documents(texts)
+            assert len(vectors) == len(texts) == len(ids)
+
+            self.collection.upsert(ids, vectors, metas, texts)
+            if scoped is not None:
+                scoped.upsert(ids, vectors, metas, texts)
+            count += len(ids)
+
+        self.collection.persist()
+        if scoped is not None:
+            scoped.persist()
+
+        if not count:
             raise ValueError("Список Document пуст.")
 
-        ids, metas, texts = [], [], []
-
-        # e5 best practice — префикс 'passage: '
-        for d in docs:
-            meta = dict(d.metadata or {})
-            audio_title = meta.get("audio_title", "")
-            start = float(meta.get("start", 0.0))
-            end = float(meta.get("end", 0.0))
-
-            the_id = self.stable_id(audio_title, start, end, d.page_content)
-            ids.append(the_id)
-            metas.append(meta)
-            texts.append("passage: " + d.page_content.strip())
-
-        # Считаем эмбеддинги батчами
-        vectors: List[List[float]] = []
-        for batch in self.batch_iter(texts, self.batch_size):
-            vectors.extend(self.embeddings.embed_documents(batch))
-
-        assert len(vectors) == len(texts) == len(ids)
-
-        # Безопасный upsert
-        if hasattr(self.collection, "upsert"):
-            # Если есть upsert, используем его
-            self.collection.upsert(ids=ids, embeddings=vectors, metadatas=metas, documents=texts)
-        else:
-            # Ручной upsert: удалить существующие id порциями и добавить
-            for bid in self.batch_iter(ids, 500):
-                try:
-                    self.collection.delete(ids=bid)
-                except Exception:
-                    pass
-            for b_ids, b_vecs, b_meta, b_txt in zip(
-                self.batch_iter(ids, 500),
-                self.batch_iter(vectors, 500),
-                self.batch_iter(metas, 500),
-                self.batch_iter(texts, 500),
-            ):
-                self.collection.add(ids=b_ids, embeddings=b_vecs, metadatas=b_meta, documents=b_txt)
-
-        return {
+        manifest = {
             "persist_dir": os.path.abspath(self.persist_dir),
+            "backend": self.backend.kind,
             "collection": self.collection_name,
-            "count_indexed": len(ids),
-            "unique_audio_titles": sorted({m.get("audio_title", "") for m in metas}),
+            "count_indexed": count,
+            "unique_audio_titles": sorted(audio_titles),
         }
+        if scoped is not None:
+            manifest["scoped_collection"] = scoped_name
+        return manifest
 
+    def index(
+        self,
+        docs: List[Document],
+        extra_metadata: Optional[Dict[str, Any]] = None,
+        scope: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        if not docs:
+            raise ValueError("Список Document пуст.")
+        return self.index_batches(self.batch_iter(docs, self.batch_size), extra_metadata, scope)
+
+    def index_from_file(
+        self,
+        chunks_path: str,
+        extra_metadata: Optional[Dict[str, Any]] = None,
+        scope: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Индексация из файла чанков (ChunkFileWriter): батчи читаются в фоне,
+        эмбеддинг первого батча начинается до того, как файл прочитан целиком.
+        """
+        reader = ChunkFileReader(chunks_path)
+        return self.index_batches(self.prefetch(reader.iter_batches(self.batch_size)), extra_metadata, scope)
 
     def index_from_pkl(self, pkl_path: str) -> Dict[str, Any]:
         if not os.path.isfile(pkl_path):
@@ -139,11 +228,18 @@ class RagIndexer:
         docs: List[Document] = self.load_docs(pkl_path)
         return self.index(docs)
 
+    def index_from_path(self, path: str) -> Dict[str, Any]:
+        """Файл чанков или, для старых выгрузок, .pkl."""
+        if path.endswith(".pkl"):
+            return self.index_from_pkl(path)
+        return self.index_from_file(path)
+
 
 def _cli() -> None:
     ap = argparse.ArgumentParser()
-    ap.add_argument("--docs_pkl", default="out/chunks.pkl", help="Pickle со списком langchain Document (чанки)")
-    ap.add_argument("--persist_dir", default="vectorstore", help="Каталог для Chroma (persist)")
+    ap.add_argument("--chunks", default="out/chunks.jsonl", help="Файл чанков (ChunkFileWriter) или старый .pkl")
+    ap.add_argument("--persist_dir", default="vectorstore", help="Каталог хранилища (persist)")
+    ap.add_argument("--backend", default=None, help="chroma|hnsw (по умолчанию VECTOR_BACKEND или chroma)")
     ap.add_argument("--collection", default="audio_chunks", help="Имя коллекции")
     ap.add_argument("--batch_size", type=int, default=64, help="Размер батча для эмбеддингов")
     ap.add_argument("--device", default=None, help="Устройство вычислений (cuda|cpu|mps)")
@@ -154,8 +250,9 @@ def _cli() -> None:
         collection=args.collection,
         batch_size=args.batch_size,
         device=args.device,
+        backend=args.backend,
     )
-    manifest = indexer.index_from_pkl(args.docs_pkl)
+    manifest = indexer.index_from_path(args.chunks)
 
     os.makedirs("out", exist_ok=True)
     RagIndexer.save_manifest("out/ingest_manifest.json", manifest)
@@ -3,7 +3,7 @@ from typing import Optional, Dict, Any
 from prep.rag_db.rag_index_to_chroma_db import RagIndexer
 
 def run_index(
-    docs_pkl: str = "out/chunks.pkl",
+    chunks_path: str = "out/chunks.jsonl",
     persist_dir: str = "vectorstore",
     collection: str = "audio_chunks",
     batch_size: int = 64,
@@ -15,14 +15,14 @@ def run_index(
         batch_size=batch_size,
         device=device,
     )
-    manifest = indexer.index(docs_pkl)
+    manifest = indexer.index_from_path(chunks_path)
     os.makedirs("out", exist_ok=True)
     RagIndexer.save_manifest("out/ingest_manifest.json", manifest)
     return manifest
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--docs_pkl", default="out/chunks.pkl", help="Pickle со списком langchain Document (чанки)")
+    ap.add_argument("--chunks", default="out/chunks.jsonl", help="Файл чанков (ChunkFileWriter) или старый .pkl")
     ap.add_argument("--persist_dir", default="vectorstore", help="Каталог для Chroma (persist)")
     ap.add_argument("--collection", default="audio_chunks", help="Имя коллекции")
     ap.add_argument("--batch_size", type=int, default=64, help="Размер батча для эмбеддингов")
@@ -35,7 +35,7 @@ def main():
         batch_size=args.batch_size,
         device=args.device,
     )
-    manifest = indexer.index(args.docs_pkl)
+    manifest = indexer.index_from_path(args.chunks)
 
     os.makedirs("out", exist_ok=True)
     RagIndexer.save_manifest("out/ingest_manifest.json", manifest)
@@ -0,0 +1,487 @@
+"""
+Векторное хранилище за общим интерфейсом: upsert, delete, query с фильтром, count.
+
+Реализации:
+  • chroma — chromadb.PersistentClient (по умолчанию, как раньше);
+  • hnsw   — hnswlib в процессе: граф в файле index.bin, метаданные и тексты —
+             в отдельной таблице (журнал meta.jsonl, только дозапись). Нет SQLite
+             и его усиления записи, параметры графа (M, ef) настраиваются.
+
+Бэкенд выбирается переменной VECTOR_BACKEND (chroma|hnsw), данные лежат в
+CHROMA_PERSIST_DIR (hnsw — в подкаталоге hnsw/<коллекция>/).
+Результаты query — плоские списки (ids, documents, metadatas, distances) для одного вектора;
+distances — косинусное расстояние (1 - cos) в обоих бэкендах.
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .chunk_metadata import matches
+
+
+class VectorStore(ABC):
+    """Одна коллекция векторов с метаданными и текстами."""
+
+    name: str
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: Sequence[Sequence[float]], metadatas: List[Dict[str, Any]], documents: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def query(self, embedding: Sequence[float], n_results: int, where: Optional[Dict[str, Any]] = None) -> Dict[str, List[Any]]:
+        ...
+
+    @abstractmethod
+    def get(self, include: Iterable[str] = ("documents", "metadatas"), limit: Optional[int] = None, offset: int = 0) -> Dict[str, List[Any]]:
+        """Страница записей в порядке добавления (для BM25 и миграции)."""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    def persist(self) -> None:
+        """Сбросить изменения на диск (Chroma пишет сразу)."""
+
+
+class VectorBackend(ABC):
+    """Набор коллекций в одном каталоге."""
+
+    kind: str
+
+    @abstractmethod
+    def get_or_create(self, name: str) -> VectorStore:
+        ...
+
+    @abstractmethod
+    def get(self, name: str) -> VectorStore:
+        """Существующая коллекция; KeyError, если её нет."""
+
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        ...
+
+    @abstractmethod
+    def list_names(self) -> List[str]:
+        ...
+
+
+# -----------------------
+# CHROMA
+# -----------------------
+class ChromaStore(VectorStore):
+    UPSERT_BATCH = 500
+
+    def __init__(self, collection, name: str) -> None:
+        self.collection = collection
+        self.name = name
+
+    def upsert(self, ids, embeddings, metadatas, documents) -> None:
+        embeddings = [list(map(float, v)) for v in embeddings]
+        if hasattr(self.collection, "upsert"):
+            self.collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+            return
+        # Старые версии chromadb без upsert: удалить существующие id порциями и добавить
+        for i in range(0, len(ids), self.UPSERT_BATCH):
+            part = slice(i, i + self.UPSERT_BATCH)
+            try:
+                self.collection.delete(ids=ids[part])
+            except Exception:
+                pass
+            self.collection.add(ids=ids[part], embeddings=embeddings[part], metadatas=metadatas[part], documents=documents[part])
+
+    def delete(self, ids) -> None:
+        self.collection.delete(ids=ids)
+
+    def query(self, embedding, n_results, where=None):
+        kwargs: Dict[str, Any] = {"where": where} if where else {}
+        res = self.collection.query(query_embeddings=[list(map(float, embedding))], n_results=n_results, **kwargs)
+        return {key: res[key][0] for key in ("ids", "documents", "metadatas", "distances")}
+
+    def get(self, include=("documents", "metadatas"), limit=None, offset=0):
+        return self.collection.get(include=list(include), limit=limit, offset=offset)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+class ChromaBackend(VectorBackend):
+    kind = "chroma"
+
+    def __init__(self, persist_dir: str) -> None:
+        import chromadb
+        self.persist_dir = persist_dir
+        self.client = chromadb.PersistentClient(path=persist_dir)
+
+    def get_or_create(self, name: str) -> ChromaStore:
+        try:
+            collection = self.client.get_or_create_collection(
+                name=name,
+                metadata={"hnsw:space": "cosine"},  # на случай новых версий
+            )
+        except TypeError:
+            # Для старых версий chromadb без metadata
+            collection = self.client.get_or_create_collection(name=name)
+        return ChromaStore(collection, name)
+
+    def get(self, name: str) -> ChromaStore:
+        try:
+            return ChromaStore(self.client.get_collection(name), name)
+        except Exception as e:   # тип исключения зависит от версии chromadb
+            raise KeyError(name) from e
+
+    def delete(self, name: str) -> None:
+        self.client.delete_collection(name)
+
+    def list_names(self) -> List[str]:
+        # До 0.6 list_collections возвращает объекты, после — имена
+        return [c if isinstance(c, str) else c.name for c in self.client.list_collections()]
+
+
+# -----------------------
+# HNSWLIB
+# -----------------------
+class HnswStore(VectorStore):
+    """
+    Граф hnswlib + таблица метаданных. Метки hnswlib — целые числа, id чанка
+    сопоставляется метке; при upsert существующего id вектор заменяется на месте.
+    Таблица — журнал JSON Lines: строка на добавление/замену и на удаление,
+    при persist() журнал сжимается, если мёртвых строк больше живых.
+    Если коллекцию сохранил другой экземпляр (индексатор в этом или другом
+    процессе), перед обращением граф и таблица перечитываются — по смене params.json.
+    """
+    INITIAL_CAPACITY = 10000
+    EXACT_SUBSET = 20000   # под фильтром не больше записей — точный поиск numpy вместо графа
+    SUBSET_CACHE = 32      # сколько последних фильтров помнить
+
+    def __init__(self, path: str, name: str, M: int = 16, ef_construction: int = 200, ef: int = 64) -> None:
+        self.path = path
+        self.name = name
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef = ef
+        self._index = None
+        self._dim: Optional[int] = None
+        self._labels: Dict[str, int] = {}
+        self._rows: Dict[int, Tuple[str, Dict[str, Any], str]] = {}   # метка -> (id, метаданные, текст)
+        self._next_label = 0
+        self._log_lines = 0
+        self._dirty = False
+        self._subsets: "OrderedDict[str, Tuple[Any, Any]]" = OrderedDict()
+        self._params_version: Optional[Tuple[int, int]] = None
+        os.makedirs(path, exist_ok=True)
+        self._load()
+        self._log = open(self._log_path, "a", encoding="utf-8")
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.path, "index.bin")
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.path, "meta.jsonl")
+
+    @property
+    def _params_path(self) -> str:
+        return os.path.join(self.path, "params.json")
+
+    def _new_index(self, dim: int, capacity: int):
+        import hnswlib
+        index = hnswlib.Index(space="cosine", dim=dim)
+        index.init_index(max_elements=capacity, ef_construction=self.ef_construction, M=self.M)
+        index.set_ef(self.ef)
+        return index
+
+    def _saved_version(self) -> Optional[Tuple[int, int]]:
+        # params.json заменяется целиком — новый inode даже при грубом mtime файловой системы
+        try:
+            st = os.stat(self._params_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _reload_if_changed(self) -> None:
+        if self._dirty or self._saved_version() == self._params_version:
+            return   # свои несохранённые записи не теряем; чужие увидим после нашего persist()
+        print(f"[LOG] HnswStore {self.name}: коллекция сохранена другим экземпляром, перечитываю")
+        self._log.close()
+        self._index = None
+        self._dim = None
+        self._labels = {}
+        self._rows = {}
+        self._next_label = 0
+        self._log_lines = 0
+        self._subsets.clear()
+        self._load()
+        self._log = open(self._log_path, "a", encoding="utf-8")   # журнал мог быть заменён при сжатии
+
+    def _load(self) -> None:
+        self._params_version = self._saved_version()
+        if self._params_version is None:
+            return
+        with open(self._params_path, encoding="utf-8") as f:
+            params = json.load(f)
+        self._dim = params["dim"]
+        self.M = params.get("M", self.M)
+        self.ef_construction = params.get("ef_construction", self.ef_construction)
+        self._next_label = params.get("next_label", 0)
+
+        import hnswlib
+        self._index = hnswlib.Index(space="cosine", dim=self._dim)
+        self._index.load_index(self._index_path, max_elements=params.get("capacity", 0))
+        self._index.set_ef(self.ef)
+        in_index = set(self._index.get_ids_list())
+
+        if os.path.isfile(self._log_path):
+            valid_end = 0
+            with open(self._log_path, "rb") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break   # недописанная последняя строка
+                    valid_end += len(line)
+                    self._log_lines += 1
+                    label = rec["l"]
+                    old = self._rows.pop(label, None)
+                    if old is not None:
+                        self._labels.pop(old[0], None)
+                    if rec.get("del"):
+                        continue
+                    self._rows[label] = (rec["id"], rec.get("m") or {}, rec.get("d") or "")
+                    self._labels[rec["id"]] = label
+            if valid_end < os.path.getsize(self._log_path):
+                with open(self._log_path, "r+b") as f:
+                    f.truncate(valid_end)
+        # Строки, записанные после последнего persist(), без вектора в сохранённом графе
+        for label in [l for l in self._rows if l not in in_index]:
+            self._labels.pop(self._rows.pop(label)[0], None)
+        # ...и векторы, удалённые после него: в графе они ещё не помечены
+        for label in in_index.difference(self._rows):
+            try:
+                self._index.mark_deleted(label)
+            except RuntimeError:
+                pass   # уже помечен
+        self._next_label = max([self._next_label] + [l + 1 for l in in_index])   # метки удалённых не переиспользуются
+
+    def _write_log(self, rec: Dict[str, Any]) -> None:
+        self._log.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._log_lines += 1
+
+    def upsert(self, ids, embeddings, metadatas, documents) -> None:
+        import numpy as np
+        if not ids:
+            return
+        self._reload_if_changed()
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self._index is None:
+            self._dim = vectors.shape[1]
+            self._index = self._new_index(self._dim, max(self.INITIAL_CAPACITY, len(ids)))
+        elif vectors.shape[1] != self._dim:
+            raise ValueError(f"Размерность {vectors.shape[1]} не совпадает с коллекцией {self.name} ({self._dim})")
+
+        labels = []
+        for chunk_id in ids:
+            label = self._labels.get(chunk_id)
+            if label is None:
+                label = self._next_label
+                self._next_label += 1
+            labels.append(label)
+        needed = self._next_label
+        capacity = self._index.get_max_elements()
+        if needed > capacity:
+            self._index.resize_index(max(needed, capacity * 2))
+
+        self._index.add_items(vectors, labels)
+        for chunk_id, label, meta, doc in zip(ids, labels, metadatas, documents):
+            self._labels[chunk_id] = label
+            self._rows[label] = (chunk_id, meta, doc)
+            self._write_log({"l": label, "id": chunk_id, "m": meta, "d": doc})
+        self._subsets.clear()
+        self._dirty = True
+
+    def delete(self, ids) -> None:
+        self._reload_if_changed()
+        for chunk_id in ids:
+            label = self._labels.pop(chunk_id, None)
+            if label is None:
+                continue
+            self._rows.pop(label, None)
+            self._index.mark_deleted(label)
+            self._write_log({"l": label, "del": True})
+        self._subsets.clear()
+        self._dirty = True
+
+    def _subset(self, where: Dict[str, Any]):
+        """
+        Метки записей под фильтром (и их векторы, если записей мало) — кешируются
+        до следующей записи: запросы с одной областью (видео, автор) идут подряд.
+        """
+        import numpy as np
+        key = json.dumps(where, sort_keys=True, ensure_ascii=False)
+        if key in self._subsets:
+            self._subsets.move_to_end(key)
+            return self._subsets[key]
+        labels = np.fromiter((l for l, (_, meta, _) in self._rows.items() if matches(meta, where)), dtype=np.int64)
+        vectors = None
+        if 0 < len(labels) <= self.EXACT_SUBSET:
+            vectors = np.asarray(self._index.get_items(labels), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        self._subsets[key] = (labels, vectors)
+        if len(self._subsets) > self.SUBSET_CACHE:
+            self._subsets.popitem(last=False)
+        return labels, vectors
+
+    def _result(self, labels, distances) -> Dict[str, List[Any]]:
+        result: Dict[str, List[Any]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for label, dist in zip(labels, distances):
+            chunk_id, meta, doc = self._rows[int(label)]
+            result["ids"].append(chunk_id)
+            result["documents"].append(doc)
+            result["metadatas"].append(meta)
+            result["distances"].append(float(dist))
+        return result
+
+    def query(self, embedding, n_results, where=None):
+        import numpy as np
+        self._reload_if_changed()
+        if self._index is None or not self._rows:
+            return self._result([], [])
+        q = np.asarray([embedding], dtype=np.float32)
+        k = min(n_results, len(self._rows))
+        flt = None
+        if where:
+            labels, vectors = self._subset(where)
+            k = min(k, len(labels))
+            if k == 0:
+                return self._result([], [])
+            if vectors is not None:
+                # Под фильтр попало немного записей — точный поиск по ним быстрее обхода графа
+                dist = 1.0 - vectors @ (q[0] / (np.linalg.norm(q[0]) + 1e-12))
+                top = np.argpartition(dist, k - 1)[:k]
+                top = top[np.argsort(dist[top])]
+                return self._result(labels[top], dist[top])
+            allowed = set(labels.tolist())
+            flt = allowed.__contains__
+        self._index.set_ef(max(self.ef, k))
+        try:
+            found, distances = self._index.knn_query(q, k=k, filter=flt)
+        except RuntimeError:
+            # Граф не нашёл k кандидатов (много удалённых или узкий фильтр) — шире поиск
+            self._index.set_ef(max(self.ef, k) * 10)
+            found, distances = self._index.knn_query(q, k=k, filter=flt)
+        return self._result(found[0], distances[0])
+
+    def get(self, include=("documents", "metadatas"), limit=None, offset=0):
+        self._reload_if_changed()
+        labels = sorted(self._rows)[offset:None if limit is None else offset + limit]
+        page: Dict[str, List[Any]] = {"ids": [self._rows[l][0] for l in labels]}
+        if "metadatas" in include:
+            page["metadatas"] = [self._rows[l][1] for l in labels]
+        if "documents" in include:
+            page["documents"] = [self._rows[l][2] for l in labels]
+        if "embeddings" in include:
+            page["embeddings"] = [list(v) for v in self._index.get_items(labels)] if labels else []
+        return page
+
+    def count(self) -> int:
+        self._reload_if_changed()
+        return len(self._rows)
+
+    def persist(self) -> None:
+        if not self._dirty or self._index is None:
+            return
+        # Сначала граф (через временный файл), потом параметры — журнал уже на диске
+        self._log.flush()
+        tmp = self._index_path + ".tmp"
+        self._index.save_index(tmp)
+        os.replace(tmp, self._index_path)
+        # params.json — признак готового сохранения для других экземпляров: тоже через временный файл
+        tmp = self._params_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self._dim,
+                "M": self.M,
+                "ef_construction": self.ef_construction,
+                "next_label": self._next_label,
+                "capacity": self._index.get_max_elements(),
+            }, f)
+        os.replace(tmp, self._params_path)
+        self._params_version = self._saved_version()
+        if self._log_lines > 2 * len(self._rows):
+            self._compact()
+        self._dirty = False
+
+    def _compact(self) -> None:
+        self._log.close()
+        tmp = self._log_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for label in sorted(self._rows):
+                chunk_id, meta, doc = self._rows[label]
+                f.write(json.dumps({"l": label, "id": chunk_id, "m": meta, "d": doc}, ensure_ascii=False) + "\n")
+        os.replace(tmp, self._log_path)
+        self._log_lines = len(self._rows)
+        self._log = open(self._log_path, "a", encoding="utf-8")
+
+    def close(self) -> None:
+        self.persist()
+        self._log.close()
+
+
+class HnswBackend(VectorBackend):
+    kind = "hnsw"
+
+    def __init__(self, persist_dir: str, M: int = 16, ef_construction: int = 200, ef: int = 64) -> None:
+        self.persist_dir = persist_dir
+        self.root = os.path.join(persist_dir, "hnsw")
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef = ef
+        self._stores: Dict[str, HnswStore] = {}
+
+    def get_or_create(self, name: str) -> HnswStore:
+        if name not in self._stores:
+            self._stores[name] = HnswStore(os.path.join(self.root, name), name, self.M, self.ef_construction, self.ef)
+        return self._stores[name]
+
+    def get(self, name: str) -> HnswStore:
+        if name not in self._stores and not os.path.isfile(os.path.join(self.root, name, "params.json")):
+            raise KeyError(name)
+        return self.get_or_create(name)
+
+    def delete(self, name: str) -> None:
+        import shutil
+        store = self._stores.pop(name, None)
+        if store is not None:
+            store._log.close()
+        shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def list_names(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(n for n in os.listdir(self.root) if os.path.isfile(os.path.join(self.root, n, "params.json")))
+
+
+def open_backend(kind: Optional[str] = None, persist_dir: Optional[str] = None) -> VectorBackend:
+    """
+    Бэкенд по имени (по умолчанию VECTOR_BACKEND, иначе chroma).
+    Параметры hnsw — HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF.
+    """
+    kind = (kind or os.getenv("VECTOR_BACKEND") or "chroma").lower()
+    persist_dir = persist_dir or os.getenv("CHROMA_PERSIST_DIR") or "vectorstore"
+    if kind == "chroma":
+        return ChromaBackend(persist_dir)
+    if kind == "hnsw":
+        return HnswBackend(
+            persist_dir,
+            M=int(os.getenv("HNSW_M") or 16),
+            ef_construction=int(os.getenv("HNSW_EF_CONSTRUCTION") or 200),
+            ef=int(os.getenv("HNSW_EF") or 64),
+        )
+    raise ValueError(f"Неизвестный VECTOR_BACKEND: {kind} (ожидается chroma или hnsw)")
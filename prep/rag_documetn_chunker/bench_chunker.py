@@ -0,0 +1,118 @@
+"""
+Бенчмарк DocumentChunker: пропускная способность и распределение длин чанков в токенах.
+
+Сравнивает прежний chunk (копия ниже, окна по 3 сегмента), текущий режим по сегментам
+(результат обязан совпасть с прежним), режим по токенам и потоковый chunk_stream
+на синтетическом транскрипте с фразами разной длины.
+
+Пример:
+    python -m prep.rag_documetn_chunker.bench_chunker --segments 100000
+    python -m prep.rag_documetn_chunker.bench_chunker --hf     # настоящий токенизатор e5
+"""
+import argparse
+import json
+import math
+import random
+import statistics
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+from prep.rag_documetn_chunker.document_chunker import DocumentChunker, approx_token_count
+
+E5_LIMIT = 512
+VOCAB = "открываем справочник номенклатура нажимаем кнопку создать документ проведение проводки регистр".split()
+
+
+def _legacy_chunk(documents, chunk_size=3, chunk_overlap=0.5):
+    """Реализация DocumentChunker.chunk до окон по токенам — эталон для сравнения."""
+    buckets = defaultdict(list)
+    for d in documents:
+        buckets[d.metadata.get("audio_title", "")].append(d)
+    result = []
+    step = max(1, math.ceil(chunk_size * (1 - chunk_overlap)))
+    for audio_title, docs in buckets.items():
+        docs_sorted = sorted(docs, key=lambda x: float(x.metadata.get("start", 0.0)))
+        i = 0
+        while i < len(docs_sorted):
+            chunk_docs = docs_sorted[i:i + chunk_size]
+            start_s = float(chunk_docs[0].metadata["start"])
+            end_s = float(chunk_docs[-1].metadata["end"])
+            indeces = [int(d.metadata.get("segment_index", -1)) for d in chunk_docs]
+            result.append(Document(page_content="\n".join(d.page_content for d in chunk_docs), metadata={
+                "audio_title": Path(str(audio_title)).name,
+                "start": start_s,
+                "end": end_s,
+                "timestamp_range": f"{DocumentChunker._fmt_ts(start_s)} - {DocumentChunker._fmt_ts(end_s)}",
+                "segment_indices": json.dumps(indeces, ensure_ascii=False),
+                "segments_in_chunk": len(chunk_docs),
+            }))
+            i += step
+    return result
+
+
+def make_docs(n: int, seed: int = 0):
+    """Сегменты как у Transcription.segments_to_documents: от реплик в 2 слова до монологов в 120."""
+    rng = random.Random(seed)
+    docs, t = [], 0.0
+    for i in range(n):
+        words = int(rng.lognormvariate(2.6, 0.8)) % 120 + 2
+        text = " ".join(rng.choice(VOCAB) for _ in range(words)).capitalize() + "."
+        dur = words * 0.35
+        docs.append(Document(page_content=text, metadata={
+            "audio_title": f"/data/lecture_{i * 4 // n}.wav",
+            "start": t, "end": t + dur, "segment_index": i,
+            "timestamp_range": "",
+        }))
+        t += dur + 0.5
+    return docs
+
+
+def _distribution(label, chunks, counter):
+    lengths = sorted(counter([c.page_content for c in chunks]))
+    p = lambda q: lengths[min(len(lengths) - 1, int(q * len(lengths)))]
+    over = sum(1 for n in lengths if n > E5_LIMIT) / len(lengths) * 100
+    print(f"  {label:12s} чанков {len(lengths):7d} | токенов min {lengths[0]:4d} p50 {p(0.5):4d} "
+          f"p95 {p(0.95):4d} max {lengths[-1]:5d} | σ {statistics.pstdev(lengths):6.1f} | > {E5_LIMIT}: {over:5.1f}%")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--segments", type=int, default=100_000)
+    ap.add_argument("--max_tokens", type=int, default=480)
+    ap.add_argument("--overlap_tokens", type=int, default=64)
+    ap.add_argument("--hf", action="store_true", help="считать токены токенизатором e5, а не оценкой")
+    args = ap.parse_args()
+
+    counter = DocumentChunker.hf_token_counter() if args.hf else approx_token_count
+    docs = make_docs(args.segments)
+    print(f"Сегментов: {len(docs)}")
+
+    def timed(label, fn):
+        t0 = time.perf_counter()
+        chunks = fn()
+        dt = time.perf_counter() - t0
+        print(f"{label:28s} {dt:7.3f} с  ({len(docs) / dt:,.0f} сегм/с)")
+        return chunks
+
+    legacy = timed("прежний chunk (3 сегмента)", lambda: _legacy_chunk(docs))
+    by_segments = timed("chunk по сегментам", lambda: DocumentChunker().chunk(docs))
+    same = [(c.page_content, c.metadata) for c in legacy] == [(c.page_content, c.metadata) for c in by_segments]
+    print(f"  совпадает с прежним: {same}")
+    streamed = timed("chunk_stream по сегментам", lambda: list(DocumentChunker().chunk_stream(iter(docs))))
+    print(f"  совпадает с chunk:   {[c.metadata for c in streamed] == [c.metadata for c in by_segments]}")
+
+    token_chunker = lambda: DocumentChunker(max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens, token_counter=counter)
+    by_tokens = timed("chunk по токенам", lambda: token_chunker().chunk(docs))
+    streamed = timed("chunk_stream по токенам", lambda: list(token_chunker().chunk_stream(iter(docs))))
+    print(f"  совпадает с chunk:   {[c.metadata for c in streamed] == [c.metadata for c in by_tokens]}")
+
+    print("Длины чанков:")
+    _distribution("3 сегмента", by_segments, counter)
+    _distribution(f"{args.max_tokens} токенов", by_tokens, counter)
+
+
+if __name__ == "__main__":
+    main()
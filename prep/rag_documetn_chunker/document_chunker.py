@@ -1,22 +1,57 @@
-import math, json
-from typing import List, Dict, DefaultDict
+import math, re
+from collections import deque
+from itertools import groupby
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, Tuple, DefaultDict
 from collections import defaultdict
 from langchain_core.documents import Document
 from pathlib import Path
 
 
+# Грубая оценка числа токенов, если токенизатор e5 недоступен:
+# sentencepiece XLM-R режет русское слово в среднем на 1.5–2 токена
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def approx_token_count(texts: List[str]) -> List[int]:
+    return [math.ceil(len(_TOKEN_RE.findall(t)) * 1.7) for t in texts]
+
+
 class DocumentChunker:
     """
     Группирует Document-сегменты в чанки с overlap, сохраняя метаданные.
+
+    Два режима:
+      • по сегментам (по умолчанию) — окно из chunk_size сегментов, overlap — доля окна;
+      • по токенам (max_tokens задан) — сегменты набираются в окно, пока сумма токенов
+        не превысит max_tokens, следующее окно начинается с хвоста не длиннее overlap_tokens.
+        Так длина чанка не выходит за лимит e5 (512 токенов) и не «скачет» от длины фраз.
+    Сегменты не разрезаются: сегмент длиннее max_tokens становится отдельным чанком.
     """
 
-    def __init__(self, chunk_size: int = 3, chunk_overlap: float = 0.5):
+    TOKENIZER_NAME = "intfloat/multilingual-e5-large"
+    TOKENIZE_BATCH = 256      # сегментов на один вызов токенизатора
+
+    _tokenizer = None         # грузится один раз на процесс
+
+    def __init__(
+        self,
+        chunk_size: int = 3,
+        chunk_overlap: float = 0.5,
+        max_tokens: Optional[int] = None,
+        overlap_tokens: int = 64,
+        token_counter: Optional[Callable[[List[str]], List[int]]] = None,
+    ):
         if not (0 <= chunk_overlap < 1):
             raise ValueError("chunk_overlap должен быть в диапазоне [0, 1)")
         if chunk_size <= 0:
             raise ValueError("chunk_size должен быть > 0")
+        if max_tokens is not None and not (0 <= overlap_tokens < max_tokens):
+            raise ValueError("overlap_tokens должен быть в диапазоне [0, max_tokens)")
         self.chunk_size = int(chunk_size)
         self.chunk_overlap = float(chunk_overlap)
+        self.max_tokens = int(max_tokens) if max_tokens is not None else None
+        self.overlap_tokens = int(overlap_tokens)
+        self._count_tokens = token_counter
 
     @staticmethod
     def _fmt_ts(seconds: float) -> str:
@@ -27,6 +62,90 @@ class DocumentChunker:
         hours = seconds // 3600
         return f"{hours:02d}:{minutes:02d}:{s:02d}.{msec:03d}"
 
+    # -----------------------
+    # ПОДСЧЁТ ТОКЕНОВ
+    # -----------------------
+    @classmethod
+    def hf_token_counter(cls) -> Callable[[List[str]], List[int]]:
+        """Счётчик токенов e5 (fast-токенизатор, батчем); без transformers — грубая оценка."""
+        if cls._tokenizer is None:
+            try:
+                from transformers import AutoTokenizer
+                cls._tokenizer = AutoTokenizer.from_pretrained(cls.TOKENIZER_NAME)
+            except (ImportError, OSError):
+                print("[LOG] DocumentChunker: токенизатор e5 недоступен, длина оценивается приблизительно")
+                return approx_token_count
+        tokenizer = cls._tokenizer
+        return lambda texts: [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    def _with_token_counts(self, docs: Iterable[Document]) -> Iterator[Tuple[Document, int]]:
+        """(документ, токенов) — токенизация батчами, подходит и для потока."""
+        if self._count_tokens is None:
+            self._count_tokens = self.hf_token_counter()
+        batch: List[Document] = []
+        for d in docs:
+            batch.append(d)
+            if len(batch) >= self.TOKENIZE_BATCH:
+                yield from zip(batch, self._count_tokens([b.page_content for b in batch]))
+                batch = []
+        if batch:
+            yield from zip(batch, self._count_tokens([b.page_content for b in batch]))
+
+    # -----------------------
+    # ОКНА
+    # -----------------------
+    def _token_windows(self, items: Iterable[Tuple[Document, int]]) -> Iterator[List[Document]]:
+        """
+        Один проход: total — сумма токенов окна, т.е. разность префиксных сумм
+        на его границах. Когда следующий сегмент не помещается, окно отдаётся,
+        а левая граница сдвигается, пока хвост не станет ≤ overlap_tokens
+        и новый сегмент не поместится.
+        """
+        window: Deque[Tuple[Document, int]] = deque()
+        total = fresh = 0
+        for doc, n in items:
+            if window and total + n > self.max_tokens:
+                yield [d for d, _ in window]
+                fresh = 0
+                while window and (total > self.overlap_tokens or total + n > self.max_tokens):
+                    total -= window.popleft()[1]
+            window.append((doc, n))
+            total += n
+            fresh += 1
+        if fresh:
+            yield [d for d, _ in window]
+
+    def _segment_windows(self, docs: List[Document]) -> Iterator[List[Document]]:
+        # Безопасный шаг окна: минимум 1
+        step = max(1, math.ceil(self.chunk_size * (1 - self.chunk_overlap)))
+        for i in range(0, len(docs), step):
+            yield docs[i:i + self.chunk_size]
+
+    def _windows(self, docs: List[Document]) -> Iterator[List[Document]]:
+        if self.max_tokens is None:
+            return self._segment_windows(docs)
+        return self._token_windows(self._with_token_counts(docs))
+
+    @classmethod
+    def _make_chunk(cls, audio_name: str, chunk_docs: List[Document]) -> Document:
+        start_s = float(chunk_docs[0].metadata["start"])
+        end_s = float(chunk_docs[-1].metadata["end"])
+        # Та же строка, что дал бы json.dumps(list[int]), без сериализатора на каждое окно
+        indeces = ", ".join(str(int(d.metadata.get("segment_index", -1))) for d in chunk_docs)
+
+        metadata = {
+            "audio_title": audio_name,
+            "start": start_s,
+            "end": end_s,
+            "timestamp_range": f"{cls._fmt_ts(start_s)} - {cls._fmt_ts(end_s)}",
+            "segment_indices": f"[{indeces}]",
+            "segments_in_chunk": len(chunk_docs),
+        }
+        return Document(page_content="\n".join(d.page_content for d in chunk_docs), metadata=metadata)
+
+    # -----------------------
+    # ПУБЛИЧНЫЕ МЕТОДЫ
+    # -----------------------
     def chunk(self, documents: List[Document]) -> List[Document]:
         if not documents:
             return []
@@ -38,36 +157,43 @@ class DocumentChunker:
             buckets[at].append(d)
 
         result: List[Document] = []
-        # Безопасный шаг окна: минимум 1
-        step = max(1, math.ceil(self.chunk_size * (1 - self.chunk_overlap)))
-
         for audio_title, docs in buckets.items():
+            audio_name = Path(str(audio_title)).name
             # Сортируем по start (число), не по строковому диапазону
             docs_sorted = sorted(docs, key=lambda x: float(x.metadata.get("start", 0.0)))
-            n = len(docs_sorted)
-
-            i = 0
-            while i < n:
-                chunk_docs = docs_sorted[i:i + self.chunk_size]
-                if not chunk_docs:
-                    break
-
-                page = "\n".join(d.page_content for d in chunk_docs)
+            for chunk_docs in self._windows(docs_sorted):
+                result.append(self._make_chunk(audio_name, chunk_docs))
 
-                start_s = float(chunk_docs[0].metadata["start"])
-                end_s = float(chunk_docs[-1].metadata["end"])
-                indeces = [int(d.metadata.get("segment_index", -1)) for d in chunk_docs]
+        return result
 
-                metadata = {
-                    "audio_title": Path(str(audio_title)).name,
-                    "start": start_s,
-                    "end": end_s,
-                    "timestamp_range": f"{self._fmt_ts(start_s)} - {self._fmt_ts(end_s)}",
-                    "segment_indices": json.dumps(indeces, ensure_ascii=False),
-                    "segments_in_chunk": len(chunk_docs),
-                }
+    def chunk_stream(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """
+        Потоковый вариант chunk: сегменты приходят по мере транскрибации
+        (например, из Transcription.iter_transcribe), чанки отдаются сразу.
+        Ожидается порядок транскрипта: сегменты одного audio_title подряд и по возрастанию start.
+        В памяти держится только текущее окно (в режиме по сегментам — chunk_size сегментов).
+        """
+        for audio_title, docs in groupby(documents, key=lambda d: d.metadata.get("audio_title", "")):
+            audio_name = Path(str(audio_title)).name
+            if self.max_tokens is None:
+                windows = self._stream_segment_windows(docs)
+            else:
+                windows = self._token_windows(self._with_token_counts(docs))
+            for chunk_docs in windows:
+                yield self._make_chunk(audio_name, chunk_docs)
 
-                result.append(Document(page_content=page, metadata=metadata))
-                i += step
-
-        return result
\ No newline at end of file
+    def _stream_segment_windows(self, docs: Iterable[Document]) -> Iterator[List[Document]]:
+        """Те же окна, что _segment_windows, но по потоку (шаг окна не больше chunk_size)."""
+        step = max(1, math.ceil(self.chunk_size * (1 - self.chunk_overlap)))
+        window: Deque[Document] = deque()
+        for d in docs:
+            window.append(d)
+            if len(window) == self.chunk_size:
+                yield list(window)
+                for _ in range(step):
+                    window.popleft()
+        # хвост: chunk отдаёт окна с каждого шага до конца, даже короче chunk_size
+        while window:
+            yield list(window)
+            for _ in range(min(step, len(window))):
+                window.popleft()
@@ -1,32 +1,39 @@
-import os, pickle
 from typing import List, Optional, Tuple
 from langchain_core.documents import Document
 from prep.rag_documetn_chunker.document_chunker import DocumentChunker
+from prep.rag_db.chunk_file import ChunkFileWriter, write_chunks
 from prep.transcription_audio.transcription_main import transcription_main
 
 def run_chunker(
     docs: Optional[List[Document]] = None,
-    out_pkl: str = "out/chunks.pkl",
+    out_path: str = "out/chunks.jsonl",
     chunk_size: int = 3,
     chunk_overlap: float = 0.5,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: int = 64,
 ) -> Tuple[List[Document], str]:
     """
     Управляющий вызов для тестов/кода: принимает Documents (если уже есть),
-    либо сам их получит через transcription_main, формирует чанки и сохраняет pkl.
-    Возвращает (chunks, out_pkl).
+    либо сам их получит через transcription_main, формирует чанки и сохраняет
+    их в файл чанков (JSON Lines + индекс, см. prep.rag_db.chunk_file).
+    max_tokens включает окна по токенам (см. DocumentChunker).
+    Возвращает (chunks, out_path).
     """
     if docs is None:
         _, docs = transcription_main(return_docs=True)
     if not docs:
         raise RuntimeError("Не удалось получить документы для чанкинга")
 
-    os.makedirs("out", exist_ok=True)
-    chunker = DocumentChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunker = DocumentChunker(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        max_tokens=max_tokens,
+        overlap_tokens=overlap_tokens,
+    )
     chunks = chunker.chunk(docs)
 
-    with open(out_pkl, "wb") as f:
-        pickle.dump(chunks, f)
-    return chunks, out_pkl
+    write_chunks(out_path, chunks)
+    return chunks, out_path
 
 def main():
     json_path, docs = transcription_main(return_docs=True)
@@ -38,19 +45,19 @@ def main():
     print(f"Количество сегментов: {len(docs)}")
 
     chunker = DocumentChunker(chunk_size=3, chunk_overlap=0.5)
-    chunks = chunker.chunk(docs)
 
-    print(f"\nСформировано чанков: {len(chunks)}\n")
-    for i, chunk in enumerate(chunks[:3]):
-        print(f"=== Чанк {i+1} ===")
-        print(chunk.page_content)
-        print("Metadata:", chunk.metadata)
-        print()
-
-    os.makedirs("out", exist_ok=True)
-    with open("out/chunks.pkl", "wb") as f:
-        pickle.dump(chunks, f)
-    print("Pickle с чанками сохранён: out/chunks.pkl")
+    # Чанки пишутся в файл по мере формирования — весь список в памяти не нужен
+    with ChunkFileWriter("out/chunks.jsonl") as writer:
+        for i, chunk in enumerate(chunker.chunk_stream(docs)):
+            writer.write(chunk)
+            if i < 3:
+                print(f"=== Чанк {i+1} ===")
+                print(chunk.page_content)
+                print("Metadata:", chunk.metadata)
+                print()
+
+    print(f"\nСформировано чанков: {writer.count}\n")
+    print("Файл с чанками сохранён: out/chunks.jsonl")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+Сборка контекста для LLM из найденных чанков без повторов.
+
+Соседние чанки DocumentChunker перекрываются (chunk_overlap=0.5 — половина сегментов
+общая), и при склейке «как есть» один и тот же текст уходит в промпт дважды.
+Здесь чанки одной записи раскладываются обратно на сегменты по segment_indices,
+повторяющиеся сегменты отбрасываются, а идущие подряд склеиваются в непрерывные
+отрезки времени. Отрезки берутся по релевантности (лучшая позиция входящего чанка)
+и набираются по числу токенов, а не символов. Источники — объединённые отрезки.
+"""
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from rag_documetn_chunker.document_chunker import DocumentChunker
+
+PASSAGE_PREFIX = "passage: "
+
+
+def format_ts(seconds: float) -> str:
+    """mm:ss или hh:mm:ss — как в строках «Источники» ответа бота."""
+    try:
+        s = max(0, int(round(seconds)))
+        m, s = divmod(s, 60)
+        h, m = divmod(m, 60)
+        if h > 0:
+            return f"{h:02d}:{m:02d}:{s:02d}"
+        return f"{m:02d}:{s:02d}"
+    except Exception:
+        return "00:00"
+
+
+@dataclass
+class PackedContext:
+    text: str
+    sources: List[Tuple[str, str]]
+    chunks: List[Dict[str, Any]]      # чанки, чьи сегменты попали в контекст, в порядке выдачи
+    tokens: int
+
+
+@dataclass
+class _Span:
+    audio_title: str
+    rank: int
+    start: float
+    end: float
+    segments: Dict[int, str] = field(default_factory=dict)
+    chunks: List[Tuple[int, Dict[str, Any]]] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.segments[i] for i in sorted(self.segments))
+
+
+class ContextPacker:
+    def __init__(self, token_counter: Optional[Callable[[List[str]], List[int]]] = None) -> None:
+        self._count_tokens = token_counter
+
+    @staticmethod
+    def default_token_counter() -> Callable[[List[str]], List[int]]:
+        """
+        Токенизатор модели генерации, если задан CONTEXT_TOKENIZER (имя на Hugging Face,
+        например Qwen/Qwen2.5-7B-Instruct для qwen2.5 в Ollama), иначе токенизатор e5.
+        """
+        name = os.getenv("CONTEXT_TOKENIZER")
+        if name:
+            try:
+                from transformers import AutoTokenizer
+                tokenizer = AutoTokenizer.from_pretrained(name)
+                return lambda texts: [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+            except (ImportError, OSError) as e:
+                print(f"[ERROR] ContextPacker: не удалось загрузить токенизатор {name}: {e}")
+        return DocumentChunker.hf_token_counter()
+
+    @property
+    def count_tokens(self) -> Callable[[List[str]], List[int]]:
+        if self._count_tokens is None:
+            self._count_tokens = self.default_token_counter()
+        return self._count_tokens
+
+    # -----------------------
+    # РАЗБОР ЧАНКОВ
+    # -----------------------
+    @staticmethod
+    def _segments(chunk: Dict[str, Any]) -> Optional[List[Tuple[int, str]]]:
+        """[(segment_index, текст)] или None, если чанк нельзя разложить на сегменты."""
+        meta = chunk.get("meta", {})
+        text = chunk.get("text", "")
+        if text.startswith(PASSAGE_PREFIX):
+            text = text[len(PASSAGE_PREFIX):]
+        try:
+            indices = json.loads(meta.get("segment_indices") or "null")
+        except (TypeError, ValueError):
+            return None
+        lines = text.split("\n")   # DocumentChunker соединяет сегменты переводом строки
+        if not isinstance(indices, list) or len(indices) != len(lines) or -1 in indices:
+            return None
+        return [(int(i), line.strip()) for i, line in zip(indices, lines)]
+
+    def spans(self, chunks: List[Dict[str, Any]]) -> List[_Span]:
+        """Непрерывные отрезки по записям, по убыванию релевантности."""
+        by_audio: Dict[str, Dict[int, Tuple[str, int, Dict[str, Any]]]] = {}
+        spans: List[_Span] = []
+
+        for rank, ch in enumerate(chunks):
+            meta = ch.get("meta", {})
+            audio_title = meta.get("audio_title", "unknown_audio")
+            segments = self._segments(ch)
+            if segments is None:
+                # старые чанки без разметки сегментов — отдельным отрезком как есть
+                span = _Span(audio_title, rank, float(meta.get("start") or 0.0), float(meta.get("end") or 0.0))
+                span.segments[0] = ch.get("text", "").replace(PASSAGE_PREFIX, "", 1).replace("\n", " ").strip()
+                span.chunks.append((rank, ch))
+                spans.append(span)
+                continue
+            seg_map = by_audio.setdefault(audio_title, {})
+            for seg_id, seg_text in segments:
+                seg_map.setdefault(seg_id, (seg_text, rank, ch))   # повторный сегмент отбрасывается
+
+        for audio_title, seg_map in by_audio.items():
+            span: Optional[_Span] = None
+            prev_id = None
+            for seg_id in sorted(seg_map):
+                seg_text, rank, ch = seg_map[seg_id]
+                meta = ch["meta"]
+                if span is None or seg_id != prev_id + 1:
+                    span = _Span(audio_title, rank, float(meta.get("start") or 0.0), float(meta.get("end") or 0.0))
+                    spans.append(span)
+                span.segments[seg_id] = seg_text
+                if all(c is not ch for _, c in span.chunks):
+                    span.chunks.append((rank, ch))
+                    span.rank = min(span.rank, rank)
+                    span.start = min(span.start, float(meta.get("start") or span.start))
+                    span.end = max(span.end, float(meta.get("end") or span.end))
+                prev_id = seg_id
+
+        spans.sort(key=lambda s: s.rank)
+        return spans
+
+    # -----------------------
+    # УПАКОВКА
+    # -----------------------
+    def pack(self, chunks: List[Dict[str, Any]], max_tokens: int) -> PackedContext:
+        spans = self.spans(chunks)
+        if not spans:
+            return PackedContext("", [], [], 0)
+        texts = [s.text for s in spans]
+        sizes = self.count_tokens(texts)
+
+        lines: List[str] = []
+        sources: List[Tuple[str, str]] = []
+        used: List[Tuple[int, Dict[str, Any]]] = []
+        total = 0
+        for span, text, n in zip(spans, texts, sizes):
+            if lines and total + n > max_tokens:
+                continue   # не влез — следующий отрезок может быть короче
+            lines.append(f"[{len(lines) + 1}] {text}")
+            sources.append((span.audio_title, f"{format_ts(span.start)} - {format_ts(span.end)}"))
+            used.extend(span.chunks)
+            total += n
+
+        used.sort(key=lambda x: x[0])
+        return PackedContext("\n".join(lines), sources, [ch for _, ch in used], total)
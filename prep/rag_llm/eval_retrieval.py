@@ -0,0 +1,248 @@
+"""
+Оценка качества и скорости поиска RAG на размеченном наборе вопросов.
+
+Размеченный набор — JSON-список или JSONL, по вопросу на запись:
+    {"question": "Где хранятся настройки веб-сервиса?", "audio_title": "meeting.wav", "start": 754.0, "end": 812.5}
+Ответ найден, если в контекст попал чанк той же записи, пересекающий [start, end].
+
+Для каждой комбинации чанкинга и эмбеддера строится (или переиспользуется) тестовая
+коллекция в отдельном каталоге Chroma, затем вопросы прогоняются через
+LLMClient.retrieve_for_context → _build_context с разными hybrid / rerank / top_k / score_threshold.
+Ollama не нужна: LLM не вызывается. Итог — одна таблица: recall@k, MRR,
+p50/p95 задержки поиска, средний размер контекста.
+
+Запуск из каталога prep:
+    python -m rag_llm.eval_retrieval --labels eval/questions.jsonl \\
+        --transcripts out/meeting.tsb out/lecture.json \\
+        --chunking 3:0.5 5:0.4 t480:64 --hybrid 0 1 --top_k 3 5 10 --thresholds 0.3 0.5
+
+    # уже проиндексированная коллекция (чанкинг и эмбеддер — как при индексации)
+    python -m rag_llm.eval_retrieval --labels eval/questions.jsonl --collection audio_chunks --persist_dir vectorstore
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from rag_llm.llm_client import LLMClient, LLMSettings
+from rag_documetn_chunker.document_chunker import DocumentChunker
+
+
+# -----------------------
+# ДАННЫЕ
+# -----------------------
+def load_labels(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            items = [json.loads(line) for line in f if line.strip()]
+        else:
+            items = json.load(f)
+    for item in items:
+        item["audio_title"] = Path(item["audio_title"]).name
+        item["start"], item["end"] = float(item["start"]), float(item["end"])
+    return items
+
+
+def load_documents(transcripts: List[str]):
+    from transcription_audio.transcription import Transcription
+    from transcription_audio.transcript_io import iter_segments, read_audio_file
+
+    docs = []
+    for path in transcripts:
+        # audio_title как у основного конвейера — имя исходного аудиофайла
+        audio_path = read_audio_file(path) or os.path.splitext(path)[0] + ".wav"
+        docs.extend(Transcription.segments_to_documents(iter_segments(path, with_words=False), audio_path))
+    return docs
+
+
+def make_chunker(spec: str) -> DocumentChunker:
+    """'3:0.5' — окно из 3 сегментов с перекрытием 0.5; 't480:64' — окно 480 токенов, перекрытие 64."""
+    size, overlap = spec.lstrip("t").split(":")
+    if spec.startswith("t"):
+        return DocumentChunker(max_tokens=int(size), overlap_tokens=int(overlap))
+    return DocumentChunker(chunk_size=int(size), chunk_overlap=float(overlap))
+
+
+def collection_name(spec: str, embedding_model: str) -> str:
+    size, overlap = spec.lstrip("t").split(":")
+    mode = "t" if spec.startswith("t") else "s"
+    model_hash = hashlib.md5(embedding_model.encode("utf-8")).hexdigest()[:8]
+    return f"eval_{mode}{size}_o{overlap.replace('.', '')}_{model_hash}"
+
+
+def ensure_collection(indexers: Dict[str, Any], docs, spec: str, embedding_model: str, persist_dir: str, rebuild: bool) -> str:
+    """Тестовая коллекция для пары (чанкинг, эмбеддер); готовая переиспользуется."""
+    from rag_db.rag_index_to_chroma_db import RagIndexer
+
+    name = collection_name(spec, embedding_model)
+    if embedding_model not in indexers:
+        indexers[embedding_model] = RagIndexer(persist_dir=persist_dir, collection=name, model_name=embedding_model)
+    indexer = indexers[embedding_model]
+
+    if rebuild:
+        try:
+            indexer.backend.delete(name)
+        except Exception:
+            pass
+    indexer.use_collection(name)
+    if indexer.collection.count() == 0:
+        if not docs:
+            raise ValueError(f"Коллекции {name} нет, а транскрипты для её построения не заданы (--transcripts)")
+        chunks = make_chunker(spec).chunk(docs)
+        print(f"[LOG] {name}: индексирую {len(chunks)} чанков")
+        indexer.index(chunks)
+    return name
+
+
+# -----------------------
+# МЕТРИКИ
+# -----------------------
+def is_hit(chunk: Dict[str, Any], label: Dict[str, Any]) -> bool:
+    meta = chunk.get("meta", {})
+    if Path(str(meta.get("audio_title", ""))).name != label["audio_title"]:
+        return False
+    if meta.get("start") is None or meta.get("end") is None:
+        return False
+    return float(meta["start"]) <= label["end"] and float(meta["end"]) >= label["start"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def evaluate(
+    client: LLMClient,
+    collection: str,
+    labels: List[Dict[str, Any]],
+    hybrid: bool,
+    top_k: int,
+    thresholds: List[float],
+    max_chars: int,
+    rerank: bool = False,
+    context_tokens: int = 3000,
+    pack: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Строки таблицы для одной коллекции, режимов hybrid/rerank и top_k — по строке на порог.
+    С rerank порог дистанции не применяется (как в generate_with_retrieval) — одна строка.
+    """
+    def retrieve(question: str):
+        return client.retrieve_for_context(
+            question, top_k=top_k, hybrid=hybrid, rerank=rerank,
+            context_tokens=context_tokens, collection_name=collection,
+        )
+
+    retrieve(labels[0]["question"])  # прогрев: модели, коллекция, BM25
+    # Эмбеддинги вопросов остались бы в кеше от прогрева и прошлых прогонов
+    # этого клиента — задержка без них была бы занижена
+    client.query_cache.clear()
+
+    latencies, retrieved = [], []
+    for label in labels:
+        t0 = time.perf_counter()
+        retrieved.append(retrieve(label["question"]))
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    rows = []
+    for threshold in ([float("inf")] if rerank else thresholds):
+        hits, reciprocal, context_chars = 0, 0.0, 0
+        for label, chunks in zip(labels, retrieved):
+            if pack:
+                packed = client._pack_context(chunks, top_k, threshold, context_tokens)
+                context, in_context = packed.text, packed.chunks
+            else:
+                context, sources = client._build_context(chunks, top_k, threshold, max_chars)
+                # в контекст попадает начало отобранного списка — столько чанков, сколько источников
+                in_context = client._select_chunks(chunks, top_k, threshold)[:len(sources)]
+            rank = next((i for i, ch in enumerate(in_context, start=1) if is_hit(ch, label)), None)
+            if rank:
+                hits += 1
+                reciprocal += 1.0 / rank
+            context_chars += len(context)
+        rows.append({
+            "hybrid": hybrid,
+            "rerank": rerank,
+            "pack": pack,
+            "top_k": top_k,
+            "score_threshold": threshold,
+            "recall_at_k": hits / len(labels),
+            "mrr": reciprocal / len(labels),
+            "p50_ms": percentile(latencies, 0.5),
+            "p95_ms": percentile(latencies, 0.95),
+            "avg_context_chars": context_chars / len(labels),
+        })
+    return rows
+
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    print(f"{'чанкинг':10s} | {'эмбеддер':32s} | hyb | rrk | pck | top_k | порог | recall@k |   MRR  | p50, мс | p95, мс | контекст")
+    for r in rows:
+        print(
+            f"{r['chunking']:10s} | {r['embedding'][-32:]:32s} | {'да' if r['hybrid'] else 'нет':3s} | "
+            f"{'да' if r['rerank'] else 'нет':3s} | {'да' if r['pack'] else 'нет':3s} | {r['top_k']:5d} | "
+            f"{r['score_threshold']:5.2f} | {r['recall_at_k']:8.3f} | {r['mrr']:6.3f} | {r['p50_ms']:7.1f} | "
+            f"{r['p95_ms']:7.1f} | {r['avg_context_chars']:8.0f}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--labels", required=True, help="JSON/JSONL: question, audio_title, start, end")
+    ap.add_argument("--transcripts", nargs="*", default=[], help="Транскрипты (.json/.jsonl/.tsb) для тестовых коллекций")
+    ap.add_argument("--collection", default=None, help="Оценить готовую коллекцию вместо построения тестовых")
+    ap.add_argument("--persist_dir", default="out/eval_vectorstore", help="Каталог хранилища для тестовых коллекций")
+    ap.add_argument("--backend", default=None, help="chroma|hnsw (по умолчанию VECTOR_BACKEND или chroma)")
+    ap.add_argument("--chunking", nargs="+", default=["3:0.5"], help="'3:0.5' (сегменты) или 't480:64' (токены)")
+    ap.add_argument("--embeddings", nargs="+", default=[LLMClient.EMBEDDING_MODEL])
+    ap.add_argument("--hybrid", nargs="+", type=int, default=[0, 1], help="0 — только векторный поиск, 1 — + BM25")
+    ap.add_argument("--rerank", nargs="+", type=int, default=[0], help="1 — переранжирование cross-encoder'ом")
+    ap.add_argument("--pack", nargs="+", type=int, default=[0, 1], help="1 — склейка чанков без повторов (ContextPacker)")
+    ap.add_argument("--context_tokens", type=int, default=3000, help="Бюджет токенов контекста (rerank, pack)")
+    ap.add_argument("--top_k", nargs="+", type=int, default=[3, 5, 10])
+    ap.add_argument("--thresholds", nargs="+", type=float, default=[0.3, 0.5, 1.0])
+    ap.add_argument("--max_chars", type=int, default=12000)
+    ap.add_argument("--rebuild", action="store_true", help="Переиндексировать тестовые коллекции")
+    ap.add_argument("--out", default=None, help="Сохранить результаты в JSON")
+    args = ap.parse_args(argv)
+
+    # RagIndexer берёт каталог из CHROMA_PERSIST_DIR — оценка не должна трогать рабочую базу
+    os.environ["CHROMA_PERSIST_DIR"] = args.persist_dir
+    if args.backend:
+        os.environ["VECTOR_BACKEND"] = args.backend
+    labels = load_labels(args.labels)
+    docs = load_documents(args.transcripts) if args.transcripts and not args.collection else []
+
+    offline = LLMSettings(model="offline", base_url="http://localhost:11434")  # LLM в оценке не вызывается
+    indexers: Dict[str, Any] = {}
+    rows: List[Dict[str, Any]] = []
+    for embedding_model in args.embeddings:
+        client = LLMClient(settings=offline, persist_dir=args.persist_dir, embedding_model=embedding_model)
+        specs = [args.collection] if args.collection else args.chunking
+        for spec in specs:
+            if args.collection:
+                name, label = spec, "готовая"
+            else:
+                name = ensure_collection(indexers, docs, spec, embedding_model, args.persist_dir, args.rebuild)
+                label = spec
+            for hybrid in args.hybrid:
+                for rerank in args.rerank:
+                    for pack in args.pack:
+                        for top_k in args.top_k:
+                            for row in evaluate(client, name, labels, bool(hybrid), top_k, args.thresholds, args.max_chars,
+                                                rerank=bool(rerank), context_tokens=args.context_tokens, pack=bool(pack)):
+                                rows.append({"chunking": label, "embedding": embedding_model, "collection": name, **row})
+
+    print_table(rows)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+    return rows
+
+
+if __name__ == "__main__":
+    main()
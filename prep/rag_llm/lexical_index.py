@@ -0,0 +1,113 @@
+"""
+Лексический индекс BM25 по документам коллекции Chroma — для гибридного поиска
+(векторный + по словам). Точные термины (названия документов 1С, фамилии, коды)
+e5 иногда ставит ниже общих по смыслу фрагментов, а BM25 находит их сразу.
+Результаты двух списков объединяются через Reciprocal Rank Fusion.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class BM25Index:
+    K1 = 1.5
+    B = 0.75
+    STEM_LEN = 6          # грубый «стемминг» для русского: сравниваем начала слов
+    RRF_K = 60            # константа Reciprocal Rank Fusion
+    PAGE = 1000           # документов за один запрос при чтении коллекции
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._doc_len: List[int] = []
+        for i, text in enumerate(documents):
+            terms = self.tokenize(text)
+            self._doc_len.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self._postings[term].append((i, tf))
+        n = max(1, len(documents))
+        self._avg_len = sum(self._doc_len) / n if self._doc_len else 0.0
+        self._idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self._postings.items()
+        }
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        return [w[:cls.STEM_LEN] for w in _WORD_RE.findall(text.lower()) if len(w) > 1]
+
+    @classmethod
+    def from_collection(cls, collection) -> "BM25Index":
+        ids, documents, metadatas = [], [], []
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=cls.PAGE, offset=offset)
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+            offset += len(page["ids"])
+        return cls(ids, documents, metadatas)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, n: int) -> List[Tuple[int, float]]:
+        """[(номер документа, score)] — n лучших по BM25."""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(self.tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self._postings[term]:
+                norm = self.K1 * (1 - self.B + self.B * self._doc_len[i] / (self._avg_len or 1.0))
+                scores[i] += idf * tf * (self.K1 + 1) / (tf + norm)
+        return heapq.nlargest(n, scores.items(), key=lambda x: x[1])
+
+    def fuse(
+        self,
+        query: str,
+        dense_chunks: List[Dict[str, Any]],
+        n_results: int,
+        keep: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        RRF по векторной выдаче (dense_chunks, уже по возрастанию дистанции) и BM25.
+        Чанки, найденные только по словам, получают score=None — порог дистанции к ним не применяется.
+        keep(metadata) — фильтр области поиска для результатов BM25 (векторные уже отфильтрованы хранилищем).
+        """
+        fused: Dict[str, float] = defaultdict(float)
+        by_id: Dict[str, Dict[str, Any]] = {}
+        for rank, ch in enumerate(dense_chunks):
+            fused[ch["id"]] += 1.0 / (self.RRF_K + rank + 1)
+            by_id[ch["id"]] = ch
+        lexical = self.search(query, len(self) if keep else max(n_results, len(dense_chunks)))
+        if keep:
+            lexical = [(i, sc) for i, sc in lexical if keep(self.metadatas[i] or {})][:max(n_results, len(dense_chunks))]
+        for rank, (i, _score) in enumerate(lexical):
+            doc_id = self.ids[i]
+            fused[doc_id] += 1.0 / (self.RRF_K + rank + 1)
+            if doc_id not in by_id:
+                meta = self.metadatas[i] or {}
+                by_id[doc_id] = {
+                    "id": doc_id,
+                    "text": self.documents[i],
+                    "meta": {
+                        "score": None,
+                        "timestamp_range": meta.get("timestamp_range"),
+                        "audio_title": meta.get("audio_title", "unknown_audio"),
+                        "start": meta.get("start"),
+                        "end": meta.get("end"),
+                        "segment_indices": meta.get("segment_indices"),
+                    },
+                }
+        best = heapq.nlargest(n_results, fused.items(), key=lambda x: x[1])
+        return [by_id[doc_id] for doc_id, _ in best]
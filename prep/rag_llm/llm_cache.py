@@ -0,0 +1,112 @@
+"""
+Постоянный кеш ответов LLM для шагов конвейера с детерминированным входом
+(нужна ли картинка, разделы, правка абзацев): повторная сборка документа
+по тому же транскрипту не ходит в модель.
+
+  • ключ — SHA-256 от модели, параметров генерации и точного текста промпта:
+    любая правка шаблона промпта даёт новый ключ, старые ответы просто не находятся;
+  • хранилище — SQLite (WITHOUT ROWID, ключ — 32 байта, ответ сжат zlib);
+  • размер ограничен LLM_CACHE_MAX_MB: при превышении удаляются давно не
+    использованные записи (LRU по времени последнего обращения);
+  • LLM_CACHE=off — кеш отключён, все запросы идут в модель.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv, find_dotenv
+load_dotenv(find_dotenv())
+LLM_CACHE = os.getenv("LLM_CACHE") or os.path.join(os.getenv("USER_FOLDER") or ".", "llm_cache.sqlite")
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB") or 256)
+
+EVICT_TO = 0.9          # после вытеснения остаётся 90% лимита — не вытеснять на каждой записи
+
+
+def cache_key(model: Optional[str], options: Optional[Dict[str, Any]], prompt: str) -> bytes:
+    options = {k: v for k, v in (options or {}).items() if v is not None}
+    data = json.dumps({"model": model or "", "options": options, "prompt": prompt}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).digest()
+
+
+class LLMCache:
+    def __init__(self, path: str, max_bytes: int = int(LLM_CACHE_MAX_MB * 1e6)) -> None:
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key BLOB PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS completions_used ON completions (used)")
+        self._db.commit()
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+
+    def get(self, key: bytes) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE completions SET used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, key: bytes, result: str) -> None:
+        if not result.strip():
+            return      # пустой ответ — сбой модели, а не результат
+        data = zlib.compress(result.encode("utf-8"), 6)
+        size = len(data) + len(key)
+        with self._lock:
+            old = self._db.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)", (key, data, size, time.time()))
+            self._total += size - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        target = self.max_bytes * EVICT_TO
+        removed = 0
+        for key, size in self._db.execute("SELECT key, size FROM completions ORDER BY used").fetchall():
+            if self._total <= target:
+                break
+            self._db.execute("DELETE FROM completions WHERE key = ?", (key,))
+            self._total -= size
+            removed += 1
+        print(f"[LOG] LLMCache: вытеснено записей {removed}, размер {self._total / 1e6:.1f} МБ")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+    def report(self) -> str:
+        return f"LLMCache: попаданий {self.hits}, промахов {self.misses}, {self._total / 1e6:.1f} МБ"
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[LLMCache]:
+    """Общий на процесс кеш по LLM_CACHE или None, если кеш отключён."""
+    global _cache
+    if LLM_CACHE == "off":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(LLM_CACHE)
+        return _cache
@@ -1,17 +1,22 @@
 from __future__ import annotations
 
 import os
-import base64
 from dataclasses import dataclass
 from typing import List, Dict, Any, Optional, Tuple, Union
 from rag_llm.llm_prompt import compose_prompt
+from rag_llm.lexical_index import BM25Index
+from rag_llm.reranker import CrossEncoderReranker
+from rag_llm.context_packer import ContextPacker, PackedContext, format_ts
+from rag_llm.query_scope import QueryScope
+from rag_llm.query_preprocessing import QueryEmbeddingCache, QueryPreprocessor
+from rag_llm.ollama_pool import get_llm, get_pool
+from rag_db.chunk_metadata import matches, scoped_collection_name
+from rag_db.vector_store import VectorBackend, open_backend
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from langchain_ollama import OllamaLLM
 from langchain_huggingface import HuggingFaceEmbeddings
-import chromadb
 
 
 # ----------------------
@@ -21,17 +26,6 @@ def _read_env(key: str, default: Optional[str] = None) -> Optional[str]:
     v = os.getenv(key, default)
     return v
 
-def _format_ts(seconds: float) -> str:
-    try:
-        s = max(0, int(round(seconds)))
-        m, s = divmod(s, 60)
-        h, m = divmod(m, 60)
-        if h > 0:
-            return f"{h:02d}:{m:02d}:{s:02d}"
-        return f"{m:02d}:{s:02d}"
-    except Exception:
-        return "00:00"
-
 
 # ----------------------
 # Пресеты
@@ -77,6 +71,9 @@ class LLMSettings:
 # Основной клиент
 # ----------------------
 class LLMClient:
+    EMBEDDING_MODEL = "intfloat/multilingual-e5-large"
+    HYBRID_CANDIDATES = 4     # во сколько раз больше кандидатов берём из векторного поиска для слияния с BM25
+
     def __init__(
         self,
         settings: Optional[LLMSettings] = None,
@@ -84,6 +81,11 @@ class LLMClient:
         temperature: Optional[float] = None,
         top_p: Optional[float] = None,
         top_k: Optional[int] = None,
+        persist_dir: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        rerank: Optional[bool] = None,
+        rerank_budget_ms: Optional[float] = None,
+        backend: Optional[str] = None,
     ) -> None:
         self.settings = settings or LLMSettings.from_env()
         self.preset = PRESETS.get(preset, PRESETS["assistant"])
@@ -93,41 +95,125 @@ class LLMClient:
         self.top_p = self.preset.top_p if top_p is None else top_p
         self.top_k = self.preset.top_k if top_k is None else top_k
 
-        headers = {}
-        if self.settings.user and self.settings.password:
-            token = base64.b64encode(f"{self.settings.user}:{self.settings.password}".encode()).decode()
-            headers["Authorization"] = f"Basic {token}"
-
-        # Инициализация OllamaLLM
-        self._llm = OllamaLLM(
-            model=self.settings.model,
-            base_url=self.settings.base_url,
+        # Модель через общий пул Ollama (одна сессия и лимиты на процесс, URL_LLM может содержать несколько серверов)
+        self._llm = get_llm(
+            self.settings.model,
+            pool=get_pool(self.settings.base_url, self.settings.user, self.settings.password),
             temperature=self.temperature,
             top_p=self.top_p,
-            client_kwargs={"headers": headers} if headers else None,
+            top_k=self.top_k,
         )
 
         # Дополнительные параметры
         self.additional_kwargs: Dict[str, Any] = {}
         if self.top_k is not None:
             self.additional_kwargs["top_k"] = self.top_k
-    
 
-    def _build_context(
+        # Векторное хранилище
+        self.persist_dir = persist_dir or os.getenv("CHROMA_PERSIST_DIR")
+        self.embedding_model = embedding_model or self.EMBEDDING_MODEL
+        self.backend_kind = backend
+        # Хранилище, коллекции, эмбеддер и BM25 создаются один раз и переиспользуются между вопросами
+        self._backend: Optional[VectorBackend] = None
+        self._collections: Dict[str, Any] = {}
+        self._embeddings: Optional[HuggingFaceEmbeddings] = None
+        self._lexical: Dict[str, Tuple[int, BM25Index]] = {}
+        # Подготовка вопроса (нормализация, глоссарий 1С, «query: ») и LRU эмбеддингов вопросов
+        self._query_preprocessor: Optional[QueryPreprocessor] = None
+        self._query_cache: Optional[QueryEmbeddingCache] = None
+
+        # Переранжирование cross-encoder'ом (по умолчанию — из RAG_RERANK)
+        self.rerank = (_read_env("RAG_RERANK") == "True") if rerank is None else rerank
+        self.rerank_budget_ms = float(rerank_budget_ms or _read_env("RERANK_BUDGET_MS") or 300)
+        self._reranker: Optional[CrossEncoderReranker] = None
+        self._packer: Optional[ContextPacker] = None
+
+    @property
+    def embeddings(self) -> HuggingFaceEmbeddings:
+        if self._embeddings is None:
+            self._embeddings = HuggingFaceEmbeddings(model_name=self.embedding_model)
+        return self._embeddings
+
+    @property
+    def query_preprocessor(self) -> QueryPreprocessor:
+        if self._query_preprocessor is None:
+            self._query_preprocessor = QueryPreprocessor.from_env()
+        return self._query_preprocessor
+
+    @property
+    def query_cache(self) -> QueryEmbeddingCache:
+        if self._query_cache is None:
+            self._query_cache = QueryEmbeddingCache(self.embeddings, int(_read_env("QUERY_CACHE_SIZE") or 1024))
+        return self._query_cache
+
+    @property
+    def reranker(self) -> CrossEncoderReranker:
+        if self._reranker is None:
+            self._reranker = CrossEncoderReranker(budget_ms=self.rerank_budget_ms)
+        return self._reranker
+
+    @property
+    def packer(self) -> ContextPacker:
+        if self._packer is None:
+            self._packer = ContextPacker()
+        return self._packer
+
+    def _pack_context(
             self,
             chunks: List[Dict[str, Any]],
             top_k: int,
             score_threshold: float,
-            max_chars: int,
-    ) -> Tuple[str, List[Tuple[str, str]]]:
+            max_tokens: int,
+    ) -> PackedContext:
         """
-        Args:
-            chunks: Список словарей с ключами: 'text', 'score', 'source'
-            top_k: Количество лучших чанков для включения в контекст. Если None, то все
-            score_threshold: Мин. порог (дистанция векторов, чем меньше, тем лучше). Если None, то не учитывается
-            max_chars: Максимальное число символов в итоговом контексте
+        Как _build_context, но перекрывающиеся чанки одной записи склеиваются
+        в непрерывные отрезки без повторов, а лимит — в токенах, а не в символах.
         """
+        return self.packer.pack(self._select_chunks(chunks, top_k, score_threshold), max_tokens)
+
+    @property
+    def backend(self) -> VectorBackend:
+        if self._backend is None:
+            self._backend = open_backend(self.backend_kind, self.persist_dir)
+        return self._backend
 
+    def _get_collection(self, collection_name: str):
+        if collection_name not in self._collections:
+            self._collections[collection_name] = self.backend.get(collection_name)
+        return self._collections[collection_name]
+
+    def _resolve_scope(
+            self,
+            scope: Optional[QueryScope],
+            collection_name: str,
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Коллекция и where для области поиска. Если у автора есть своя коллекция
+        (RagIndexer.index(..., scope=uploader)), ищем в ней — индекс меньше, фильтр по автору не нужен.
+        """
+        if scope is None or scope.is_empty():
+            return collection_name, None
+        if scope.uploader:
+            scoped_name = scoped_collection_name(collection_name, scope.uploader)
+            try:
+                self._get_collection(scoped_name)
+                return scoped_name, scope.to_where(include_uploader=False)
+            except KeyError:
+                pass   # своей коллекции нет — фильтруем общую
+        return collection_name, scope.to_where()
+
+    def _lexical_index(self, collection_name: str, collection) -> BM25Index:
+        """BM25 по коллекции; перестраивается, только если число документов изменилось."""
+        count = collection.count()
+        cached = self._lexical.get(collection_name)
+        if cached is None or cached[0] != count:
+            cached = (count, BM25Index.from_collection(collection))
+            self._lexical[collection_name] = cached
+        return cached[1]
+
+    @staticmethod
+    def _select_chunks(chunks: List[Dict[str, Any]], top_k: int, score_threshold: float) -> List[Dict[str, Any]]:
+        """Чанки, прошедшие порог score_threshold, не больше top_k — в порядке выдачи."""
         # 1. Фильтрация по score_threshold
         filtered_chunks = []
         for ch in chunks:
@@ -136,12 +222,30 @@ class LLMClient:
             if score is None or score <= score_threshold:
                 filtered_chunks.append(ch)
 
-        if not filtered_chunks:
-            return "", []
-
         # 2. Ограничение по top_k
         if top_k > 0:
             filtered_chunks = filtered_chunks[:top_k]
+        return filtered_chunks
+
+    def _build_context(
+            self,
+            chunks: List[Dict[str, Any]],
+            top_k: int,
+            score_threshold: float,
+            max_chars: int,
+    ) -> Tuple[str, List[Tuple[str, str]]]:
+        """
+        Args:
+            chunks: Список словарей с ключами: 'text', 'score', 'source'
+            top_k: Количество лучших чанков для включения в контекст. Если None, то все
+            score_threshold: Мин. порог (дистанция векторов, чем меньше, тем лучше). Если None, то не учитывается
+            max_chars: Максимальное число символов в итоговом контексте
+        """
+
+        # 1–2. Фильтрация по score_threshold и ограничение по top_k
+        filtered_chunks = self._select_chunks(chunks, top_k, score_threshold)
+        if not filtered_chunks:
+            return "", []
 
         # 3. Сборка текста и источников
         context_lines = []
@@ -157,8 +261,8 @@ class LLMClient:
             if isinstance(ts, (str)) and "-" in ts:
                 time_range = ts.strip()
             elif isinstance(ts, (list, tuple)) and len(ts) == 2:
-                t1 = _format_ts(float(ts[0]))
-                t2 = _format_ts(float(ts[1]))
+                t1 = format_ts(float(ts[0]))
+                t2 = format_ts(float(ts[1]))
                 time_range = f"{t1} - {t2}"
             else:
                 time_range = "00:00 - 00:00 (unknown timestamp)"
@@ -177,33 +281,77 @@ class LLMClient:
         context_block = "\n".join(context_lines)
         return context_block, sources
     
-    def retrieve_chunks(self, question: str, collection_name: str = "audio_chunks", n_results: int = 5) -> List[Dict[str, Any]]:
-        client = chromadb.PersistentClient(path=os.getenv("CHROMA_PERSIST_DIR"))
-        collection = client.get_collection(collection_name)
-
-        embeddings = HuggingFaceEmbeddings(model_name="intfloat/multilingual-e5-large")
-        query_embedding = embeddings.embed_query(question)
+    def retrieve_chunks(
+        self,
+        question: str,
+        collection_name: str = "audio_chunks",
+        n_results: int = 5,
+        hybrid: bool = False,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Векторный поиск по коллекции. hybrid=True — дополнительно BM25 по словам,
+        списки объединяются через Reciprocal Rank Fusion.
+        where — фильтр метаданных (см. QueryScope.to_where), выполняется в хранилище.
+        Вопрос проходит QueryPreprocessor; эмбеддинг берётся из кеша, если такой вопрос уже был.
+        """
+        collection = self._get_collection(collection_name)
+        prepared = self.query_preprocessor(question)
+        query_embedding = self.query_cache.embed(prepared.text)
 
         results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
+            query_embedding,
+            n_results=n_results * self.HYBRID_CANDIDATES if hybrid else n_results,
+            where=where,
         )
 
-        docs = results["documents"][0]
-        metas = results["metadatas"][0]
-        scores = results["distances"][0]
+        ids = results["ids"]
+        docs = results["documents"]
+        metas = results["metadatas"]
+        scores = results["distances"]
 
         chunks = []
-        for doc, meta, score in zip(docs, metas, scores):
+        for chunk_id, doc, meta, score in zip(ids, docs, metas, scores):
             chunks.append({
+                "id": chunk_id,
                 "text": doc,
                 "meta": {
                     "score": score,
                     "timestamp_range": meta.get("timestamp_range"),
-                    "audio_title": meta.get("audio_title", "unknown_audio")
+                    "audio_title": meta.get("audio_title", "unknown_audio"),
+                    "start": meta.get("start"),
+                    "end": meta.get("end"),
+                    "segment_indices": meta.get("segment_indices"),
                 }
             })
+
+        if hybrid:
+            keep = (lambda meta: matches(meta, where)) if where else None
+            chunks = self._lexical_index(collection_name, collection).fuse(prepared.expanded, chunks, n_results, keep)
         return chunks
+
+    def retrieve_for_context(
+        self,
+        question: str,
+        top_k: int = 5,
+        hybrid: bool = False,
+        rerank: bool = False,
+        context_tokens: int = 3000,
+        collection_name: str = "audio_chunks",
+        scope: Optional[QueryScope] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Кандидаты для контекста. rerank=True — берём с запасом (reranker.candidates),
+        переранжируем cross-encoder'ом и оставляем лучшие в пределах context_tokens.
+        scope — область поиска (видео, дата, автор, теги).
+        """
+        collection_name, where = self._resolve_scope(scope, collection_name)
+        if not rerank:
+            return self.retrieve_chunks(question, collection_name, n_results=top_k, hybrid=hybrid, where=where)
+        candidates = self.retrieve_chunks(
+            question, collection_name, n_results=max(top_k, self.reranker.candidates), hybrid=hybrid, where=where
+        )
+        return self.reranker.select(question, candidates, top_k=top_k, max_tokens=context_tokens)
     
     def generate_with_retrieval(
         self,
@@ -215,6 +363,11 @@ class LLMClient:
         score_threshold: float = 0.3,
         max_chars: int = 12000,
         return_with_sources: bool = False,
+        hybrid: bool = False,
+        rerank: Optional[bool] = None,
+        context_tokens: int = 3000,
+        pack: bool = True,
+        scope: Optional[QueryScope] = None,
     ) -> Union[str, Dict[str, Any]]:
         """
         Генерация ответа с учётом RAG-контекста
@@ -225,8 +378,15 @@ class LLMClient:
             mode: Режим работы промпта. Пресеты в llm_prompt.py.
             top_k: Количество лучших чанков.
             score_threshold: Порог отсечения по score.
-            max_chars: Лимит символов в контексте.
+            max_chars: Лимит символов в контексте (только при pack=False).
             return_with_sources: Возвращать ли источники отдельно.
+            hybrid: Гибридный поиск (векторный + BM25).
+            rerank: Переранжирование cross-encoder'ом (по умолчанию — настройка клиента).
+                    Вместо порога по дистанции контекст ограничивается context_tokens.
+            context_tokens: Бюджет токенов контекста.
+            pack: Склеивать перекрывающиеся чанки в отрезки без повторов (ContextPacker);
+                  False — прежняя склейка чанков как есть с лимитом max_chars.
+            scope: Область поиска (query_scope.parse_scoped_query) — фильтр в хранилище.
         
         Returns:
             Если return_with_sources=False → готовый ответ (str).
@@ -240,13 +400,22 @@ class LLMClient:
             raise ValueError("question должен быть непустой строкой")
 
         # 1. Строим контекст и источники
-        retrieved_chunks = self.retrieve_chunks(question, n_results=top_k)
-        context, sources = self._build_context(
-            chunks=retrieved_chunks,
-            top_k=top_k,
-            score_threshold=score_threshold,
-            max_chars=max_chars
+        rerank = self.rerank if rerank is None else rerank
+        retrieved_chunks = self.retrieve_for_context(
+            question, top_k=top_k, hybrid=hybrid, rerank=rerank, context_tokens=context_tokens, scope=scope
         )
+        # после rerank релевантность уже оценена cross-encoder'ом, порог дистанции не нужен
+        threshold = float("inf") if rerank else score_threshold
+        if pack:
+            packed = self._pack_context(retrieved_chunks, top_k, threshold, context_tokens)
+            context, sources = packed.text, packed.sources
+        else:
+            context, sources = self._build_context(
+                chunks=retrieved_chunks,
+                top_k=top_k,
+                score_threshold=threshold,
+                max_chars=max_chars
+            )
 
         # 2. Сборка финального промпта
         final_prompt = compose_prompt(
@@ -0,0 +1,248 @@
+"""
+Общий клиент Ollama для всех вызовов LLM проекта (документы, правка текста, разделы, RAG).
+
+  • одна HTTP-сессия с пулом keep-alive соединений на все серверы — соединение
+    не поднимается заново на каждый абзац;
+  • keep_alive в каждом запросе (OLLAMA_KEEP_ALIVE) — модель не выгружается
+    из памяти между запросами; warm_up() загружает её при старте процесса;
+  • общее ограничение параллельных запросов (OLLAMA_MAX_CONCURRENCY) и на каждый
+    сервер (OLLAMA_ENDPOINT_CONCURRENCY): лишние запросы ждут, а не перегружают Ollama;
+  • несколько серверов — URL_LLM через запятую: запрос уходит на наименее
+    загруженный; сервер, к которому не удалось подключиться, на COOLDOWN секунд
+    исключается из выбора, а запрос повторяется на другом.
+
+Пример:
+    from rag_llm.ollama_pool import get_llm
+    llm = get_llm(temperature=0.1)      # модель MODEL
+    answer = llm.invoke(prompt)
+    llm = get_llm(temperature=0.1, cache=True)  # ответы по тем же модели, параметрам и промпту — из LLMCache
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rag_llm.llm_cache import LLMCache, cache_key, get_cache
+
+from dotenv import load_dotenv, find_dotenv
+load_dotenv(find_dotenv())
+URL_LLM = os.getenv("URL_LLM")
+USER_LLM = os.getenv("USER_LLM")
+PASSWORD_LLM = os.getenv("PASSWORD_LLM")
+MODEL = os.getenv("MODEL")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE") or "30m"
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY") or 8)
+OLLAMA_ENDPOINT_CONCURRENCY = int(os.getenv("OLLAMA_ENDPOINT_CONCURRENCY") or 4)
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT") or 600)
+
+CONNECT_TIMEOUT = 10.0
+COOLDOWN = 30.0         # секунд, на которые недоступный сервер исключается из выбора
+
+
+class OllamaError(RuntimeError):
+    pass
+
+
+@dataclass
+class Endpoint:
+    url: str
+    limit: int
+    in_flight: int = 0
+    served: int = 0
+    failed: int = 0
+    down_until: float = 0.0
+
+
+def split_urls(base_url: Optional[str]) -> List[str]:
+    return [u.strip().rstrip("/") for u in (base_url or "").split(",") if u.strip()]
+
+
+class OllamaPool:
+    def __init__(
+        self,
+        base_urls: List[str],
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        model: Optional[str] = None,
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+        max_concurrency: int = OLLAMA_MAX_CONCURRENCY,
+        endpoint_concurrency: int = OLLAMA_ENDPOINT_CONCURRENCY,
+        timeout: float = OLLAMA_TIMEOUT,
+        cooldown: float = COOLDOWN,
+    ) -> None:
+        if not base_urls:
+            raise ValueError("Не задан адрес Ollama (URL_LLM)")
+        self.endpoints = [Endpoint(url, max(1, endpoint_concurrency)) for url in base_urls]
+        self.model = model or MODEL
+        self.keep_alive = keep_alive
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=max(1, endpoint_concurrency))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if user and password:
+            self.session.auth = (user, password)
+
+    # -----------------------
+    # ВЫБОР СЕРВЕРА
+    # -----------------------
+    def _pick(self, tried: Set[str]) -> Optional[Endpoint]:
+        now = time.monotonic()
+        usable = [e for e in self.endpoints if e.url not in tried]
+        # Все недоступны — пробуем всё равно, иначе запросы ждали бы до конца cooldown
+        alive = [e for e in usable if e.down_until <= now] or usable
+        free = [e for e in alive if e.in_flight < e.limit]
+        return min(free, key=lambda e: (e.in_flight / e.limit, e.served), default=None)
+
+    def _acquire(self, tried: Set[str]) -> Endpoint:
+        with self._cond:
+            while True:
+                endpoint = self._pick(tried) if self._in_flight < self.max_concurrency else None
+                if endpoint is not None:
+                    endpoint.in_flight += 1
+                    self._in_flight += 1
+                    return endpoint
+                # С таймаутом — чтобы заметить конец cooldown без чужого release
+                self._cond.wait(timeout=1.0)
+
+    def _release(self, endpoint: Endpoint, reachable: bool = True) -> None:
+        with self._cond:
+            endpoint.in_flight -= 1
+            self._in_flight -= 1
+            if reachable:
+                endpoint.served += 1
+            else:
+                endpoint.failed += 1
+                endpoint.down_until = time.monotonic() + self.cooldown
+            self._cond.notify_all()
+
+    # -----------------------
+    # ЗАПРОСЫ
+    # -----------------------
+    def _post(self, endpoint: Endpoint, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        response = self.session.post(endpoint.url + "/api/generate", json=payload, timeout=(CONNECT_TIMEOUT, timeout))
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if response.status_code != 200 or "error" in data:
+            raise OllamaError(f"{endpoint.url}: HTTP {response.status_code}: {data.get('error') or response.text[:200]}")
+        return data
+
+    def generate(self, prompt: str, model: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> str:
+        """Ответ модели целиком (без стриминга) с наименее загруженного сервера."""
+        payload: Dict[str, Any] = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+        }
+        options = {k: v for k, v in (options or {}).items() if v is not None}
+        if options:
+            payload["options"] = options
+
+        tried: Set[str] = set()
+        while True:
+            endpoint = self._acquire(tried)
+            try:
+                data = self._post(endpoint, payload, self.timeout)
+            except requests.ConnectionError as e:
+                self._release(endpoint, reachable=False)
+                tried.add(endpoint.url)
+                if len(tried) == len(self.endpoints):
+                    raise OllamaError(f"Нет доступных серверов Ollama: {e}") from e
+                print(f"[ERROR] Ollama {endpoint.url} недоступен ({e}), повтор на другом сервере")
+                continue
+            except BaseException:
+                self._release(endpoint)
+                raise
+            self._release(endpoint)
+            return data.get("response", "")
+
+    def warm_up(self, model: Optional[str] = None, background: bool = True) -> None:
+        """
+        Загружает модель на всех серверах запросом без промпта (Ollama только
+        поднимает модель и держит её keep_alive). В фоне — старт процесса не ждёт.
+        """
+        model = model or self.model
+        if not model:
+            return
+
+        def load(endpoint: Endpoint) -> None:
+            t0 = time.perf_counter()
+            try:
+                self._post(endpoint, {"model": model, "keep_alive": self.keep_alive}, self.timeout)
+                print(f"[LOG] Ollama {endpoint.url}: модель {model} загружена за {time.perf_counter() - t0:.1f} с")
+            except Exception as e:
+                print(f"[ERROR] Ollama {endpoint.url}: прогрев модели {model} не удался: {e}")
+
+        threads = [threading.Thread(target=load, args=(e,), daemon=True) for e in self.endpoints]
+        for thread in threads:
+            thread.start()
+        if not background:
+            for thread in threads:
+                thread.join()
+
+    def stats(self) -> str:
+        with self._cond:
+            return "; ".join(f"{e.url}: в работе {e.in_flight}, выполнено {e.served}, ошибок {e.failed}" for e in self.endpoints)
+
+
+class OllamaText:
+    """Модель с параметрами генерации поверх общего пула; интерфейс как у OllamaLLM — invoke(prompt) -> str."""
+
+    def __init__(self, pool: OllamaPool, model: Optional[str] = None, cache: Optional[LLMCache] = None, **options: Any) -> None:
+        self.pool = pool
+        self.model = model or pool.model
+        self.cache = cache
+        self.options = options
+
+    def cached(self, prompt: str) -> Optional[str]:
+        """Ответ из кеша без обращения к модели (None — нет в кеше или кеш не задан)."""
+        return self.cache.get(cache_key(self.model, self.options, prompt)) if self.cache else None
+
+    def invoke(self, prompt: str) -> str:
+        if self.cache is None:
+            return self.pool.generate(prompt, self.model, self.options)
+        key = cache_key(self.model, self.options, prompt)
+        result = self.cache.get(key)
+        if result is None:
+            result = self.pool.generate(prompt, self.model, self.options)
+            self.cache.put(key, result)
+        return result
+
+    __call__ = invoke
+
+
+_pools: Dict[tuple, OllamaPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(base_url: Optional[str] = None, user: Optional[str] = None, password: Optional[str] = None) -> OllamaPool:
+    """Общий на процесс пул для адреса(ов) и учётных данных; по умолчанию — URL_LLM, USER_LLM, PASSWORD_LLM."""
+    if base_url is None:
+        base_url, user, password = URL_LLM, USER_LLM, PASSWORD_LLM
+    key = (base_url, user, password)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = OllamaPool(split_urls(base_url), user, password)
+        return pool
+
+
+def get_llm(model: Optional[str] = None, pool: Optional[OllamaPool] = None, cache: bool = False, **options: Any) -> OllamaText:
+    """
+    Модель (по умолчанию MODEL) с параметрами Ollama: temperature, top_p, top_k, num_predict…
+    cache=True — для шагов с детерминированным входом: ответы хранятся в общем LLMCache
+    (если он не отключён LLM_CACHE=off).
+    """
+    return OllamaText(pool or get_pool(), model, get_cache() if cache else None, **options)
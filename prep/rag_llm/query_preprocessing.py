@@ -0,0 +1,154 @@
+"""
+Подготовка вопроса перед векторным поиском.
+
+  • нормализация — регистр, ё/е, кавычки, пробелы, знаки в конце: «Как провести
+    документ?» и «как провести документ» — один и тот же запрос;
+  • расширение по глоссарию 1С — к аббревиатуре добавляется расшифровка и наоборот
+    (НСИ ↔ нормативно-справочная информация), чтобы совпадали и эмбеддинги, и BM25;
+  • префикс e5 «query: » — пара к «passage: », с которым RagIndexer пишет чанки.
+
+QueryEmbeddingCache хранит эмбеддинги последних вопросов (LRU по подготовленному
+тексту): повторный и почти такой же вопрос не вызывает модель эмбеддингов.
+"""
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+QUERY_PREFIX = "query: "
+
+# Группы синонимов: если в вопросе есть один вариант, остальные добавляются к запросу
+GLOSSARY: List[Tuple[str, ...]] = [
+    ("нси", "нормативно-справочная информация", "справочники"),
+    ("проводки", "бухгалтерские проводки", "движения регистра бухгалтерии"),
+    ("бит финанс", "бит.финанс", "bit.finance"),
+    ("осв", "оборотно-сальдовая ведомость"),
+    ("тч", "табличная часть"),
+    ("скд", "система компоновки данных"),
+    ("пвх", "план видов характеристик"),
+    ("рс", "регистр сведений"),
+    ("рн", "регистр накопления"),
+    ("пко", "приходный кассовый ордер"),
+    ("рко", "расходный кассовый ордер"),
+    ("упд", "универсальный передаточный документ"),
+    ("тмц", "товарно-материальные ценности"),
+    ("ос", "основные средства"),
+    ("ндс", "налог на добавленную стоимость"),
+    ("цфо", "центр финансовой ответственности"),
+    ("бдр", "бюджет доходов и расходов"),
+    ("бддс", "бюджет движения денежных средств"),
+    ("бп", "бухгалтерия предприятия"),
+    ("зуп", "зарплата и управление персоналом"),
+    ("ут", "управление торговлей"),
+    ("ерп", "erp", "1с:erp"),
+    ("кд", "конвертация данных"),
+]
+
+_QUOTES_RE = re.compile(r"[«»“”„\"'`]")
+_SPACE_RE = re.compile(r"\s+")
+_TRAIL_RE = re.compile(r"[\s?!.,;:…]+$")
+
+
+def normalize(text: str) -> str:
+    text = text.lower().replace("ё", "е")
+    text = _QUOTES_RE.sub("", text)
+    text = _SPACE_RE.sub(" ", text).strip()
+    return _TRAIL_RE.sub("", text)
+
+
+@dataclass
+class PreparedQuery:
+    raw: str
+    normalized: str
+    expanded: str                                    # нормализованный вопрос + синонимы (для BM25)
+    text: str                                        # expanded с префиксом e5 (для эмбеддинга)
+    terms: List[str] = field(default_factory=list)   # найденные термины глоссария
+
+
+class QueryPreprocessor:
+    MAX_ADDITIONS = 6     # не раздуваем короткий вопрос десятком синонимов
+
+    def __init__(self, glossary: Optional[Iterable[Sequence[str]]] = None, prefix: str = QUERY_PREFIX) -> None:
+        self.prefix = prefix
+        self._groups: List[Tuple[str, ...]] = []
+        self._group_of = {}
+        for group in (GLOSSARY if glossary is None else glossary):
+            variants = tuple(dict.fromkeys(normalize(v) for v in group if normalize(v)))
+            for v in variants:
+                self._group_of[v] = len(self._groups)
+            self._groups.append(variants)
+        # Длинные варианты раньше коротких: «бит финанс» целиком, а не «бит»
+        alternatives = sorted(self._group_of, key=len, reverse=True)
+        self._term_re = re.compile(
+            r"(?<!\w)(" + "|".join(map(re.escape, alternatives)) + r")(?!\w)"
+        ) if alternatives else None
+
+    @classmethod
+    def from_env(cls) -> "QueryPreprocessor":
+        """Глоссарий по умолчанию плюс группы из JSON-файла RAG_GLOSSARY ([["нси", "..."], ...])."""
+        path = os.getenv("RAG_GLOSSARY")
+        glossary = list(GLOSSARY)
+        if path:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    glossary.extend(tuple(g) for g in json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"[ERROR] QueryPreprocessor: не удалось прочитать глоссарий {path}: {e}")
+        return cls(glossary)
+
+    def expand(self, normalized: str) -> Tuple[str, List[str]]:
+        if self._term_re is None:
+            return normalized, []
+        terms = list(dict.fromkeys(m.group(1) for m in self._term_re.finditer(normalized)))
+        present = set(terms)
+        additions: List[str] = []
+        for term in terms:
+            for variant in self._groups[self._group_of[term]]:
+                if variant not in present and variant not in additions:
+                    additions.append(variant)
+        additions = additions[:self.MAX_ADDITIONS]
+        expanded = f"{normalized} ({', '.join(additions)})" if additions else normalized
+        return expanded, terms
+
+    def __call__(self, question: str) -> PreparedQuery:
+        normalized = normalize(question)
+        expanded, terms = self.expand(normalized)
+        return PreparedQuery(question, normalized, expanded, self.prefix + expanded, terms)
+
+
+class QueryEmbeddingCache:
+    """LRU эмбеддингов вопросов; ключ — подготовленный текст (PreparedQuery.text)."""
+
+    def __init__(self, embeddings, max_size: int = 1024) -> None:
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, text: str) -> List[float]:
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return vector
+        vector = self.embeddings.embed_query(text)   # модель — вне блокировки
+        with self._lock:
+            self.misses += 1
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return vector
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
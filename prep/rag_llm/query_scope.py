@@ -0,0 +1,96 @@
+"""
+Области поиска (scope) для RAG-запросов: по видео, по дате загрузки, по автору, по тегам.
+
+В боте область задаётся префиксами в квадратных скобках перед вопросом:
+    $[video:Инструкция по проводкам] как провести документ?
+    $[date:2025-03] [tag:бит] что меняли в отчёте?
+    $[date:2025-03-01..2025-03-15] ...
+    $[mine] ... / $только мои: ...
+Область превращается в Chroma `where` — фильтр выполняется в самой базе, а не после поиска.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from rag_db.chunk_metadata import day_number, tag_key, video_key
+
+_SCOPE_RE = re.compile(r"^\s*\[([^\[\]]+)\]\s*")
+_MINE_RE = re.compile(r"^\s*(только\s+мои|мои\s+загрузки)\s*[:,]?\s*", re.IGNORECASE)
+
+
+@dataclass
+class QueryScope:
+    video: Optional[str] = None        # video_key
+    uploader: Optional[str] = None
+    date_from: Optional[int] = None    # YYYYMMDD включительно
+    date_to: Optional[int] = None
+    tags: List[str] = field(default_factory=list)   # tag_key
+
+    def is_empty(self) -> bool:
+        return not (self.video or self.uploader or self.date_from or self.date_to or self.tags)
+
+    def to_where(self, include_uploader: bool = True) -> Optional[Dict[str, Any]]:
+        conditions: List[Dict[str, Any]] = []
+        if self.video:
+            conditions.append({"video_key": self.video})
+        if self.uploader and include_uploader:
+            conditions.append({"uploader": self.uploader})
+        if self.date_from:
+            conditions.append({"ingest_day": {"$gte": self.date_from}})
+        if self.date_to:
+            conditions.append({"ingest_day": {"$lte": self.date_to}})
+        for tag in self.tags:
+            conditions.append({tag: True})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def _parse_date_range(value: str) -> Tuple[int, int]:
+    """'2025-03-07', '2025-03' или '2025-03-01..2025-03-15'."""
+    if ".." in value:
+        start, end = value.split("..", 1)
+        return day_number(start.strip()), day_number(end.strip())
+    if len(value) == 7:      # месяц целиком
+        start = day_number(value + "-01")
+        return start, start + 30    # YYYYMM31 — номера дней внутри месяца сравниваются как числа
+    day = day_number(value)
+    return day, day
+
+
+def parse_scoped_query(text: str, user_id: Optional[Any] = None) -> Tuple[str, QueryScope]:
+    """
+    Отделяет префиксы области от вопроса. Неизвестные префиксы остаются частью вопроса.
+    «мои» работает, только если известен user_id.
+    """
+    scope = QueryScope()
+    rest = text
+    while True:
+        m = _MINE_RE.match(rest)
+        if m and user_id is not None:
+            scope.uploader = str(user_id)
+            rest = rest[m.end():]
+            continue
+        m = _SCOPE_RE.match(rest)
+        if not m:
+            break
+        key, _, value = m.group(1).partition(":")
+        key, value = key.strip().lower(), value.strip()
+        if key in ("video", "видео") and value:
+            scope.video = video_key(value)
+        elif key in ("mine", "мои") and user_id is not None:
+            scope.uploader = str(user_id)
+        elif key in ("user", "uploader") and value:
+            scope.uploader = str(user_id) if value == "me" and user_id is not None else value
+        elif key in ("date", "дата") and value:
+            try:
+                scope.date_from, scope.date_to = _parse_date_range(value)
+            except ValueError:
+                break
+        elif key in ("tag", "тег") and value:
+            scope.tags.append(tag_key(value))
+        else:
+            break
+        rest = rest[m.end():]
+    return rest.strip(), scope
+
@@ -0,0 +1,83 @@
+"""
+Переранжирование кандидатов поиска cross-encoder'ом.
+
+Векторный поиск берёт с запасом N кандидатов, маленький cross-encoder на CPU
+одним батчем оценивает пары (вопрос, чанк), в контекст идут лучшие — пока не
+исчерпан бюджет токенов. Так в промпт попадает меньше нерелевантных чанков,
+и Ollama отвечает быстрее.
+
+N подстраивается под бюджет времени: по замерам держится скользящее среднее
+стоимости одного кандидата, и N = бюджет / стоимость (в пределах MIN..MAX).
+"""
+import time
+from typing import Any, Dict, List, Optional
+
+from rag_documetn_chunker.document_chunker import approx_token_count
+
+
+class CrossEncoderReranker:
+    MODEL_NAME = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"   # многоязычный, ~120M параметров
+    MIN_CANDIDATES = 8
+    MAX_CANDIDATES = 40
+    BATCH_SIZE = 16
+    MAX_LENGTH = 512       # токенов на пару (вопрос, чанк) для cross-encoder
+    EWMA_ALPHA = 0.3       # вес последнего замера в средней стоимости кандидата
+
+    _models: Dict[str, Any] = {}   # модель грузится один раз на процесс
+
+    def __init__(self, model_name: Optional[str] = None, budget_ms: float = 300.0, candidates: int = 20) -> None:
+        self.model_name = model_name or self.MODEL_NAME
+        self.budget_ms = float(budget_ms)
+        self.candidates = max(self.MIN_CANDIDATES, min(self.MAX_CANDIDATES, int(candidates)))
+        self._ms_per_candidate: Optional[float] = None
+        self.last_ms = 0.0
+
+    @property
+    def model(self):
+        if self.model_name not in self._models:
+            from sentence_transformers import CrossEncoder
+            print(f"[LOG] CrossEncoderReranker: загружаю {self.model_name}")
+            self._models[self.model_name] = CrossEncoder(self.model_name, device="cpu", max_length=self.MAX_LENGTH)
+        return self._models[self.model_name]
+
+    @staticmethod
+    def _clean(text: str) -> str:
+        # В Chroma документы хранятся с префиксом e5
+        return text[len("passage: "):] if text.startswith("passage: ") else text
+
+    def _adapt(self, elapsed_ms: float, n: int) -> None:
+        per_candidate = elapsed_ms / max(1, n)
+        if self._ms_per_candidate is None:
+            self._ms_per_candidate = per_candidate
+        else:
+            self._ms_per_candidate += self.EWMA_ALPHA * (per_candidate - self._ms_per_candidate)
+        target = int(self.budget_ms / max(self._ms_per_candidate, 1e-3))
+        self.candidates = max(self.MIN_CANDIDATES, min(self.MAX_CANDIDATES, target))
+
+    def rerank(self, question: str, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Чанки по убыванию релевантности; оценка — в meta["rerank_score"]."""
+        if not chunks:
+            return []
+        pairs = [(question, self._clean(ch.get("text", ""))) for ch in chunks]
+        t0 = time.perf_counter()
+        scores = self.model.predict(pairs, batch_size=self.BATCH_SIZE, show_progress_bar=False)
+        self.last_ms = (time.perf_counter() - t0) * 1000
+        self._adapt(self.last_ms, len(pairs))
+
+        for ch, score in zip(chunks, scores):
+            ch.setdefault("meta", {})["rerank_score"] = float(score)
+        return sorted(chunks, key=lambda ch: ch["meta"]["rerank_score"], reverse=True)
+
+    def select(self, question: str, chunks: List[Dict[str, Any]], top_k: int, max_tokens: int) -> List[Dict[str, Any]]:
+        """Лучшие после rerank, не больше top_k и не больше max_tokens токенов в сумме."""
+        ranked = self.rerank(question, chunks)
+        sizes = approx_token_count([self._clean(ch.get("text", "")) for ch in ranked])
+        selected, total = [], 0
+        for ch, n in zip(ranked, sizes):
+            if top_k > 0 and len(selected) >= top_k:
+                break
+            if selected and total + n > max_tokens:
+                continue      # не влез — пробуем следующий, он может быть короче
+            selected.append(ch)
+            total += n
+        return selected
@@ -0,0 +1,108 @@
+"""
+Бенчмарк извлечения элементов DOCX: прежний обход python-docx и потоковый iterparse.
+Документ генерируется: --pages страниц по ~5 абзацев, картинка на каждой второй
+странице, таблица на каждой десятой.
+
+Пример (из каталога prep/razdel):
+    python bench_extract.py --pages 500
+"""
+import argparse
+import io
+import os
+import struct
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+from docx import Document
+from docx.shared import Inches
+
+from docx_stream import iter_elements_with_images
+
+def make_png(seed, size=64):
+    """Небольшая PNG (у каждой страницы своя — как разные скриншоты)."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    row = b"\x00" + bytes((seed * 7 + x) % 256 for x in range(size * 3))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * size)) + chunk(b"IEND", b""))
+
+
+def make_docx(path, pages):
+    doc = Document()
+    for page in range(pages):
+        for i in range(5):
+            doc.add_paragraph(f"Страница {page + 1}, абзац {i + 1}: проведение документа, проводки, регистр. " * 4)
+        if page % 2 == 0:
+            doc.add_picture(io.BytesIO(make_png(page)), width=Inches(5))
+        if page % 10 == 0:
+            table = doc.add_table(rows=3, cols=3)
+            for r, row in enumerate(table.rows):
+                for c, cell in enumerate(row.cells):
+                    cell.text = f"{r}:{c}"
+    doc.save(path)
+
+
+def legacy_extract(file_path):
+    """
+    Прежний extract_elements_with_images (без записи temp_img_N на диск).
+    Document(doc.element) в python-docx 1.x падает — его стоимость (список всех
+    абзацев на каждый элемент) воспроизводится через doc.paragraphs.
+    """
+    doc = Document(file_path)
+    elements = []
+    rels = doc.part.rels
+    for element in doc.element.body:
+        if element.tag.endswith('p'):
+            para = doc.paragraphs[-1]  # noqa: F841
+            p_text = ""
+            for node in element.iter():
+                if node.tag.endswith('t') and node.text:
+                    p_text += node.text
+            p_text = p_text.strip()
+            if p_text:
+                elements.append({'type': 'text', 'text': p_text})
+        elif element.tag.endswith('tbl'):
+            table_text = ""
+            for row in element.iter():
+                if row.tag.endswith('t') and row.text:
+                    table_text += row.text + " "
+            table_text = table_text.strip()
+            if table_text:
+                elements.append({'type': 'text', 'text': table_text})
+        elif any("drawing" in child.tag for child in element.iter()):
+            for img_part in element.iter():
+                if "blip" in img_part.tag:
+                    embed_attr = [at for at in img_part.attrib.values() if at in rels]
+                    if embed_attr:
+                        len([e for e in elements if e['type'] == 'image'])
+                        elements.append({'type': 'image', 'blob': rels[embed_attr[0]].target_part.blob})
+    return elements
+
+
+def measure(label, func):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    count = sum(1 for _ in func())
+    seconds = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:12s} элементов {count:6d} | {seconds:7.2f} с | пик памяти {peak / 1e6:7.1f} МБ")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=500)
+    args = ap.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), "manual.docx")
+    make_docx(path, args.pages)
+    print(f"Документ: {args.pages} страниц, {os.path.getsize(path) / 1e6:.1f} МБ")
+    measure("прежний", lambda: legacy_extract(path))
+    measure("потоковый", lambda: iter_elements_with_images(path))
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
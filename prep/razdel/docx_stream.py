@@ -0,0 +1,150 @@
+"""
+Потоковое чтение DOCX: текст и картинки верхнего уровня в порядке появления.
+
+word/document.xml разбирается iterparse за один проход; каждый абзац/таблица
+обрабатывается по закрывающему тегу и сразу удаляется из дерева, поэтому память
+не растёт с длиной документа. Связи rId -> файл картинки и типы содержимого
+читаются заранее в словари, байты картинки берутся из архива только при выдаче.
+"""
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, Optional
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+A_BLIP = "{http://schemas.openxmlformats.org/drawingml/2006/main}blip"
+V_IMAGEDATA = "{urn:schemas-microsoft-com:vml}imagedata"
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+CT = "{http://schemas.openxmlformats.org/package/2006/content-types}"
+
+BODY = W + "body"
+PARAGRAPH = W + "p"
+TABLE = W + "tbl"
+TEXT = W + "t"
+
+
+def _main_part(archive: zipfile.ZipFile) -> str:
+    """Путь основной части документа (обычно word/document.xml)."""
+    try:
+        rels = ET.fromstring(archive.read("_rels/.rels"))
+    except KeyError:
+        return "word/document.xml"
+    for rel in rels.iter(PKG_REL):
+        if rel.get("Type", "").endswith("/officeDocument"):
+            return rel.get("Target").lstrip("/")
+    return "word/document.xml"
+
+
+def _relationships(archive: zipfile.ZipFile, part: str) -> Dict[str, str]:
+    """rId -> путь файла в архиве (внешние ссылки пропускаются)."""
+    folder, name = posixpath.split(part)
+    try:
+        rels = ET.fromstring(archive.read(posixpath.join(folder, "_rels", name + ".rels")))
+    except KeyError:
+        return {}
+    result = {}
+    for rel in rels.iter(PKG_REL):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target", "")
+        path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(folder, target))
+        result[rel.get("Id")] = path
+    return result
+
+
+def _content_types(archive: zipfile.ZipFile):
+    """(тип по расширению, тип по пути части)."""
+    defaults, overrides = {}, {}
+    try:
+        types = ET.fromstring(archive.read("[Content_Types].xml"))
+    except KeyError:
+        return defaults, overrides
+    for node in types.iter(CT + "Default"):
+        defaults[node.get("Extension", "").lower()] = node.get("ContentType", "")
+    for node in types.iter(CT + "Override"):
+        overrides[node.get("PartName", "").lstrip("/")] = node.get("ContentType", "")
+    return defaults, overrides
+
+
+def _nodes(element: ET.Element) -> Iterator[ET.Element]:
+    """
+    Все потомки, кроме веток mc:Fallback: в mc:AlternateContent Word кладёт
+    то же содержимое дважды (DrawingML в mc:Choice и VML в mc:Fallback).
+    """
+    stack = [element]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed([child for child in node if child.tag != MC_FALLBACK]))
+
+
+def _image_ids(element: ET.Element) -> Iterator[str]:
+    for node in _nodes(element):
+        if node.tag == A_BLIP:
+            rid = node.get(R + "embed")
+        elif node.tag == V_IMAGEDATA:
+            rid = node.get(R + "id")
+        else:
+            continue
+        if rid:
+            yield rid
+
+
+def iter_elements_with_images(file_path, images: bool = True) -> Iterator[dict]:
+    """
+    Элементы тела документа по порядку:
+      {'type': 'text', 'text': ...} — абзац или таблица (текст ячеек через пробел);
+      {'type': 'image', 'blob': bytes, 'ext': 'png'} — картинки абзаца, после его текста.
+    images=False — только текст, байты картинок из архива не читаются.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        part = _main_part(archive)
+        rels = _relationships(archive, part)
+        defaults, overrides = _content_types(archive)
+
+        def image(rid: str) -> Optional[dict]:
+            path = rels.get(rid)
+            if path is None:
+                return None
+            try:
+                blob = archive.read(path)
+            except KeyError:
+                return None
+            ext = posixpath.splitext(path)[1].lstrip(".").lower()
+            content_type = overrides.get(path) or defaults.get(ext) or ""
+            return {'type': 'image', 'blob': blob, 'ext': content_type.split('/')[-1] or ext}
+
+        with archive.open(part) as stream:
+            body = None
+            depth = 0           # глубина относительно w:body
+            for event, element in ET.iterparse(stream, events=("start", "end")):
+                if event == "start":
+                    if element.tag == BODY:
+                        body = element
+                    elif body is not None:
+                        depth += 1
+                    continue
+
+                if body is None or element is body:
+                    continue
+                depth -= 1
+                if depth:
+                    continue
+
+                # Закрылся элемент верхнего уровня тела
+                texts = [node.text for node in _nodes(element) if node.tag == TEXT and node.text]
+                if element.tag == PARAGRAPH:
+                    text = "".join(texts).strip()
+                    if text:
+                        yield {'type': 'text', 'text': text}
+                elif element.tag == TABLE:
+                    text = " ".join(texts).strip()
+                    if text:
+                        yield {'type': 'text', 'text': text}
+                for rid in _image_ids(element) if images else ():
+                    item = image(rid)
+                    if item is not None:
+                        yield item
+                body.clear()    # разобранное больше не держим
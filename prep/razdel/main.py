@@ -1,9 +1,6 @@
-from langchain_ollama import OllamaLLM
-import base64
 from docx import Document
-URL_LLM=""
-USER_LLM=""
-PASSWORD_LLM=""
+
+from ollama_client import get_llm
 
 def extract_text_from_docx(file_path):
     """Извлекает только текст из .docx файла (игнорируя изображения)."""
@@ -40,10 +37,7 @@ def create_prompt_for_sectioning(text):
 
 def get_sectioned_text(prompt):
     """Отправляет промт в LLM и возвращает ответ."""
-    encoded_credentials = base64.b64encode(f"{USER_LLM}:{PASSWORD_LLM}".encode()).decode()
-    headers = {'Authorization': f'Basic {encoded_credentials}'}
-
-    llm_class = OllamaLLM(model="gemma3:12b", temperature = 0.1, base_url=URL_LLM, client_kwargs={'headers': headers})
+    llm_class = get_llm("gemma3:12b", temperature=0.1)
     llm_response = llm_class.invoke(prompt)
     return llm_response
 
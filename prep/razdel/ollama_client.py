@@ -0,0 +1,13 @@
+"""
+Общий клиент Ollama (prep/rag_llm) для скриптов этого каталога.
+Скрипты запускаются из prep/razdel, поэтому здесь — один раз — в пути поиска
+модулей добавляется родительский каталог prep.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_llm.ollama_pool import get_llm  # noqa: E402
+
+__all__ = ["get_llm"]
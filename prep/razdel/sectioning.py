@@ -0,0 +1,166 @@
+"""
+Разбиение длинного документа на разделы по частям (map-reduce).
+
+  • map — блоки текста набираются в окна по бюджету токенов (WINDOW_TOKENS)
+    с перекрытием OVERLAP_BLOCKS блоков; для каждого окна LLM возвращает, с каких
+    блоков (глобальные номера) начинаются разделы и их названия. Окна
+    отправляются параллельно — задержка растёт с числом окон на воркер,
+    а не с длиной документа;
+  • reduce — у каждого окна есть «ядро» (окно без половины перекрытия с каждой
+    стороны): начало раздела принимается только от окна, в ядре которого оно
+    лежит, — там у модели есть контекст с обеих сторон. Первый блок окна
+    модель склонна считать началом раздела — он в перекрытии и отбрасывается.
+    Соседние разделы с одинаковым названием сливаются.
+
+Результат — тот же формат, что ждёт create_document_with_headings:
+[{"start_block": 0, "end_block": 4, "title": "..."}, ...], номера с 0, по порядку.
+"""
+import json
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+WINDOW_TOKENS = 3000      # блоков в окне — на столько токенов (без текста промпта)
+OVERLAP_BLOCKS = 2        # блоков перекрытия между соседними окнами
+BLOCK_CHARS = 600         # длиннее — блок в промпте обрезается (тема видна по началу)
+MAX_WORKERS = 4
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def approx_tokens(text: str) -> int:
+    # Для бюджета промпта достаточно грубой оценки: ~1.7 токена на русское слово
+    return math.ceil(len(_TOKEN_RE.findall(text)) * 1.7)
+
+
+def _normalize_title(title: str) -> str:
+    return re.sub(r"[\W_]+", " ", title.lower().replace("ё", "е")).strip()
+
+
+class Sectioner:
+    def __init__(
+        self,
+        invoke: Callable[[str], str],
+        window_tokens: int = WINDOW_TOKENS,
+        overlap_blocks: int = OVERLAP_BLOCKS,
+        max_workers: int = MAX_WORKERS,
+        token_counter: Optional[Callable[[str], int]] = None,
+    ) -> None:
+        self.invoke = invoke
+        self.window_tokens = window_tokens
+        self.overlap_blocks = overlap_blocks
+        self.max_workers = max_workers
+        self.count_tokens = token_counter or approx_tokens
+
+    # -----------------------
+    # ОКНА
+    # -----------------------
+    @staticmethod
+    def _preview(block: str) -> str:
+        block = " ".join(block.split())
+        return block if len(block) <= BLOCK_CHARS else block[:BLOCK_CHARS] + "..."
+
+    def windows(self, blocks: List[str]) -> List[Tuple[int, int]]:
+        """[(start, end)) по блокам; каждое следующее окно начинается за overlap_blocks до конца предыдущего."""
+        costs = [self.count_tokens(self._preview(b)) for b in blocks]
+        result = []
+        start = 0
+        while start < len(blocks):
+            end, used = start, 0
+            # Хотя бы overlap + 1 блоков, чтобы окна продвигались
+            while end < len(blocks) and (used + costs[end] <= self.window_tokens or end - start <= self.overlap_blocks):
+                used += costs[end]
+                end += 1
+            result.append((start, end))
+            if end >= len(blocks):
+                break
+            start = end - self.overlap_blocks
+        return result
+
+    def _core(self, windows: List[Tuple[int, int]], k: int) -> Tuple[int, int]:
+        start, end = windows[k]
+        half = self.overlap_blocks / 2
+        core_start = start if k == 0 else start + math.ceil(half)
+        core_end = end if k == len(windows) - 1 else end - math.floor(half)
+        return core_start, core_end
+
+    # -----------------------
+    # MAP
+    # -----------------------
+    def prompt(self, blocks: List[str], start: int, end: int) -> str:
+        numbered = "\n\n".join(f"Блок {i}: {self._preview(blocks[i])}" for i in range(start, end))
+        return f"""
+    Ниже фрагмент документа — блоки {start}–{end - 1} из {len(blocks)}. Определи, с каких блоков
+    начинаются новые логические разделы, и дай каждому короткое название (3–6 слов).
+    {"Блок " + str(start) + " может быть продолжением раздела из предыдущего фрагмента." if start else ""}
+
+    Верни ТОЛЬКО массив в формате JSON, номера блоков — как в тексте:
+
+    [
+    {{
+        "start_block": {start},
+        "title": "Введение"
+    }}
+    ]
+
+    Текстовые блоки:
+    {numbered}
+    """
+
+    @staticmethod
+    def parse(response: str, start: int, end: int) -> Dict[int, str]:
+        """{номер блока: название} из JSON-ответа; номера вне окна отбрасываются."""
+        left, right = response.find("["), response.rfind("]") + 1
+        if left == -1 or right == 0:
+            return {}
+        try:
+            items = json.loads(response[left:right])
+        except ValueError:
+            return {}
+        result = {}
+        for item in items if isinstance(items, list) else []:
+            try:
+                block = int(item["start_block"])
+                title = str(item.get("title") or "").strip(" \"'.")
+            except (KeyError, TypeError, ValueError):
+                continue
+            if start <= block < end and title:
+                result[block] = title
+        return result
+
+    def _map_window(self, blocks: List[str], start: int, end: int) -> Dict[int, str]:
+        try:
+            return self.parse(self.invoke(self.prompt(blocks, start, end)), start, end)
+        except Exception as e:
+            print(f"[ERROR] Sectioner: окно блоков {start}–{end - 1}: {e}")
+            return {}
+
+    # -----------------------
+    # REDUCE
+    # -----------------------
+    def section(self, blocks: List[str]) -> List[Dict]:
+        if not blocks:
+            return []
+        windows = self.windows(blocks)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(windows))) as pool:
+            answers = list(pool.map(lambda w: self._map_window(blocks, *w), windows))
+
+        starts: Dict[int, str] = {}
+        for k, answer in enumerate(answers):
+            core_start, core_end = self._core(windows, k)
+            for block, title in answer.items():
+                if core_start <= block < core_end:
+                    starts[block] = title
+        print(f"[LOG] Sectioner: блоков {len(blocks)}, окон {len(windows)}, начал разделов {len(starts)}")
+
+        merged: List[Tuple[int, str]] = []
+        for block, title in sorted(starts.items()):
+            if merged and _normalize_title(merged[-1][1]) == _normalize_title(title):
+                continue    # то же название у соседнего раздела — продолжение
+            merged.append((block, title))
+
+        return [
+            {"start_block": block, "end_block": (merged[i + 1][0] if i + 1 < len(merged) else len(blocks)) - 1, "title": title}
+            for i, (block, title) in enumerate(merged)
+        ]
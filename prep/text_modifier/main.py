@@ -1,5 +1,5 @@
- # main.py
-from text_modifier import TextModify
+ # main.py — запуск из каталога prep: python -m text_modifier.main
+from text_modifier.text_modifier import TextModify
 
 if __name__ == "__main__":
        text_modifier = TextModify()
@@ -1,26 +1,30 @@
 # text_modifier.py
-from langchain_ollama import OllamaLLM
 from langchain.callbacks.manager import CallbackManager
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 from langchain import PromptTemplate
 from langchain.schema import HumanMessage
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
-URL_LLM = os.getenv("URL_LLM")
-USER_LLM = os.getenv("USER_LLM")
-PASSWORD_LLM = os.getenv("PASSWORD_LLM") 
 MODEL = os.getenv("MODEL")
+# Параллельная правка абзацев (правки кешируются в общем LLMCache, см. LLM_CACHE)
+TEXT_MODIFY_CONCURRENCY = int(os.getenv("TEXT_MODIFY_CONCURRENCY") or 4)
+TEXT_MODIFY_RETRIES = int(os.getenv("TEXT_MODIFY_RETRIES") or 2)
 
-import base64
-
-encoded_credentials = base64.b64encode(f"{USER_LLM}:{PASSWORD_LLM}".encode()).decode()
-headers = {'Authorization': f'Basic {encoded_credentials}'}
+from rag_llm.ollama_pool import get_llm
 
 class TextModify:
-    def __init__(self, model_name="gpt-oss:latest", temperature="0.1"):
-        self.llm = OllamaLLM(model=MODEL, temperature=0.1, base_url=URL_LLM, client_kwargs={'headers': headers})
+    RETRY_DELAY = 2.0     # секунд до первого повтора, дальше удваивается
+
+    def __init__(self, model_name="gpt-oss:latest", temperature="0.1", concurrency=None, retries=None, cache=True):
+        self.model = MODEL
+        # Ключ кеша — модель, параметры и точный промпт: правка шаблона сама отменяет старые правки
+        self.llm = get_llm(MODEL, temperature=0.1, cache=cache)
+        self.concurrency = concurrency or TEXT_MODIFY_CONCURRENCY
+        self.retries = TEXT_MODIFY_RETRIES if retries is None else retries
         self.prompt_template = """
         Ты — профессиональный редактор и технический писатель. Твоя задача — улучшить следующий текст, полученный из аудиозаписи видеоинструкции. Сделай его грамматически правильным, стилистически гладким, логически связным и литературно выдержанным, полностью сохранив все исходные сведения.
 
@@ -34,6 +38,62 @@ class TextModify:
         7. Не возвращай в тексте свои рассуждения, только итоговый текст
         """
 
+    def prompt(self, full_text):
+        return self.prompt_template + " Вот текст для улучшения: " + full_text
+
     def improve_text(self, full_text):
-        prompt = self.prompt_template + " Вот текст для улучшения: " + full_text
-        return self.llm.invoke(prompt)
+        return self.llm.invoke(self.prompt(full_text))
+
+    def _improve_with_retry(self, text):
+        delay = self.RETRY_DELAY
+        for attempt in range(self.retries + 1):
+            try:
+                result = self.improve_text(text)
+                if not str(result).strip():
+                    raise ValueError("пустой ответ модели")
+                return result
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                print(f"[ERROR] TextModify: попытка {attempt + 1} не удалась ({e}), повтор через {delay:.0f} с")
+                time.sleep(delay)
+                delay *= 2
+
+    def improve_texts(self, paragraphs):
+        """
+        Правит абзацы параллельно (не больше concurrency запросов к LLM одновременно)
+        и возвращает их в исходном порядке. Абзацы из кеша и повторы внутри документа
+        к модели не уходят; абзац, который не удалось поправить и после повторов,
+        остаётся как был.
+        """
+        results = list(paragraphs)
+        pending = {}  # текст абзаца -> номера абзацев с этим текстом
+        hits = 0
+        for i, text in enumerate(paragraphs):
+            if not text.strip():
+                continue
+            cached = self.llm.cached(self.prompt(text))
+            if cached is not None:
+                results[i] = cached
+                hits += 1
+            else:
+                pending.setdefault(text, []).append(i)
+
+        failed = 0
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = {pool.submit(self._improve_with_retry, text): text for text in pending}
+                for future in as_completed(futures):
+                    text = futures[future]
+                    try:
+                        edited = future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f"[ERROR] TextModify: абзац {pending[text][0] + 1} оставлен без правки: {e}")
+                        continue
+                    for i in pending[text]:
+                        results[i] = edited
+
+        print(f"[LOG] TextModify: абзацев {len(paragraphs)}, из кеша {hits}, "
+              f"отправлено в LLM {len(pending)}, не поправлено {failed}")
+        return results
@@ -1,6 +1,7 @@
 from sentence_transformers import SentenceTransformer, util
 import nltk
-from typing import List, Tuple, Optional, Union
+from typing import Iterable, Iterator, List, Tuple, Optional, Union
+import torch
 
 # Загрузка токенизатора предложений (один раз при импорте)
 try:
@@ -11,6 +12,7 @@ except LookupError:
 
 class text_to_paragraphs:
     _model = None  # Общая модель для всех экземпляров (опционально)
+    WINDOW_SENTENCES = 256  # столько предложений кодируется за раз (память не зависит от длины текста)
 
     def __init__(self, text: Union[str, List[Tuple[str, float]]], segments_time: Optional[List[Tuple[str, float]]] = None):
         """
@@ -18,6 +20,7 @@ class text_to_paragraphs:
         Поддерживает два режима:
         1. text = строка, segments_time = None → обработка обычного текста.
         2. text = игнорируется, segments_time = [(sentence, timestamp), ...] → обработка с врем. метками.
+           segments_time может быть и генератором — тогда он читается окнами (режим длинных записей).
         """
         if segments_time is not None:
             self.segments_time = segments_time
@@ -42,6 +45,69 @@ class text_to_paragraphs:
         # Убираем лишние пробелы в начале/конце
         return [s.strip() for s in sentences if s.strip()]
 
+    @classmethod
+    def _iter_with_next_similarity(cls, items: Iterable[Tuple[str, float]]) -> Iterator[Tuple[str, float, Optional[float]]]:
+        """
+        Отдаёт (предложение, метка, сходство со следующим предложением или None для последнего).
+        Предложения кодируются окнами по WINDOW_SENTENCES; последнее предложение окна
+        переносится в следующее, поэтому матрица N×N не строится и память ограничена окном.
+        """
+        model = cls.get_model()
+        it = iter(items)
+        carry = None  # (предложение, метка, эмбеддинг) — хвост предыдущего окна
+        while True:
+            window = []
+            for item in it:
+                window.append(item)
+                if len(window) >= cls.WINDOW_SENTENCES:
+                    break
+            if not window:
+                break
+            embeddings = model.encode([s for s, _ in window], convert_to_tensor=True)
+            if carry is not None:
+                yield carry[0], carry[1], util.pytorch_cos_sim(carry[2], embeddings[0]).item()
+            if len(window) > 1:
+                next_sims = torch.nn.functional.cosine_similarity(embeddings[:-1], embeddings[1:]).tolist()
+                for (sentence, t), sim in zip(window[:-1], next_sims):
+                    yield sentence, t, sim
+            carry = (window[-1][0], window[-1][1], embeddings[-1])
+        if carry is not None:
+            yield carry[0], carry[1], None
+
+    def _iter_paragraphs(
+        self,
+        items: Iterable[Tuple[str, float]],
+        threshold: float,
+        min_sents: int,
+        max_sents: int,
+        min_words: int,
+        max_words: int,
+    ) -> Iterator[Tuple[str, float]]:
+        """Общий цикл разбиения: (абзац, метка последнего предложения) по мере готовности."""
+        current_paragraph = []
+        current_times = []
+        word_count = 0
+
+        for sentence, t, next_sim in self._iter_with_next_similarity(items):
+            current_paragraph.append(sentence)
+            current_times.append(t)
+            word_count += len(sentence.split())
+
+            # Условия для разрыва
+            semantic_break = (next_sim is not None and next_sim < threshold)
+            long_enough = (len(current_paragraph) >= min_sents or word_count >= min_words)
+            too_long = (len(current_paragraph) >= max_sents or word_count >= max_words)
+
+            if (semantic_break and long_enough) or too_long:
+                yield " ".join(current_paragraph), current_times[-1]
+                current_paragraph = []
+                current_times = []
+                word_count = 0
+
+        # Остаток
+        if current_paragraph:
+            yield " ".join(current_paragraph), current_times[-1]
+
     def get_text_to_paragraphs(
         self,
         threshold: float = 0.7,
@@ -64,41 +130,12 @@ class text_to_paragraphs:
     ) -> List[str]:
         """Возвращает список абзацев (без временных меток)."""
         if self.mode == 'segments':
-            raw_sentences = [s for s, _ in self.segments_time]
-            times = [t for _, t in self.segments_time]
+            items = self.segments_time
         else:
             raw_sentences = self._split_sentences_from_text(self.text)
-            times = list(range(len(raw_sentences)))  # фиктивные метки
+            items = [(sentence, i) for i, sentence in enumerate(raw_sentences)]  # фиктивные метки
 
-        if not raw_sentences:
-            return []
-
-        model = self.get_model()
-        embeddings = model.encode(raw_sentences, convert_to_tensor=True)
-        sims = util.pytorch_cos_sim(embeddings, embeddings)
-
-        paragraphs = []
-        current_paragraph = []
-
-        for i in range(len(raw_sentences)):
-            current_paragraph.append(raw_sentences[i])
-
-            word_count = sum(len(s.split()) for s in current_paragraph)
-
-            # Условия для разрыва
-            semantic_break = (i < len(raw_sentences) - 1 and sims[i][i + 1].item() < threshold)
-            long_enough = (len(current_paragraph) >= min_sents or word_count >= min_words)
-            too_long = (len(current_paragraph) >= max_sents or word_count >= max_words)
-
-            if (semantic_break and long_enough) or too_long:
-                paragraphs.append(" ".join(current_paragraph))
-                current_paragraph = []
-
-        # Остаток
-        if current_paragraph:
-            paragraphs.append(" ".join(current_paragraph))
-
-        return paragraphs
+        return [p for p, _ in self._iter_paragraphs(items, threshold, min_sents, max_sents, min_words, max_words)]
 
     def get_text_to_paragraphs_table(
         self,
@@ -115,36 +152,18 @@ class text_to_paragraphs:
         if self.mode != 'segments':
             raise ValueError("Метод get_text_to_paragraphs_table требует передачи segments_time при инициализации.")
 
-        sentences = [s for s, _ in self.segments_time]
-        times = [t for _, t in self.segments_time]
-
-        if not sentences:
-            return []
+        return list(self.iter_text_to_paragraphs_table(threshold, min_sents, max_sents, min_words, max_words))
 
-        model = self.get_model()
-        embeddings = model.encode(sentences, convert_to_tensor=True)
-        sims = util.pytorch_cos_sim(embeddings, embeddings)
-
-        paragraphs = []
-        current_paragraph = []
-        current_times = []
-
-        for i in range(len(sentences)):
-            current_paragraph.append(sentences[i])
-            current_times.append(times[i])
-
-            word_count = sum(len(s.split()) for s in current_paragraph)
-
-            semantic_break = (i < len(sentences) - 1 and sims[i][i + 1].item() < threshold)
-            long_enough = (len(current_paragraph) >= min_sents or word_count >= min_words)
-            too_long = (len(current_paragraph) >= max_sents or word_count >= max_words)
-
-            if (semantic_break and long_enough) or too_long:
-                paragraphs.append((" ".join(current_paragraph), current_times[-1]))
-                current_paragraph = []
-                current_times = []
-
-        if current_paragraph:
-            paragraphs.append((" ".join(current_paragraph), current_times[-1]))
+    def iter_text_to_paragraphs_table(
+        self,
+        threshold: float = 0.7,
+        min_sents: int = 2,
+        max_sents: int = 8,
+        min_words: int = 15,
+        max_words: int = 150
+    ) -> Iterator[Tuple[str, float]]:
+        """Потоковый вариант get_text_to_paragraphs_table: абзацы отдаются по мере готовности."""
+        if self.mode != 'segments':
+            raise ValueError("Метод iter_text_to_paragraphs_table требует передачи segments_time при инициализации.")
 
-        return paragraphs
\ No newline at end of file
+        yield from self._iter_paragraphs(self.segments_time, threshold, min_sents, max_sents, min_words, max_words)
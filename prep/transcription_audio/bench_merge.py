@@ -0,0 +1,183 @@
+"""
+Микробенчмарк склейки транскрипта на синтетическом тексте (по умолчанию 200 000 слов).
+
+Сравнивает текущие Transcription._merge_transcription_results / _group_chunks
+с прежними реализациями (скопированы ниже как эталон) и проверяет,
+что итоговый JSON совпадает байт в байт.
+
+Пример:
+    python -m prep.transcription_audio.bench_merge --words 200000
+"""
+import argparse
+import bisect
+import copy
+import gc
+import json
+import math
+import random
+import re
+import time
+
+from prep.transcription_audio.transcription import Transcription
+
+
+# -----------------------
+# ЭТАЛОН: реализации до оптимизации
+# -----------------------
+def _legacy_remap_time(t, time_map):
+    idx = max(bisect.bisect_right(time_map, (t, math.inf, math.inf)) - 1, 0)
+    part_start, orig_start, length = time_map[idx]
+    return orig_start + min(max(0.0, t - part_start), length)
+
+
+def _legacy_merge(parts_results, original_audio_path, first_segment_id=0):
+    full_text = ""
+    all_segments = []
+    for idx, part_result in enumerate(parts_results):
+        part_text = part_result.get("text", "")
+        part_segments = part_result.get("segments", [])
+        time_map = part_result.get("time_map", [(0.0, 0.0, math.inf)])
+        updated_segments = []
+        for seg in part_segments:
+            updated_seg = seg.copy()
+            updated_seg["id"] = first_segment_id + len(all_segments) + len(updated_segments)
+            updated_seg["start"] = _legacy_remap_time(seg["start"], time_map)
+            updated_seg["end"] = _legacy_remap_time(seg["end"], time_map)
+            if "words" in updated_seg:
+                updated_seg["words"] = [
+                    {**word,
+                     "start": _legacy_remap_time(word["start"], time_map),
+                     "end": _legacy_remap_time(word["end"], time_map)}
+                    for word in updated_seg["words"]
+                ]
+            updated_segments.append(updated_seg)
+        all_segments.extend(updated_segments)
+        full_text += part_text
+        if idx < len(parts_results) - 1:
+            full_text += " "
+    return {"full_text": full_text.strip(), "segments": all_segments, "audio_file": original_audio_path}
+
+
+def _legacy_group_chunks(chunks, max_gap=0.6, max_words=20):
+    def _flush(seg_words, seg_start, seg_end, segments):
+        if not seg_words:
+            return
+        clean_tokens = [w["text"].lstrip() for w in seg_words]
+        text = " ".join(clean_tokens)
+        text = re.sub(r"\s{2,}", " ", text)
+        text = re.sub(r"\s+([.,!?;:%)\]])", r"\1", text)
+        segments.append({
+            "id": len(segments),
+            "start": seg_start,
+            "end": seg_end,
+            "text": text.strip(),
+            "words": [
+                {
+                    "word": w["text"].strip(),
+                    "start": w["timestamp"][0],
+                    "end": w["timestamp"][1] or w["timestamp"][0],
+                } for w in seg_words
+            ],
+        })
+
+    segments, seg_words = [], []
+    seg_start = prev_end = None
+    for ch in chunks:
+        st, ed = ch.get("timestamp", (None, None))
+        if st is None:
+            continue
+        if seg_start is None:
+            seg_start = st
+            prev_end = ed or st
+        gap = 0 if prev_end is None else st - prev_end
+        if (gap > max_gap and seg_words) or len(seg_words) >= max_words:
+            _flush(seg_words, seg_start, prev_end, segments)
+            seg_words, seg_start = [], st
+        seg_words.append(ch)
+        prev_end = ed or st
+    _flush(seg_words, seg_start, prev_end, segments)
+    return segments
+
+
+# -----------------------
+# СИНТЕТИЧЕСКИЕ ДАННЫЕ
+# -----------------------
+VOCAB = "открываем справочник номенклатура нажимаем кнопку создать документ проведение проводки , . ?".split()
+
+
+def make_parts(n_words: int, part_words: int = 20000, vad: bool = False, seed: int = 0):
+    """Результаты частей в формате openai‑whisper (сегменты по ~12 слов) с картами времени."""
+    rng = random.Random(seed)
+    parts = []
+    for p, base in enumerate(range(0, n_words, part_words)):
+        t, segments = 0.0, []
+        words_left = min(part_words, n_words - base)
+        while words_left > 0:
+            count = min(words_left, rng.randint(6, 18))
+            words = []
+            for _ in range(count):
+                words.append({"word": " " + rng.choice(VOCAB), "start": t, "end": t + 0.25, "probability": rng.random()})
+                t += 0.3 + (rng.random() < 0.05) * 1.2
+            segments.append({"id": len(segments), "seek": 0, "start": words[0]["start"], "end": words[-1]["end"],
+                             "text": "".join(w["word"] for w in words), "words": words})
+            words_left -= count
+        if vad:
+            time_map = [(float(k * 30), p * 600.0 + k * 35.0, 29.7) for k in range(int(t // 30) + 1)]
+        else:
+            time_map = [(0.0, p * 600.0, math.inf)]
+        parts.append({"text": " ".join(s["text"].strip() for s in segments), "segments": segments, "time_map": time_map})
+    return parts
+
+
+def make_chunks(n_words: int, seed: int = 0):
+    """word‑chunks Hugging Face pipeline: {"text", "timestamp": (start, end|None)}."""
+    rng = random.Random(seed)
+    chunks, t = [], 0.0
+    for _ in range(n_words):
+        end = None if rng.random() < 0.01 else t + 0.25
+        chunks.append({"text": " " + rng.choice(VOCAB), "timestamp": (t, end)})
+        t += 0.3 + (rng.random() < 0.05) * 1.0
+    return chunks
+
+
+def _timed(fn, *args, repeat: int = 3):
+    best = math.inf
+    result = None
+    for _ in range(repeat):
+        fresh = copy.deepcopy(args)  # новая реализация сдвигает на месте — каждому прогону свои данные
+        gc.collect()
+        gc.disable()
+        try:
+            t0 = time.perf_counter()
+            result = fn(*fresh)
+            best = min(best, time.perf_counter() - t0)
+        finally:
+            gc.enable()
+    return best, result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--words", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    transcriber = Transcription.__new__(Transcription)  # без загрузки модели
+
+    print(f"Синтетический транскрипт: {args.words} слов")
+    for label, vad in (("merge (части)", False), ("merge (VAD)", True)):
+        parts = make_parts(args.words, vad=vad)
+        old_s, old = _timed(_legacy_merge, parts, "audio.wav", repeat=args.repeat)
+        new_s, new = _timed(transcriber._merge_transcription_results, parts, "audio.wav", repeat=args.repeat)
+        same = json.dumps(old, ensure_ascii=False, indent=2) == json.dumps(new, ensure_ascii=False, indent=2)
+        print(f"{label:15s} было {old_s:7.3f} с, стало {new_s:7.3f} с, x{old_s / new_s:4.1f}, JSON совпадает: {same}")
+
+    chunks = make_chunks(args.words)
+    old_s, old = _timed(_legacy_group_chunks, chunks, repeat=args.repeat)
+    new_s, new = _timed(transcriber._group_chunks, chunks, repeat=args.repeat)
+    same = json.dumps(old, ensure_ascii=False, indent=2) == json.dumps(new, ensure_ascii=False, indent=2)
+    print(f"{'group_chunks':15s} было {old_s:7.3f} с, стало {new_s:7.3f} с, x{old_s / new_s:4.1f}, JSON совпадает: {same}")
+
+
+if __name__ == "__main__":
+    main()
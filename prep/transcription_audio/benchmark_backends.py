@@ -0,0 +1,115 @@
+"""
+Сравнение бэкендов Transcription по скорости и качеству (WER/CER) на фикстуре.
+
+Фикстура в репозиторий не входит (запись с речью и её расшифровка): возьмите
+короткий фрагмент реальной записи, например извлечённый prepare_files WAV 16 кГц
+моно на 1–3 минуты, и его вычитанную вручную расшифровку в UTF-8 .txt.
+Удобно положить их в test_file/data/sample.wav и sample.txt — там же их ищет
+e2e-тест (test_file/conftest.py, фикстура sample_audio_path).
+
+Пример:
+    python -m prep.transcription_audio.benchmark_backends \
+        --audio test_file/data/sample.wav \
+        --reference test_file/data/sample.txt \
+        --models medium faster:medium faster:large-v3
+"""
+import argparse
+import json
+import re
+import time
+from typing import List, Dict, Any
+
+from pydub.utils import mediainfo
+from prep.transcription_audio.transcription import Transcription
+
+
+def _normalize(text: str) -> List[str]:
+    """Нижний регистр, ё→е, без пунктуации — иначе WER меряет расстановку знаков."""
+    text = text.lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return text.split()
+
+
+def _edit_distance(ref: List[str], hyp: List[str]) -> int:
+    """Расстояние Левенштейна по токенам (одна строка DP в памяти)."""
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, start=1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, start=1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1]
+
+
+def wer(reference: str, hypothesis: str) -> float:
+    ref = _normalize(reference)
+    if not ref:
+        return 0.0
+    return _edit_distance(ref, _normalize(hypothesis)) / len(ref)
+
+
+def cer(reference: str, hypothesis: str) -> float:
+    ref = list("".join(_normalize(reference)))
+    if not ref:
+        return 0.0
+    return _edit_distance(ref, list("".join(_normalize(hypothesis)))) / len(ref)
+
+
+def benchmark(audio: str, reference: str, models: List[str], language: str = "ru") -> List[Dict[str, Any]]:
+    duration = float(mediainfo(audio).get("duration", 0.0))
+    rows = []
+    for model_name in models:
+        print(f"[LOG] Бенчмарк модели {model_name}")
+        t0 = time.perf_counter()
+        transcriber = Transcription(model_name=model_name, language=language)
+        load_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        result = transcriber.transcribe(audio)
+        transcribe_s = time.perf_counter() - t0
+        transcriber.unload()
+
+        words = sum(len(seg.get("words", [])) for seg in result["segments"])
+        rows.append({
+            "model": model_name,
+            "load_s": round(load_s, 2),
+            "transcribe_s": round(transcribe_s, 2),
+            "rtf": round(transcribe_s / duration, 3) if duration else None,
+            "wer": round(wer(reference, result["full_text"]), 4),
+            "cer": round(cer(reference, result["full_text"]), 4),
+            "segments": len(result["segments"]),
+            "words": words,
+        })
+    return rows
+
+
+def _print_table(rows: List[Dict[str, Any]]) -> None:
+    cols = ["model", "load_s", "transcribe_s", "rtf", "wer", "cer", "segments", "words"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in cols}
+    print(" | ".join(c.ljust(widths[c]) for c in cols))
+    print("-+-".join("-" * widths[c] for c in cols))
+    for r in rows:
+        print(" | ".join(str(r[c]).ljust(widths[c]) for c in cols))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--audio", required=True, help="WAV-фикстура с речью (см. описание модуля)")
+    ap.add_argument("--reference", required=True, help="Эталонная расшифровка этой записи (txt, UTF-8)")
+    ap.add_argument("--models", nargs="+", default=["medium", "faster:medium"], help="Значения MODEL_WHISPER для сравнения")
+    ap.add_argument("--language", default="ru")
+    ap.add_argument("--out", default=None, help="Сохранить результаты в JSON")
+    args = ap.parse_args()
+
+    with open(args.reference, "r", encoding="utf-8") as f:
+        reference = f.read()
+
+    rows = benchmark(args.audio, reference, args.models, args.language)
+    _print_table(rows)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
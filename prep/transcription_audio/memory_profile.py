@@ -0,0 +1,176 @@
+"""
+Профиль пикового RSS для режима длинных записей (MAX_DURATION=0).
+
+Генерирует синтетическую запись нужной длительности (речь-шум с паузами) и
+синтетический транскрипт, затем в отдельных процессах прогоняет этапы, которые
+раньше загружали всё в память:
+  • split      – разбиение аудио на части по паузам;
+  • vad        – VAD-проход и склейка речи в части;
+  • paragraphs – предложения из JSONL + разбиение на абзацы окнами;
+  • transcribe_docx – транскрибация по частям в .jsonl и .tsb (модель заменена
+    синтетическими сегментами со словами, остальной путь — как в main.py),
+    Document для чанкера из .tsb и сборка DOCX (без видео; LLM не вызывается —
+    один раздел на весь текст).
+
+Пример:
+    python -m prep.transcription_audio.memory_profile --minutes 30 240
+"""
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import queue as queue_module
+import random
+import resource
+import sys
+import tempfile
+import time
+import wave
+
+SAMPLE_RATE = 16000
+STAGE_TIMEOUT = 3 * 3600    # секунд на этап; упавший процесс замечается сразу
+PREP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _make_wav(path: str, minutes: int) -> None:
+    """16 кГц моно: 8 с «речи» (шум) + 2 с тишины, блоками — без генерации всего файла в памяти."""
+    rng = random.Random(0)
+    speech = bytes(rng.getrandbits(8) & 0x3F if i % 2 else rng.getrandbits(8) for i in range(SAMPLE_RATE * 2 * 8))
+    silence = b"\0" * (SAMPLE_RATE * 2 * 2)
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        for _ in range(minutes * 6):
+            wf.writeframes(speech)
+            wf.writeframes(silence)
+
+
+def _make_jsonl(path: str, minutes: int) -> None:
+    """Синтетический транскрипт: сегмент на каждые 4 секунды."""
+    words = "открываем справочник номенклатура и нажимаем кнопку создать документ проведение".split()
+    rng = random.Random(0)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(minutes * 15):
+            text = " ".join(rng.choice(words) for _ in range(10)).capitalize() + "."
+            f.write(json.dumps({"id": i, "start": i * 4.0, "end": i * 4.0 + 3.5, "text": text}, ensure_ascii=False) + "\n")
+
+
+def _synthetic_transcribe(part_file: str) -> dict:
+    """Вместо модели: сегмент со словами на каждые 4 секунды части (шкала части)."""
+    from transcription_audio.transcription import Transcription
+    words = "открываем справочник номенклатура и нажимаем кнопку создать документ проведение".split()
+    rng = random.Random(part_file)
+    segments = []
+    duration = Transcription._probe_duration_ms(part_file) / 1000.0
+    t = 0.0
+    while t + 4.0 <= duration:
+        seg_words = [
+            {"word": " " + rng.choice(words), "start": t + j * 0.35, "end": t + j * 0.35 + 0.3, "probability": 0.9}
+            for j in range(10)
+        ]
+        text = "".join(w["word"] for w in seg_words).strip().capitalize() + "."
+        segments.append({"id": len(segments), "start": t, "end": t + 3.5, "text": text, "words": seg_words})
+        t += 4.0
+    return {"text": " ".join(seg["text"] for seg in segments), "segments": segments}
+
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def _stage(name: str, wav_path: str, jsonl_path: str, queue) -> None:
+    sys.path.insert(0, PREP_DIR)
+    base_rss = _peak_rss_mb()
+    t0 = time.perf_counter()
+    if name in ("split", "vad"):
+        from transcription_audio.transcription import Transcription
+        transcriber = Transcription.__new__(Transcription)  # без загрузки модели
+        transcriber.use_vad = name == "vad"
+        transcriber.PART_DURATION_SECONDS = 5 * 60
+        parts = transcriber._plan_parts(wav_path)
+        for part_file, _ in parts:
+            if part_file != wav_path:
+                os.unlink(part_file)
+        detail = f"{len(parts)} частей"
+    elif name == "paragraphs":
+        from create_file.create_docx import iter_table_segments_time
+        from text_to_paragraphs.text_to_paragraphs import text_to_paragraphs
+        text_to_paragraphs.get_model()
+        base_rss = _peak_rss_mb()  # модель грузится одинаково для любой длительности
+        paragraphs = text_to_paragraphs("", iter_table_segments_time(jsonl_path)).get_text_to_paragraphs_table()
+        detail = f"{len(paragraphs)} абзацев"
+    else:
+        from transcription_audio.transcription import Transcription
+        from text_to_paragraphs.text_to_paragraphs import text_to_paragraphs
+        import create_file.create_docx as create_docx_module
+        text_to_paragraphs.get_model()
+        create_docx_module.get_sections_from_llm = lambda paragraphs: []   # без Ollama: один раздел
+        base_rss = _peak_rss_mb()
+        transcriber = Transcription.__new__(Transcription)  # без загрузки модели
+        transcriber.use_vad = False
+        transcriber.PART_DURATION_SECONDS = 5 * 60
+        transcriber._transcribe_file = _synthetic_transcribe
+        out_base = os.path.splitext(wav_path)[0] + "_transcript"
+        files = transcriber.transcribe_to_files(wav_path, jsonl_path=out_base + ".jsonl", store_path=out_base + ".tsb")
+        doc, _ = create_docx_module.create_docx(files["tsb"])._build()
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        docs = transcriber.as_documents(files["tsb"])
+        for path in files.values():
+            os.unlink(path)
+        detail = f"{len(docs)} сегментов, DOCX {buffer.tell() / 1e6:.1f} МБ"
+    queue.put((name, round(time.perf_counter() - t0, 1), round(_peak_rss_mb(), 1), round(_peak_rss_mb() - base_rss, 1), detail))
+
+
+def _wait_result(proc, queue, timeout: float):
+    """
+    Результат этапа или None, если процесс упал или не уложился в timeout.
+    Очередь читается до join: иначе упавший этап (ничего не положил в очередь)
+    или большой результат в буфере очереди подвесили бы профиль.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return queue.get(timeout=1.0)
+        except queue_module.Empty:
+            if proc.exitcode is not None:
+                return None
+    proc.terminate()
+    return None
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--minutes", type=int, nargs="+", default=[30, 240])
+    ap.add_argument("--stages", nargs="+", default=["split", "vad", "paragraphs", "transcribe_docx"])
+    ap.add_argument("--timeout", type=float, default=STAGE_TIMEOUT, help="Секунд на один этап")
+    args = ap.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print("минут | этап       | время, с | пик RSS, МБ | прирост, МБ | результат")
+    with tempfile.TemporaryDirectory() as tmp:
+        for minutes in args.minutes:
+            wav_path = os.path.join(tmp, f"synthetic_{minutes}.wav")
+            jsonl_path = os.path.join(tmp, f"synthetic_{minutes}.jsonl")
+            _make_wav(wav_path, minutes)
+            _make_jsonl(jsonl_path, minutes)
+            for stage in args.stages:
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_stage, args=(stage, wav_path, jsonl_path, queue))
+                proc.start()
+                result = _wait_result(proc, queue, args.timeout)
+                proc.join()
+                if result is None:
+                    print(f"{minutes:5d} | {stage:10s} | ошибка: процесс завершился с кодом {proc.exitcode}")
+                    continue
+                name, seconds, peak, delta, detail = result
+                print(f"{minutes:5d} | {name:10s} | {seconds:8.1f} | {peak:11.1f} | {delta:11.1f} | {detail}")
+            os.unlink(wav_path)
+            os.unlink(jsonl_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Чтение/запись транскрипта в формате JSON Lines: одна строка — один сегмент.
+Модуль без тяжёлых зависимостей, чтобы им могли пользоваться create_docx, чанкер и т.п.
+Читатели понимают три формата: .json (save_json), .jsonl (потоковый) и .tsb (TranscriptStore).
+"""
+import json
+import os
+import re
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from .transcript_store import TranscriptStore
+
+READ_CHUNK = 1 << 16     # символов за одно чтение при потоковом разборе .json
+_KEY_RE = re.compile(r'\s*[{,]\s*"(\w+)"\s*:\s*')
+_decoder = json.JSONDecoder()
+
+
+def append_segments_jsonl(f: TextIO, segments: Iterable[dict]) -> int:
+    """Дописывает сегменты в открытый файл и сбрасывает буфер, чтобы читатели видели их сразу."""
+    count = 0
+    for seg in segments:
+        f.write(json.dumps(seg, ensure_ascii=False) + "\n")
+        count += 1
+    f.flush()
+    return count
+
+
+class TranscriptJsonWriter:
+    """
+    Потоковая запись JSON в формате save_json: сегменты пишутся в файл по частям,
+    full_text — в конце объекта (из текстов частей, без слов и таймкодов).
+    """
+
+    def __init__(self, path: str, audio_file: str = "") -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._texts: List[str] = []
+        self._first = True
+        self._f = open(path, "w", encoding="utf-8")
+        self._f.write('{"audio_file": ' + json.dumps(audio_file, ensure_ascii=False) + ', "segments": [')
+
+    def add_text(self, text: str) -> None:
+        if text:
+            self._texts.append(text)
+
+    def add_segments(self, segments: Iterable[dict]) -> None:
+        for seg in segments:
+            self._f.write(("\n" if self._first else ",\n") + json.dumps(seg, ensure_ascii=False))
+            self._first = False
+
+    def close(self) -> str:
+        full_text = " ".join(self._texts).strip()
+        self._f.write('\n], "full_text": ' + json.dumps(full_text, ensure_ascii=False) + "}\n")
+        self._f.close()
+        return self.path
+
+    def __enter__(self) -> "TranscriptJsonWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._f.close()
+            os.remove(self.path)
+
+
+def iter_segments_jsonl(jsonl_path: str) -> Iterator[dict]:
+    """
+    Лениво читает сегменты из JSON Lines.
+    Недописанная последняя строка (файл ещё пишется) пропускается.
+    """
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _json_head(f: TextIO) -> Optional[Tuple[str, str, int]]:
+    """
+    Начало JSON save_json / TranscriptJsonWriter: {"audio_file": ..., "segments": [
+    Возвращает (audio_file, прочитанный буфер, позиция первого сегмента) или None,
+    если файл устроен иначе.
+    """
+    buf = f.read(READ_CHUNK)
+    m = _KEY_RE.match(buf)
+    if m is None or m.group(1) != "audio_file" or not buf.lstrip().startswith("{"):
+        return None
+    try:
+        audio_file, pos = _decoder.raw_decode(buf, m.end())
+    except ValueError:
+        return None     # путь длиннее буфера — не наш формат
+    m = _KEY_RE.match(buf, pos)
+    if m is None or m.group(1) != "segments" or not buf.startswith("[", m.end()):
+        return None
+    return audio_file, buf, m.end() + 1
+
+
+def _iter_json_segments(f: TextIO, buf: str, pos: int) -> Iterator[dict]:
+    """Элементы массива segments по одному — весь файл в память не читается."""
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos == len(buf):
+            more = f.read(READ_CHUNK)
+            if not more:
+                raise ValueError("JSON транскрипта оборван внутри segments")
+            buf, pos = more, 0
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            seg, end = _decoder.raw_decode(buf, pos)
+        except ValueError:
+            more = f.read(READ_CHUNK)
+            if not more:
+                raise
+            buf, pos = buf[pos:] + more, 0   # сегмент не поместился в буфер — дочитываем
+            continue
+        yield seg
+        pos = end
+
+
+def read_audio_file(transcript_path: str) -> str:
+    """
+    Путь к исходному аудио без чтения сегментов: .tsb — из заголовка хранилища,
+    .json — из начала файла, .jsonl — из соседнего .tsb/.json с тем же именем.
+    """
+    if transcript_path.endswith(TranscriptStore.EXT):
+        with TranscriptStore(transcript_path) as store:
+            return store.audio_file
+    if transcript_path.endswith(".jsonl"):
+        stem = os.path.splitext(transcript_path)[0]
+        for sidecar in (stem + TranscriptStore.EXT, stem + ".json"):
+            if os.path.isfile(sidecar):
+                return read_audio_file(sidecar)
+        return ""
+    with open(transcript_path, "r", encoding="utf-8") as f:
+        head = _json_head(f)
+    return head[0] if head else ""
+
+
+def iter_segments(transcript_path: str, with_words: bool = True) -> Iterator[dict]:
+    """
+    Сегменты транскрипта из .tsb (лениво, через mmap), .jsonl (потоково)
+    или из JSON, сохранённого Transcription.save_json (тоже потоково).
+    with_words=False позволяет .tsb не декодировать слова, если они не нужны.
+    """
+    if transcript_path.endswith(TranscriptStore.EXT):
+        with TranscriptStore(transcript_path) as store:
+            yield from store.iter_segments(with_words=with_words)
+        return
+    if transcript_path.endswith(".jsonl"):
+        yield from iter_segments_jsonl(transcript_path)
+        return
+    with open(transcript_path, "r", encoding="utf-8") as f:
+        head = _json_head(f)
+        if head is not None:
+            yield from _iter_json_segments(f, head[1], head[2])
+            return
+        f.seek(0)
+        data = json.load(f)     # JSON другого вида — целиком
+    yield from data.get("segments", [])
+
+
+def read_full_text(transcript_path: str) -> str:
+    """full_text транскрипта; для .jsonl собирается из текстов сегментов."""
+    if transcript_path.endswith(TranscriptStore.EXT):
+        with TranscriptStore(transcript_path) as store:
+            return store.full_text
+    if transcript_path.endswith(".jsonl"):
+        parts: List[str] = [seg.get("text", "").strip() for seg in iter_segments_jsonl(transcript_path)]
+        return " ".join(p for p in parts if p)
+    with open(transcript_path, "r", encoding="utf-8") as f:
+        return json.load(f).get("full_text", "")
@@ -0,0 +1,321 @@
+"""
+Компактное бинарное хранилище транскрипта (.tsb) с ленивым доступом через mmap.
+
+Вместо JSON, где каждое слово — отдельный словарь, данные лежат колонками:
+  • сегменты: id, start, end, смещения текста в общем UTF-8 блоке, диапазон слов;
+  • слова:    start, end, probability (NaN — нет оценки), смещения текста;
+  • один UTF-8 блок: audio_file | full_text | тексты сегментов | тексты слов.
+Чтение не парсит файл целиком: колонки — это memoryview поверх mmap, тексты
+декодируются только для запрошенных сегментов/слов, поиск по времени — бинарный.
+
+Запись — целиком (TranscriptStore.write) или потоково по частям (TranscriptStoreWriter).
+
+Пример:
+    TranscriptStore.write("lecture.tsb", transcription_result)
+    with TranscriptStore("lecture.tsb") as store:
+        for seg in store.segments_in_range(60.0, 120.0):
+            ...
+    python -m prep.transcription_audio.transcript_store lecture.json lecture.tsb   # JSON → .tsb
+    python -m prep.transcription_audio.transcript_store lecture.tsb lecture.json   # .tsb → JSON
+"""
+import bisect
+import json
+import math
+import mmap
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Iterator, List, Optional
+
+MAGIC = b"TRSB"
+VERSION = 1
+# magic, version, сегментов, слов, длина блока, длина audio_file, длина full_text
+_HEADER = struct.Struct("<4sIQQQQQ")
+
+
+def _layout(n_segments: int, n_words: int) -> List[tuple]:
+    """Порядок и типы колонок (все 8-байтовые, поэтому выровнены); за ними — текстовый блок."""
+    return [
+        ("seg_id", "q", n_segments),
+        ("seg_start", "d", n_segments),
+        ("seg_end", "d", n_segments),
+        ("seg_text_off", "Q", n_segments + 1),
+        ("seg_word_off", "Q", n_segments + 1),
+        ("word_start", "d", n_words),
+        ("word_end", "d", n_words),
+        ("word_text_off", "Q", n_words + 1),
+        ("word_prob", "d", n_words),
+    ]
+
+
+class TranscriptStoreWriter:
+    """
+    Потоковая запись .tsb: сегменты добавляются частями по мере транскрибации.
+    Колонки и тексты копятся во временных файлах, а не в памяти; close() собирает
+    итоговый файл, сдвигая смещения текстов на длину того, что лежит перед ними
+    в блоке (audio_file и full_text известны целиком только в конце).
+    """
+    CHUNK = 65536       # элементов колонки за одно чтение при сборке
+
+    def __init__(self, path: str, audio_file: str = "") -> None:
+        self.path = path
+        self.n_segments = 0
+        self.n_words = 0
+        self._audio = audio_file.encode("utf-8")
+        self._cols = {name: tempfile.TemporaryFile() for name, _, _ in _layout(0, 0)}
+        self._codes = {name: code for name, code, _ in _layout(0, 0)}
+        self._full_text = tempfile.TemporaryFile()
+        self._seg_texts = tempfile.TemporaryFile()
+        self._word_texts = tempfile.TemporaryFile()
+        self._full_len = self._seg_len = self._word_len = 0
+
+    def _append(self, name: str, values) -> None:
+        col = array(self._codes[name], values)
+        if sys.byteorder != "little":
+            col.byteswap()
+        col.tofile(self._cols[name])
+
+    def add_text(self, text: str, sep: str = " ") -> None:
+        """Дописывает кусок full_text; куски разделяются sep."""
+        data = text.encode("utf-8")
+        if not data:
+            return
+        if self._full_len:
+            data = sep.encode("utf-8") + data
+        self._full_text.write(data)
+        self._full_len += len(data)
+
+    def add_segments(self, segments) -> None:
+        cols = {name: [] for name in self._cols}
+        for seg in segments:
+            text = seg.get("text", "").encode("utf-8")
+            cols["seg_id"].append(int(seg.get("id", self.n_segments)))
+            cols["seg_start"].append(float(seg["start"]))
+            cols["seg_end"].append(float(seg["end"]))
+            cols["seg_text_off"].append(self._seg_len)     # от начала текстов сегментов
+            cols["seg_word_off"].append(self.n_words)
+            self._seg_texts.write(text)
+            self._seg_len += len(text)
+            for w in seg.get("words", []):
+                word = w.get("word", "").encode("utf-8")
+                cols["word_start"].append(float(w["start"]))
+                cols["word_end"].append(float(w["end"]))
+                prob = w.get("probability")
+                cols["word_prob"].append(math.nan if prob is None else float(prob))
+                cols["word_text_off"].append(self._word_len)  # от начала текстов слов
+                self._word_texts.write(word)
+                self._word_len += len(word)
+                self.n_words += 1
+            self.n_segments += 1
+        for name, values in cols.items():
+            if values:
+                self._append(name, values)
+
+    def _copy_rebased(self, name: str, out, base: int) -> None:
+        f = self._cols[name]
+        f.seek(0)
+        itemsize = array(self._codes[name]).itemsize
+        while True:
+            data = f.read(self.CHUNK * itemsize)
+            if not data:
+                break
+            col = array(self._codes[name])
+            col.frombytes(data)
+            if sys.byteorder != "little":
+                col.byteswap()
+            col = array(self._codes[name], (v + base for v in col))
+            if sys.byteorder != "little":
+                col.byteswap()
+            col.tofile(out)
+
+    def _discard(self) -> None:
+        for f in [*self._cols.values(), self._full_text, self._seg_texts, self._word_texts]:
+            f.close()
+
+    def close(self) -> str:
+        # Замыкающие смещения: конец последнего текста и число слов
+        self._append("seg_text_off", [self._seg_len])
+        self._append("seg_word_off", [self.n_words])
+        self._append("word_text_off", [self._word_len])
+        seg_base = len(self._audio) + self._full_len
+        word_base = seg_base + self._seg_len
+        rebase = {"seg_text_off": seg_base, "word_text_off": word_base}
+        try:
+            with open(self.path, "wb") as out:
+                out.write(_HEADER.pack(MAGIC, VERSION, self.n_segments, self.n_words,
+                                       word_base + self._word_len, len(self._audio), self._full_len))
+                for name, _, _ in _layout(0, 0):
+                    if name in rebase:
+                        self._copy_rebased(name, out, rebase[name])
+                    else:
+                        self._cols[name].seek(0)
+                        shutil.copyfileobj(self._cols[name], out)
+                out.write(self._audio)
+                for f in (self._full_text, self._seg_texts, self._word_texts):
+                    f.seek(0)
+                    shutil.copyfileobj(f, out)
+        finally:
+            self._discard()
+        return self.path
+
+    def __enter__(self) -> "TranscriptStoreWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()     # недописанный транскрипт не сохраняем
+
+
+class TranscriptStore:
+    EXT = ".tsb"
+
+    # -----------------------
+    # ЗАПИСЬ
+    # -----------------------
+    @staticmethod
+    def write(path: str, result: dict) -> str:
+        """Сохраняет результат Transcription.transcribe ({"full_text", "segments", "audio_file"})."""
+        with TranscriptStoreWriter(path, result.get("audio_file") or "") as writer:
+            writer.add_text(result.get("full_text") or "")
+            writer.add_segments(result.get("segments", []))
+        return path
+
+    @classmethod
+    def from_json(cls, json_path: str, out_path: Optional[str] = None) -> str:
+        with open(json_path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        return cls.write(out_path or json_path.rsplit(".", 1)[0] + cls.EXT, result)
+
+    # -----------------------
+    # ЧТЕНИЕ
+    # -----------------------
+    def __init__(self, path: str) -> None:
+        if sys.byteorder != "little":
+            raise RuntimeError("TranscriptStore читается только на little-endian платформах")
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_seg, n_words, blob_len, audio_len, text_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: не файл транскрипта {self.EXT} (или неподдерживаемая версия)")
+
+        self._view = view = memoryview(self._mm)
+        pos = _HEADER.size
+        for name, code, count in _layout(n_seg, n_words):
+            size = array(code).itemsize * count
+            setattr(self, "_" + name, view[pos:pos + size].cast(code))
+            pos += size
+        self._blob = view[pos:pos + blob_len]
+        self._audio_len = audio_len
+        self._text_len = text_len
+        self.n_segments = n_seg
+        self.n_words = n_words
+
+    def close(self) -> None:
+        for name, _, _ in _layout(0, 0):
+            getattr(self, "_" + name).release()
+        self._blob.release()
+        self._view.release()
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self) -> "TranscriptStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.n_segments
+
+    def _text(self, start: int, end: int) -> str:
+        return bytes(self._blob[start:end]).decode("utf-8")
+
+    @property
+    def audio_file(self) -> str:
+        return self._text(0, self._audio_len)
+
+    @property
+    def full_text(self) -> str:
+        return self._text(self._audio_len, self._audio_len + self._text_len)
+
+    def _word(self, w: int) -> dict:
+        word = {
+            "word": self._text(self._word_text_off[w], self._word_text_off[w + 1]),
+            "start": self._word_start[w],
+            "end": self._word_end[w],
+        }
+        prob = self._word_prob[w]
+        if not math.isnan(prob):
+            word["probability"] = prob
+        return word
+
+    def words(self, i: int) -> List[dict]:
+        """Слова сегмента i — декодируются только по запросу."""
+        return [self._word(w) for w in range(self._seg_word_off[i], self._seg_word_off[i + 1])]
+
+    def segment(self, i: int, with_words: bool = True) -> dict:
+        seg = {
+            "id": self._seg_id[i],
+            "start": self._seg_start[i],
+            "end": self._seg_end[i],
+            "text": self._text(self._seg_text_off[i], self._seg_text_off[i + 1]),
+        }
+        if with_words:
+            seg["words"] = self.words(i)
+        return seg
+
+    def iter_segments(self, with_words: bool = True) -> Iterator[dict]:
+        for i in range(self.n_segments):
+            yield self.segment(i, with_words)
+
+    def segments_in_range(self, t0: float, t1: float, with_words: bool = True) -> Iterator[dict]:
+        """Сегменты, пересекающие [t0, t1); начало ищется бинарным поиском по колонке start."""
+        i = max(0, bisect.bisect_right(self._seg_start, t0) - 1)
+        while i < self.n_segments and self._seg_start[i] < t1:
+            if self._seg_end[i] > t0:
+                yield self.segment(i, with_words)
+            i += 1
+
+    def words_in_range(self, t0: float, t1: float) -> Iterator[dict]:
+        """Слова, начинающиеся в [t0, t1) — без декодирования остальных сегментов."""
+        w = bisect.bisect_left(self._word_start, t0)
+        while w < self.n_words and self._word_start[w] < t1:
+            yield self._word(w)
+            w += 1
+
+    # -----------------------
+    # ЭКСПОРТ В JSON (совместимость)
+    # -----------------------
+    def to_dict(self) -> dict:
+        return {
+            "full_text": self.full_text,
+            "segments": list(self.iter_segments()),
+            "audio_file": self.audio_file,
+        }
+
+    def export_json(self, json_path: str) -> str:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return json_path
+
+
+def _cli() -> None:
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    src, dst = sys.argv[1], sys.argv[2]
+    if src.endswith(TranscriptStore.EXT):
+        with TranscriptStore(src) as store:
+            store.export_json(dst)
+    else:
+        TranscriptStore.from_json(src, dst)
+    print(f"Сохранено: {dst}")
+
+
+if __name__ == "__main__":
+    _cli()
@@ -1,14 +1,28 @@
 # pip install --upgrade "torch>=2.2" transformers accelerate
-import os, json, torch, datetime
+import os, torch, datetime
 import whisper  # openai‑whisper
-from typing import List, Tuple, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Optional
+from contextlib import ExitStack
 from langchain_core.documents import Document
 
 # --- НОВОЕ: импорт для разбиения аудио ---
 from pydub import AudioSegment
 from pydub.silence import detect_silence # <-- Правильный импорт
+from pydub.utils import make_chunks, mediainfo
 import tempfile
 import math
+import bisect
+import wave
+
+import re
+
+from .transcript_io import TranscriptJsonWriter, append_segments_jsonl, iter_segments, read_audio_file, read_full_text
+from .transcript_store import TranscriptStore, TranscriptStoreWriter
+
+# Регулярки для склейки слов HF в сегменты (_group_chunks)
+_MULTI_SPACE_RE = re.compile(r"\s{2,}")
+_SPACE_BEFORE_PUNCT_RE = re.compile(r"\s+([.,!?;:%)\]])")
+
 
 class Transcription:
     # --- НОВОЕ: константы для разбиения ---
@@ -19,10 +33,50 @@ class Transcription:
     PAUSE_MIN_DURATION_MS: int = 2000    # 2 секунды как минимальная пауза
     # --- /НОВОЕ ---
 
-    def __init__(self, model_name: str = "medium", language: str = "ru", prompt: str= ""):
+    # Префикс MODEL_WHISPER для бэкенда faster‑whisper (CTranslate2)
+    FASTER_PREFIX: str = "faster:"
+
+    # --- VAD: транскрибируем только участки с речью ---
+    VAD_FRAME_MS: int = 30               # кадр анализа (webrtcvad поддерживает 10/20/30 мс)
+    VAD_THRESHOLD_DB: float = -45.0      # кадры тише порога считаются тишиной
+    VAD_AGGRESSIVENESS: int = 2          # 0..3, если установлен webrtcvad
+    VAD_MIN_SPEECH_MS: int = 250         # более короткие всплески (клики мыши) отбрасываем
+    VAD_MIN_SILENCE_MS: int = 700        # более короткие паузы не разрывают речь
+    VAD_PAD_MS: int = 200                # запас вокруг каждого участка речи
+    VAD_GAP_MS: int = 300                # тишина между склеенными участками внутри части
+
+    # Аудио читается окнами такой длины — память не зависит от длительности записи
+    WINDOW_SECONDS: int = 5 * 60
+
+    # Последний результат: словарь transcribe() или путь файла, записанного transcribe_to_files()
+    _last_transcription_result: Optional[dict] = None
+    _last_transcript_path: Optional[str] = None
+
+    def __init__(
+        self,
+        model_name: str = "medium",
+        language: str = "ru",
+        prompt: str = "",
+        compute_type: str = "int8",
+        batch_size: int = 16,
+        cpu_threads: int = 0,
+        use_vad: bool = False,
+    ):
+        """
+        model_name определяет бэкенд:
+          • "faster:<модель>" – faster‑whisper / CTranslate2 (например "faster:large-v3");
+          • имя с "/"         – Hugging Face transformers (например "antony66/whisper-large-v3-russian");
+          • иначе             – openai‑whisper ("medium", "large-v3", ...).
+        compute_type, batch_size и cpu_threads используются только faster‑whisper.
+        use_vad=True включает предварительный проход VAD: в модель попадает только речь,
+        а таймкоды затем переводятся обратно на шкалу исходного файла.
+        """
         self.language = language
-        self._hf_backend = "/" in model_name  # признак Hugging Face модели
+        self._faster_backend = model_name.startswith(self.FASTER_PREFIX)
+        self._hf_backend = "/" in model_name and not self._faster_backend  # признак Hugging Face модели
         self.prompt = prompt
+        self.batch_size = batch_size
+        self.use_vad = use_vad
 
         if self._hf_backend:
             print("_hf_backend")
@@ -52,13 +106,27 @@ class Transcription:
                 chunk_length_s=30,
                 torch_dtype=dtype
             )
+        elif self._faster_backend:
+            print("faster‑whisper (CTranslate2)")
+            # --- CTranslate2: int8 на CPU, батчевый инференс по VAD-сегментам ---
+            from faster_whisper import WhisperModel, BatchedInferencePipeline
+
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            self.model = WhisperModel(
+                model_name[len(self.FASTER_PREFIX):],
+                device=device,
+                compute_type=compute_type,
+                cpu_threads=cpu_threads,
+            )
+            self.batched_model = BatchedInferencePipeline(model=self.model)
         else:
             print("openai‑whisper")
             # --- классический openai‑whisper ---
             self.model = whisper.load_model(model_name)
 
     # переиспользуем вашу функцию
-    def format_timestamp(self, seconds: float) -> str:
+    @staticmethod
+    def format_timestamp(seconds: float) -> str:
         ms = int((seconds - int(seconds)) * 1000)
         return f"{int(seconds // 3600):02d}:{int((seconds % 3600)//60):02d}:{int(seconds%60):02d}.{ms:03d}"
 
@@ -95,254 +163,442 @@ class Transcription:
         return best_split_point
     # --- /НОВОЕ ---
 
+    @staticmethod
+    def _probe_duration_ms(audio_path: str) -> int:
+        """Длительность без загрузки файла: заголовок WAV или ffprobe."""
+        try:
+            with wave.open(audio_path, "rb") as wf:
+                return int(wf.getnframes() * 1000 / wf.getframerate())
+        except (wave.Error, EOFError):
+            return int(float(mediainfo(audio_path)["duration"]) * 1000)
+
+    @staticmethod
+    def _read_window(audio_path: str, start_ms: int, end_ms: int) -> AudioSegment:
+        """Читает из файла только окно [start_ms, end_ms)."""
+        try:
+            with wave.open(audio_path, "rb") as wf:
+                rate = wf.getframerate()
+                start_frame = min(int(start_ms * rate / 1000), wf.getnframes())
+                wf.setpos(start_frame)
+                data = wf.readframes(max(0, int(end_ms * rate / 1000) - start_frame))
+                return AudioSegment(data=data, sample_width=wf.getsampwidth(), frame_rate=rate, channels=wf.getnchannels())
+        except (wave.Error, EOFError):
+            # Не PCM WAV — ffmpeg сам перемотает к нужному месту
+            return AudioSegment.from_file(audio_path, start_second=start_ms / 1000, duration=(end_ms - start_ms) / 1000)
+
+    def _find_split_point_in_file(self, audio_path: str, target_time_ms: int) -> int:
+        """_find_split_point по файлу: читается только окно LOOKBACK_SECONDS перед target_time_ms."""
+        window_start_ms = max(0, target_time_ms - self.LOOKBACK_SECONDS * 1000)
+        window = self._read_window(audio_path, window_start_ms, target_time_ms)
+        return window_start_ms + self._find_split_point(window, target_time_ms - window_start_ms)
+
     # --- НОВОЕ: метод для разбиения аудио ---
-    def _split_audio_file(self, audio_path: str) -> List[str]:
+    def _export_part(self, part_segment: AudioSegment, audio_path: str) -> str:
+        """Сохраняет часть аудио во временный файл того же формата."""
+        ext = os.path.splitext(audio_path)[1]
+        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as temp_file:
+            part_segment.export(temp_file.name, format=ext[1:]) # Убираем точку из формата
+            return temp_file.name
+
+    def _split_audio_file(self, audio_path: str) -> List[Tuple[str, list]]:
         """
         Разбивает аудиофайл на части, учитывая паузы.
-        Возвращает список временных файлов.
+        Файл читается окнами, целиком в память не загружается.
+        Возвращает список (временный файл, карта времени) — см. _remap_time.
         """
-        # from pydub import silence # <-- Было здесь, НЕПРАВИЛЬНО
-        # from pydub.silence import detect_silence # <-- Теперь импортировано в начале файла, ПРАВИЛЬНО
-        audio = AudioSegment.from_file(audio_path)
-
-        duration_ms = len(audio)
+        duration_ms = self._probe_duration_ms(audio_path)
         part_duration_ms = self.PART_DURATION_SECONDS * 1000
         split_points_ms = [i * part_duration_ms for i in range(1, math.ceil(duration_ms / part_duration_ms))]
 
         current_start_ms = 0
-        temp_files = []
+        parts = []
         for split_point_target_ms in split_points_ms:
             if current_start_ms >= duration_ms:
                 break
 
-            split_point_ms = self._find_split_point(audio, split_point_target_ms)
+            split_point_ms = self._find_split_point_in_file(audio_path, split_point_target_ms)
             # Убедимся, что точка разреза не меньше текущего начала
             split_point_ms = max(current_start_ms, split_point_ms)
 
-            part_segment = audio[current_start_ms:split_point_ms]
+            part_segment = self._read_window(audio_path, current_start_ms, split_point_ms)
+            parts.append((self._export_part(part_segment, audio_path), [(0.0, current_start_ms / 1000.0, math.inf)]))
             current_start_ms = split_point_ms
 
-            # Создаём временный файл для части
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(audio_path)[1]) as temp_file:
-                part_segment.export(temp_file.name, format=os.path.splitext(audio_path)[1][1:]) # Убираем точку из формата
-                temp_files.append(temp_file.name)
-
         # Добавляем остаток (последнюю часть), если она не пуста
         if current_start_ms < duration_ms:
-            last_part_segment = audio[current_start_ms:]
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(audio_path)[1]) as temp_file:
-                last_part_segment.export(temp_file.name, format=os.path.splitext(audio_path)[1][1:])
-                temp_files.append(temp_file.name)
+            last_part_segment = self._read_window(audio_path, current_start_ms, duration_ms)
+            parts.append((self._export_part(last_part_segment, audio_path), [(0.0, current_start_ms / 1000.0, math.inf)]))
 
-        return temp_files
+        return parts
     # --- /НОВОЕ ---
 
+    def _detect_speech_regions(self, audio_path: str) -> List[Tuple[int, int]]:
+        """
+        Находит участки речи: [(start_ms, end_ms), ...] на шкале исходного аудио.
+        Кадр считается речью, если он громче VAD_THRESHOLD_DB и (при наличии webrtcvad)
+        классифицирован как речь — это отсекает тишину, клики и часть фоновой музыки.
+        Файл читается окнами по WINDOW_SECONDS.
+        """
+        duration_ms = self._probe_duration_ms(audio_path)
+        window_ms = self.WINDOW_SECONDS * 1000 // self.VAD_FRAME_MS * self.VAD_FRAME_MS
+        try:
+            import webrtcvad
+            vad = webrtcvad.Vad(self.VAD_AGGRESSIVENESS)
+        except ImportError:
+            vad = None
+
+        frame_bytes = 16000 * 2 * self.VAD_FRAME_MS // 1000
+        regions: List[List[int]] = []
+        for window_start_ms in range(0, duration_ms, window_ms):
+            audio = self._read_window(audio_path, window_start_ms, window_start_ms + window_ms)
+            audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
+            for idx, frame in enumerate(make_chunks(audio, self.VAD_FRAME_MS)):
+                is_speech = frame.dBFS > self.VAD_THRESHOLD_DB
+                if is_speech and vad is not None and len(frame.raw_data) == frame_bytes:
+                    is_speech = vad.is_speech(frame.raw_data, 16000)
+                if not is_speech:
+                    continue
+                start_ms = window_start_ms + idx * self.VAD_FRAME_MS
+                end_ms = start_ms + len(frame)
+                # Короткие паузы внутри фразы не разрывают участок (в том числе на стыке окон)
+                if regions and start_ms - regions[-1][1] < self.VAD_MIN_SILENCE_MS:
+                    regions[-1][1] = end_ms
+                else:
+                    regions.append([start_ms, end_ms])
+
+        # Отбрасываем короткие всплески, добавляем запас и склеиваем пересечения
+        padded: List[Tuple[int, int]] = []
+        for start_ms, end_ms in regions:
+            if end_ms - start_ms < self.VAD_MIN_SPEECH_MS:
+                continue
+            start_ms = max(0, start_ms - self.VAD_PAD_MS)
+            end_ms = min(duration_ms, end_ms + self.VAD_PAD_MS)
+            if padded and start_ms <= padded[-1][1]:
+                padded[-1] = (padded[-1][0], end_ms)
+            else:
+                padded.append((start_ms, end_ms))
+        return padded
+
+    def _split_speech_regions(self, audio_path: str) -> List[Tuple[str, list]]:
+        """
+        Склеивает участки речи в части размером до PART_DURATION_SECONDS.
+        Между участками вставляется короткая тишина VAD_GAP_MS, чтобы модель не сливала слова.
+        Возвращает список (временный файл, карта времени) — см. _remap_time.
+        """
+        part_duration_ms = self.PART_DURATION_SECONDS * 1000
+
+        # Участки длиннее части режем по паузам, как и при обычном разбиении
+        pieces: List[Tuple[int, int]] = []
+        for start_ms, end_ms in self._detect_speech_regions(audio_path):
+            while end_ms - start_ms > part_duration_ms:
+                split_ms = self._find_split_point_in_file(audio_path, start_ms + part_duration_ms)
+                split_ms = split_ms if split_ms > start_ms else start_ms + part_duration_ms
+                pieces.append((start_ms, split_ms))
+                start_ms = split_ms
+            pieces.append((start_ms, end_ms))
+
+        duration_ms = self._probe_duration_ms(audio_path)
+        speech_ms = sum(end_ms - start_ms for start_ms, end_ms in pieces)
+        skipped = 1 - speech_ms / duration_ms if duration_ms else 0.0
+        print(f"[LOG] VAD: речь {speech_ms/1000:.2f} сек из {duration_ms/1000:.2f} сек, пропущено {skipped:.0%}.")
+
+        # Собираем части из сырых PCM-кадров: одна склейка на часть вместо повторных «+=»
+        parts = []
+        raw_chunks, time_map, part_ms, template = [], [], 0, None
+        for start_ms, end_ms in pieces:
+            if raw_chunks and part_ms + self.VAD_GAP_MS + (end_ms - start_ms) > part_duration_ms:
+                parts.append((self._export_part(template._spawn(b"".join(raw_chunks)), audio_path), time_map))
+                raw_chunks, time_map, part_ms = [], [], 0
+            piece = self._read_window(audio_path, start_ms, end_ms)
+            template = piece
+            if raw_chunks:
+                raw_chunks.append(b"\0" * (piece.frame_width * int(piece.frame_rate * self.VAD_GAP_MS / 1000)))
+                part_ms += self.VAD_GAP_MS
+            time_map.append((part_ms / 1000.0, start_ms / 1000.0, (end_ms - start_ms) / 1000.0))
+            raw_chunks.append(piece.raw_data)
+            part_ms += end_ms - start_ms
+        if raw_chunks:
+            parts.append((self._export_part(template._spawn(b"".join(raw_chunks)), audio_path), time_map))
+        return parts
+
+    @staticmethod
+    def _remap_time(t: float, time_map: list) -> float:
+        """
+        Переводит время внутри части на шкалу исходного файла.
+        time_map — отсортированный список (начало_в_части, начало_в_оригинале, длительность);
+        время, попавшее во вставленную тишину, прижимается к концу предыдущего участка.
+        """
+        idx = max(bisect.bisect_right(time_map, (t, math.inf, math.inf)) - 1, 0)
+        part_start, orig_start, length = time_map[idx]
+        return orig_start + min(max(0.0, t - part_start), length)
+
+    @classmethod
+    def _time_remapper(cls, time_map: list) -> Callable[[float], float]:
+        """
+        Функция пересчёта времени для части, с тем же результатом, что и _remap_time.
+        Для обычной части (один участок без ограничения длины) — простой сдвиг;
+        для VAD-частей запоминается последний участок: таймкоды идут почти по
+        порядку, и бинарный поиск нужен только при переходе на другой участок.
+        """
+        if len(time_map) == 1 and time_map[0][0] == 0.0 and time_map[0][2] == math.inf:
+            offset = time_map[0][1]
+            return lambda t: offset + (t if t > 0.0 else 0.0)
+
+        starts = [entry[0] for entry in time_map]
+        last = len(starts) - 1
+        cursor = [0]
+
+        def remap(t: float) -> float:
+            idx = cursor[0]
+            if not (starts[idx] <= t and (idx == last or t < starts[idx + 1])):
+                idx = cursor[0] = max(bisect.bisect_right(starts, t) - 1, 0)
+            part_start, orig_start, length = time_map[idx]
+            return orig_start + min(max(0.0, t - part_start), length)
+
+        return remap
+
     # --- НОВОЕ: метод для объединения результатов разбиения ---
-    def _merge_transcription_results(self, parts_results: List[dict], original_audio_path: str) -> dict:
+    def _merge_transcription_results(self, parts_results: List[dict], original_audio_path: str, first_segment_id: int = 0) -> dict:
         """
         Объединяет результаты транскрибации частей в один словарь.
+        Таймкоды каждой части переводятся на шкалу исходного файла по её time_map,
+        id сегментов перенумеровываются сквозным образом начиная с first_segment_id.
+        Сегменты и слова принадлежат только этому вызову, поэтому сдвигаются на месте —
+        без копирования словарей (на длинных записях это миллионы объектов).
         """
-        full_text = ""
+        texts = []
         all_segments = []
-        current_offset = 0.0
+        next_id = first_segment_id
 
-        for idx, part_result in enumerate(parts_results):
-            part_text = part_result.get("text", "")
+        for part_result in parts_results:
+            texts.append(part_result.get("text", ""))
             part_segments = part_result.get("segments", [])
+            remap = self._time_remapper(part_result.get("time_map", [(0.0, 0.0, math.inf)]))
 
-            # Обновляем таймстампы с учётом смещения
-            updated_segments = []
+            # Обновляем таймстампы с учётом положения части в исходном файле
             for seg in part_segments:
-                updated_seg = seg.copy()
-                updated_seg["start"] += current_offset
-                updated_seg["end"] += current_offset
-                if "words" in updated_seg:
-                    for word in updated_seg["words"]:
-                        word["start"] += current_offset
-                        word["end"] += current_offset
-                updated_segments.append(updated_seg)
-
-            all_segments.extend(updated_segments)
-            full_text += part_text
-            if idx < len(parts_results) - 1: # Не добавляем пробел после последней части
-                full_text += " "
-
-            # Смещение для следующей части - это конец текущей обработанной части
-            if part_segments:
-                current_offset = updated_segments[-1]["end"]
+                seg["id"] = next_id
+                next_id += 1
+                seg["start"] = remap(seg["start"])
+                seg["end"] = remap(seg["end"])
+                for word in seg.get("words", ()):
+                    word["start"] = remap(word["start"])
+                    word["end"] = remap(word["end"])
+
+            all_segments.extend(part_segments)
 
         return {
-            "full_text": full_text.strip(),
+            "full_text": " ".join(texts).strip(),  # части разделяются одним пробелом
             "segments": all_segments,
             "audio_file": original_audio_path,
         }
     # --- /НОВОЕ ---
+    def _transcribe_file(self, audio_path: str) -> dict:
+        """
+        Транскрибирует один файл выбранным бэкендом.
+        Возвращает {"text": str, "segments": [...]} в формате openai‑whisper.
+        """
+        if self._hf_backend:
+            out = self.pipe(
+                audio_path,
+                generate_kwargs={
+                    "language": self.language,
+                    "task": "transcribe"
+                }
+            )
+            chunks = out.get("chunks", [])
+            segments = self._group_chunks(chunks, max_gap=0.6)   # ← группируем
+            full_text = out.get("text", "").strip()
+        elif self._faster_backend:
+            segments_iter, _info = self.batched_model.transcribe(
+                audio_path,
+                language=self.language,
+                batch_size=self.batch_size,
+                word_timestamps=True,
+                vad_filter=True,
+                initial_prompt=self.prompt or None,
+            )
+            segments = self._faster_segments_to_dicts(segments_iter)
+            full_text = "".join(seg["text"] for seg in segments).strip()
+        else:
+            result = self.model.transcribe(
+                audio_path,
+                language=self.language,
+                word_timestamps=True,
+                prompt=self.prompt
+            )
+            segments = result.get("segments", [])
+            full_text = result.get("text", "").strip()
 
+        return {
+            "text": full_text,
+            "segments": segments,
+        }
+
+    @staticmethod
+    def _faster_segments_to_dicts(segments_iter) -> List[dict]:
+        """Приводит сегменты faster‑whisper к словарям openai‑whisper (id/start/end/text/words)."""
+        segments = []
+        for seg in segments_iter:
+            segments.append({
+                "id": len(segments),
+                "seek": getattr(seg, "seek", 0),
+                "start": float(seg.start),
+                "end": float(seg.end),
+                "text": seg.text,
+                "tokens": list(seg.tokens or []),
+                "temperature": seg.temperature,
+                "avg_logprob": seg.avg_logprob,
+                "compression_ratio": seg.compression_ratio,
+                "no_speech_prob": seg.no_speech_prob,
+                "words": [
+                    {
+                        "word": w.word,
+                        "start": float(w.start),
+                        "end": float(w.end),
+                        "probability": float(w.probability),
+                    } for w in (seg.words or [])
+                ],
+            })
+        return segments
 
-    def transcribe(self, audio_path: str) -> dict:
+    def _plan_parts(self, audio_path: str) -> List[Tuple[str, list]]:
+        """Решает, как резать файл: VAD, разбиение по паузам или целиком. Возвращает (файл, карта времени)."""
         # --- НОВОЕ: проверка размера файла и разбиение ---
         audio_file_size_mb = os.path.getsize(audio_path) / (1024 * 1024)
-        # Грубая оценка, можно уточнить через длительность
-        audio = AudioSegment.from_file(audio_path)
-        duration_seconds = len(audio) / 1000.0
+        # Длительность берём из заголовка, сам файл читается окнами
+        duration_seconds = self._probe_duration_ms(audio_path) / 1000.0
         print(f"[LOG] Размер аудио: {audio_file_size_mb:.2f} MB, Длительность: {duration_seconds:.2f} сек ({duration_seconds/60:.2f} мин)")
 
-        if duration_seconds > self.PART_DURATION_SECONDS:
+        if self.use_vad:
+            print("[LOG] VAD: ищу участки речи...")
+            parts = self._split_speech_regions(audio_path)
+            print(f"[LOG] Речь склеена в {len(parts)} частей.")
+        elif duration_seconds > self.PART_DURATION_SECONDS:
             print(f"[LOG] Длительность ({duration_seconds/60:.2f} мин) превышает лимит ({self.PART_DURATION_SECONDS/60:.2f} мин). Разбиваю файл...")
-            part_files = self._split_audio_file(audio_path)
-            print(f"[LOG] Аудио разбито на {len(part_files)} частей.")
-            parts_results = []
-
-            for i, part_file in enumerate(part_files):
-                print(f"[LOG] Транскрибирую часть {i+1}/{len(part_files)}: {part_file}")
-                # Используем внутренний метод для транскрибации одной части
-                if self._hf_backend:
-                    try:
-                        print(f"[LOG] Начал транскрибацию части {i+1}")
-                        out = self.pipe(
-                            part_file,
-                            generate_kwargs={
-                                "language": self.language,
-                                "task": "transcribe"
-                            }
-                        )
-                        print(f"[LOG] Успешно завершил pipe части {i+1}")
-                    except Exception as e:
-                        print(f"[ERROR] Ошибка в self.pipe части {i+1}: {type(e).__name__}: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        raise
-                    chunks = out.get("chunks", [])
-                    segments = self._group_chunks(chunks, max_gap=0.6)
-                    full_text = out.get("text", "").strip()
-                    part_result = {
-                        "text": full_text,
-                        "segments": segments,
-                    }
-                else:
-                    try:
-                        print(f"[LOG] Начал транскрибацию части {i+1}")
-                        result = self.model.transcribe(
-                            part_file,
-                            language="ru",
-                            word_timestamps=True,
-                            prompt=self.prompt
-                        )
-                    except Exception as e:
-                        print(f"[ERROR] Ошибка в транскрибации части {i+1}: {type(e).__name__}: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        raise
-                    print(f"[LOG] Успешно завершил транскрибацию части {i+1}")
-                    segments = result.get("segments", [])
-                    full_text = result.get("text", "").strip()
-                    part_result = {
-                        "text": full_text,
-                        "segments": segments,
-                    }
-                
-                parts_results.append(part_result)
+            parts = self._split_audio_file(audio_path)
+            print(f"[LOG] Аудио разбито на {len(parts)} частей.")
+        else:
+            print(f"[LOG] Длительность ({duration_seconds/60:.2f} мин) в пределах лимита ({self.PART_DURATION_SECONDS/60:.2f} мин). Обрабатываю файл целиком.")
+            parts = [(audio_path, [(0.0, 0.0, math.inf)])]
+        # --- /НОВОЕ ---
+        return parts
+
+    def iter_transcribe(self, audio_path: str) -> Iterator[dict]:
+        """
+        Генератор: транскрибирует части по очереди и сразу отдаёт каждую.
+        Каждый элемент — {"part", "parts_total", "text", "segments", "audio_file"},
+        где segments уже на шкале исходного файла и со сквозной нумерацией id.
+        """
+        parts = self._plan_parts(audio_path)
+        next_segment_id = 0
+        print(f"[LOG] Начал транскрибацию {datetime.datetime.now().isoformat()}")
+        try:
+            for i, (part_file, time_map) in enumerate(parts):
+                print(f"[LOG] Транскрибирую часть {i+1}/{len(parts)}: {part_file}")
+                try:
+                    part_result = self._transcribe_file(part_file)
+                except Exception as e:
+                    print(f"[ERROR] Ошибка в транскрибации части {i+1}: {type(e).__name__}: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    raise
+                print(f"[LOG] Успешно завершил транскрибацию части {i+1}")
+                part_result["time_map"] = time_map
 
                 # Удаляем временный файл после обработки
-                os.unlink(part_file)
-                print(f"[LOG] Удалён временный файл части {i+1}: {part_file}")
+                if part_file != audio_path:
+                    os.unlink(part_file)
+                    print(f"[LOG] Удалён временный файл части {i+1}: {part_file}")
 
                 # Освобождаем кэш GPU после каждой части
                 if torch.cuda.is_available():
                     torch.cuda.empty_cache()
 
-            # Объединяем результаты всех частей
-            final_result = self._merge_transcription_results(parts_results, audio_path)
-            self._last_transcription_result = final_result
-            return final_result
-        else:
-            print(f"[LOG] Длительность ({duration_seconds/60:.2f} мин) в пределах лимита ({self.PART_DURATION_SECONDS/60:.2f} мин). Обрабатываю файл целиком.")
-        # --- /НОВОЕ ---
-
-        if self._hf_backend:
-            try:
-                print(f"[LOG] Начал транскрибацию {datetime.datetime.now().isoformat()}")
-                out = self.pipe(
-                    audio_path,
-                    generate_kwargs={
-                        "language": self.language,
-                        "task": "transcribe"
-                    }
-                )
-                print(f"[LOG] Успешно завершил pipe, начало обработки чанков")
-            except Exception as e:
-                print(f"[ERROR] Ошибка в self.pipe: {type(e).__name__}: {e}")
-                import traceback
-                traceback.print_exc()
-                raise
-            chunks = out.get("chunks", [])
-            segments = self._group_chunks(chunks, max_gap=0.6)   # ← группируем
-            full_text = out.get("text", "").strip()
-        else:
-            try:
-                print(f"[LOG] Начал транскрибацию {datetime.datetime.now().isoformat()}")
-                result = self.model.transcribe(
-                    audio_path,
-                    language="ru",
-                    word_timestamps=True,
-                    prompt=self.prompt
-                )
-            except Exception as e:
-                print(f"[ERROR] Ошибка в self.pipe: {type(e).__name__}: {e}")
-                import traceback
-                traceback.print_exc()
-                raise
-            print(f"[LOG] Успешно завершил pipe, начало обработки чанков")
-            segments = result.get("segments", [])
-            full_text = result.get("text", "").strip()
+                merged = self._merge_transcription_results([part_result], audio_path, first_segment_id=next_segment_id)
+                next_segment_id += len(merged["segments"])
+                yield {
+                    "part": i + 1,
+                    "parts_total": len(parts),
+                    "text": merged["full_text"],
+                    "segments": merged["segments"],
+                    "audio_file": audio_path,
+                }
+        finally:
+            # Если генератор закрыли раньше времени — не оставляем временные части
+            for part_file, _ in parts:
+                if part_file != audio_path and os.path.exists(part_file):
+                    os.unlink(part_file)
+
+    def transcribe(self, audio_path: str, on_part: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        Полная транскрибация. on_part (если задан) вызывается после каждой части
+        с элементом iter_transcribe — для прогресса и потоковой обработки.
+        """
+        texts, segments = [], []
+        for part in self.iter_transcribe(audio_path):
+            texts.append(part["text"])
+            segments.extend(part["segments"])
+            if on_part:
+                on_part(part)
 
         self._last_transcription_result = {
-            "full_text": full_text,
+            "full_text": " ".join(texts).strip(),
             "segments": segments,
             "audio_file": audio_path,
         }
-
-        # Освобождаем кэш GPU после транскрипции
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-
+        self._last_transcript_path = None
         return self._last_transcription_result
 
+    def transcribe_to_files(
+        self,
+        audio_path: str,
+        json_path: Optional[str] = None,
+        jsonl_path: Optional[str] = None,
+        store_path: Optional[str] = None,
+        on_part: Optional[Callable[[dict], None]] = None,
+    ) -> Dict[str, str]:
+        """
+        Транскрибирует и пишет каждую часть сразу в заданные файлы: .jsonl (читатели
+        видят сегменты до конца транскрибации), .tsb и/или .json. Сегменты и слова
+        в памяти не копятся — пик памяти не растёт с длительностью записи.
+        Возвращает {"jsonl"|"tsb"|"json": путь} для записанных файлов.
+        """
+        paths = {"jsonl": jsonl_path, "tsb": store_path, "json": json_path}
+        with ExitStack() as stack:
+            jsonl_file = None
+            if jsonl_path:
+                os.makedirs(os.path.dirname(jsonl_path) or ".", exist_ok=True)
+                jsonl_file = stack.enter_context(open(jsonl_path, "w", encoding="utf-8"))
+            writers = []
+            if store_path:
+                os.makedirs(os.path.dirname(store_path) or ".", exist_ok=True)
+                writers.append(stack.enter_context(TranscriptStoreWriter(store_path, audio_path)))
+            if json_path:
+                writers.append(stack.enter_context(TranscriptJsonWriter(json_path, audio_path)))
+
+            for part in self.iter_transcribe(audio_path):
+                if jsonl_file:
+                    append_segments_jsonl(jsonl_file, part["segments"])
+                for writer in writers:
+                    writer.add_text(part["text"])
+                    writer.add_segments(part["segments"])
+                if on_part:
+                    on_part(part)
+
+        self._last_transcription_result = None
+        self._last_transcript_path = store_path or jsonl_path or json_path
+        return {kind: path for kind, path in paths.items() if path}
+
 
     def _group_chunks(self, chunks, max_gap=0.6, max_words=20):
         """Объединяем word‑chunks обратно во фразы.
         • max_gap   – пауза (с) между словами, после которой начинаем новый сегмент
         • max_words – «страховка» от слишком длинных сегментов
+        Один проход: слова сегмента копятся сразу в итоговом виде, регулярки скомпилированы заранее.
         """
-        import re
-
-        def _flush(seg_words, seg_start, seg_end, segments):
-            if not seg_words:
-                return
-            # --- 1. safely strip leading spaces ---
-            clean_tokens = [w["text"].lstrip() for w in seg_words]       ### NEW
-            text = " ".join(clean_tokens)                                ### NEW
-
-            # --- 2. collapse multi‑spaces + fix punctuation ---
-            text = re.sub(r"\s{2,}", " ", text)          # двойные → одиночные
-            text = re.sub(r"\s+([.,!?;:%)\]])", r"\1", text)  # пробел перед знаками
-
-            segments.append({
-                "id": len(segments),
-                "start": seg_start,
-                "end":   seg_end,
-                "text":  text.strip(),
-                "words": [
-                    {
-                        "word":  w["text"].strip(),
-                        "start": w["timestamp"][0],
-                        "end":   w["timestamp"][1] or w["timestamp"][0],
-                    } for w in seg_words
-                ],
-            })
-
-
-        segments, seg_words = [], []
+        segments = []
+        tokens, words = [], []
         seg_start = prev_end = None
 
         for ch in chunks:
@@ -350,46 +606,100 @@ class Transcription:
             if st is None:                 # пропускаем «битый» чанκ
                 continue
 
-            # первый / новый сегмент
+            # первый / новый сегмент
             if seg_start is None:
                 seg_start = st
                 prev_end  = ed or st
 
             gap = 0 if prev_end is None else st - prev_end
-            if (gap > max_gap and seg_words) or len(seg_words) >= max_words:
-                _flush(seg_words, seg_start, prev_end, segments)
-                seg_words, seg_start = [], st
-
-            seg_words.append(ch)
+            if (gap > max_gap and words) or len(words) >= max_words:
+                if words:
+                    segments.append(self._make_segment(len(segments), seg_start, prev_end, tokens, words))
+                tokens, words, seg_start = [], [], st
+
+            text = ch["text"]
+            tokens.append(text.lstrip())
+            words.append({
+                "word":  text.strip(),
+                "start": st,
+                "end":   ed or st,
+            })
             prev_end = ed or st      # если ed == None, берём st
 
-        _flush(seg_words, seg_start, prev_end, segments)
+        if words:
+            segments.append(self._make_segment(len(segments), seg_start, prev_end, tokens, words))
         return segments
 
+    @staticmethod
+    def _make_segment(seg_id: int, seg_start: float, seg_end: float, tokens: List[str], words: List[dict]) -> dict:
+        # --- 1. safely strip leading spaces (tokens уже без ведущих пробелов) ---
+        text = " ".join(tokens)
+
+        # --- 2. collapse multi‑spaces + fix punctuation ---
+        text = _MULTI_SPACE_RE.sub(" ", text)              # двойные → одиночные
+        text = _SPACE_BEFORE_PUNCT_RE.sub(r"\1", text)     # пробел перед знаками
+
+        return {
+            "id": seg_id,
+            "start": seg_start,
+            "end":   seg_end,
+            "text":  text.strip(),
+            "words": words,
+        }
 
     # Сохранение результата транскрипции в формате JSON
-    def save_json(self, audio_path: str, out_json_path: Optional[str] = None) -> str:
-        result = self.transcribe(audio_path)
-        if not result:
-            return None
-        if out_json_path:
-            os.makedirs(os.path.dirname(out_json_path) or ".", exist_ok=True)
-            json_path = out_json_path
-        else:
-            json_path = os.path.splitext(audio_path)[0] + ".json"
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+    def save_json(
+        self,
+        audio_path: str,
+        out_json_path: Optional[str] = None,
+        jsonl_path: Optional[str] = None,
+        on_part: Optional[Callable[[dict], None]] = None,
+    ) -> str:
+        """
+        Транскрибирует и сохраняет JSON. Если задан jsonl_path, сегменты каждой части
+        дописываются туда сразу по готовности (JSON Lines), чтобы следующие этапы
+        могли начать читать файл до окончания транскрибации. JSON тоже пишется
+        по частям (transcribe_to_files).
+        """
+        json_path = out_json_path or os.path.splitext(audio_path)[0] + ".json"
+        self.transcribe_to_files(audio_path, json_path=json_path, jsonl_path=jsonl_path, on_part=on_part)
         return json_path
-    
-    # Получение результата транскрипции в виде словаря для llm
-    def as_documents(self) -> List[Document]:
-        if not self._last_transcription_result:
-            raise ValueError("Нет результатов: сначала вызовите transcribe()")
 
+    def save_store(self, out_path: Optional[str] = None) -> str:
+        """
+        Сохраняет последний результат в компактном бинарном формате TranscriptStore (.tsb).
+        Его понимают те же читатели, что и JSON: table_segments_time, create_docx, as_documents.
+        После transcribe_to_files .tsb собирается потоково из записанного файла.
+        """
+        if self._last_transcription_result:
+            if out_path is None:
+                out_path = os.path.splitext(self._last_transcription_result["audio_file"])[0] + TranscriptStore.EXT
+            os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+            return TranscriptStore.write(out_path, self._last_transcription_result)
+
+        source = self._last_transcript_path
+        if not source:
+            raise ValueError("Нет результатов: сначала вызовите transcribe()")
+        if out_path is None:
+            out_path = os.path.splitext(source)[0] + TranscriptStore.EXT
+        if os.path.abspath(out_path) == os.path.abspath(source):
+            return out_path
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        audio_file = ""
+        if source.endswith(TranscriptStore.EXT):
+            with TranscriptStore(source) as store:
+                audio_file = store.audio_file
+        with TranscriptStoreWriter(out_path, audio_file) as writer:
+            writer.add_text(read_full_text(source))
+            writer.add_segments(iter_segments(source))
+        return out_path
+
+    @classmethod
+    def segments_to_documents(cls, segments: Iterable[dict], audio_path: str) -> List[Document]:
+        """Превращает сегменты в Document для чанкера/RAG (подходит и для частей из iter_transcribe)."""
         docs: List[Document] = []
-        audio_path = self._last_transcription_result.get("audio_file", "")
         audio_title = os.path.basename(audio_path) if audio_path else ""
-        for seg in self._last_transcription_result["segments"]:
+        for seg in segments:
             start = float(seg["start"])
             stop = float(seg["end"])
             docs.append(
@@ -400,11 +710,31 @@ class Transcription:
                         "start": start,
                         "end": stop,
                         "segment_index": seg["id"],
-                        "timestamp_range": f"{self.format_timestamp(start)} - {self.format_timestamp(stop)}"
+                        "timestamp_range": f"{cls.format_timestamp(start)} - {cls.format_timestamp(stop)}"
                     }
                 )
             )
         return docs
+
+    # Получение результата транскрипции в виде словаря для llm
+    def as_documents(self, transcript_path: Optional[str] = None) -> List[Document]:
+        """
+        Document по последнему результату или, если задан transcript_path,
+        по сохранённому транскрипту (.json / .jsonl / .tsb) без повторной транскрибации.
+        """
+        if transcript_path:
+            audio_file = read_audio_file(transcript_path)
+            return self.segments_to_documents(iter_segments(transcript_path, with_words=False), audio_file or transcript_path)
+
+        if not self._last_transcription_result:
+            if self._last_transcript_path:
+                return self.as_documents(self._last_transcript_path)
+            raise ValueError("Нет результатов: сначала вызовите transcribe()")
+
+        return self.segments_to_documents(
+            self._last_transcription_result["segments"],
+            self._last_transcription_result.get("audio_file", ""),
+        )
     
     def transcribe_to_documents(self, audio_file: str, out_json_path: str | None = None) -> Tuple[str, List[Document]]:
         json_path = self.save_json(audio_file, out_json_path)
@@ -417,6 +747,9 @@ class Transcription:
             del self.pipe
             del self.model
             del self.processor
+        elif self._faster_backend:
+            del self.batched_model
+            del self.model
         else:
             del self.model
 
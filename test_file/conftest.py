@@ -4,6 +4,9 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parents[1]  # /.../pro_club_season_2
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+# Модули prep импортируют соседние пакеты от prep (rag_llm.*, rag_db.*), как при запуске из prep
+if str(ROOT / "prep") not in sys.path:
+    sys.path.append(str(ROOT / "prep"))
 
 @pytest.fixture(scope="session")
 def sample_audio_path():
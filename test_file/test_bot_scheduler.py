@@ -0,0 +1,76 @@
+import asyncio
+import threading
+
+import pytest
+
+from prep.bot_scheduler import FairScheduler, QueueFull, RateLimited, TokenBucket, WorkClass
+
+
+def _classes(**overrides):
+    classes = {
+        "question": WorkClass(weight=4, concurrency=1, default_cost=10),
+        "video": WorkClass(weight=1, concurrency=1, default_cost=600),
+    }
+    classes.update(overrides)
+    return classes
+
+
+def test_token_bucket_refills():
+    now = [0.0]
+    bucket = TokenBucket(rate=1.0, burst=2, clock=lambda: now[0])
+    assert bucket.try_take()[0] and bucket.try_take()[0]
+    ok, retry = bucket.try_take()
+    assert not ok and retry == pytest.approx(1.0)
+    now[0] = 1.5
+    assert bucket.try_take()[0]
+
+
+def test_short_videos_first_and_questions_not_starved():
+    order = []
+    gate = threading.Event()
+
+    def work(name):
+        if name == "gate":
+            gate.wait(5)
+        order.append(name)
+
+    async def scenario():
+        sched = FairScheduler(_classes(), workers=1, max_pending_per_user=10)
+        jobs = [sched.submit(0, "question", work, "gate")]
+        jobs.append(sched.submit(1, "video", work, "long", cost=300))
+        jobs.append(sched.submit(2, "video", work, "short", cost=30))
+        jobs += [sched.submit(3 + i, "question", work, f"q{i}") for i in range(3)]
+        assert sched.position(jobs[2]) == 1 and sched.position(jobs[1]) == 2
+        gate.set()
+        await asyncio.gather(*(j.future for j in jobs))
+        return sched
+
+    sched = asyncio.run(scenario())
+    assert order == ["gate", "short", "q0", "q1", "q2", "long"]
+    assert sched.stats["completed"] == 6 and not sched.jobs()[0]
+
+
+def test_user_limits():
+    async def scenario():
+        sched = FairScheduler(
+            _classes(question=WorkClass(weight=4, concurrency=1, default_cost=10, rate_per_second=0.01, burst=2)),
+            workers=1, max_pending_per_user=3,
+        )
+        gate = threading.Event()
+        jobs = [sched.submit(1, "question", gate.wait, 5), sched.submit(1, "question", lambda: None)]
+        jobs.append(sched.submit(1, "video", lambda: None))
+        with pytest.raises(QueueFull):
+            sched.submit(1, "video", lambda: None)
+        # продолжение принятой задачи лимиты не проверяет
+        jobs.append(sched.submit(1, "video", lambda: "ok", limited=False))
+
+        jobs += [sched.submit(2, "question", lambda: None) for _ in range(2)]
+        with pytest.raises(RateLimited):
+            sched.submit(2, "question", lambda: None)
+        gate.set()
+        await asyncio.gather(*(j.future for j in jobs))
+        return sched, jobs[3]
+
+    sched, continued = asyncio.run(scenario())
+    assert continued.future.result() == "ok"
+    assert sched.stats["queue_full"] == 1 and sched.stats["rate_limited"] == 1
@@ -0,0 +1,31 @@
+from langchain_core.documents import Document
+
+from prep.rag_db.chunk_file import ChunkFileReader, ChunkFileWriter, write_chunks
+
+
+def _chunks(n):
+    return [
+        Document(page_content=f"Чанк {i}\nвторая строка", metadata={"audio_title": "a.wav", "start": i * 1.5, "segment_indices": f"[{i}]"})
+        for i in range(n)
+    ]
+
+
+def test_roundtrip_and_batches(tmp_path):
+    path = str(tmp_path / "out" / "chunks.jsonl")
+    assert write_chunks(path, _chunks(10)) == 10
+
+    reader = ChunkFileReader(path)
+    assert len(reader) == 10
+    assert [len(b) for b in reader.iter_batches(4)] == [4, 4, 2]
+    assert [(d.page_content, d.metadata) for d in reader] == [(d.page_content, d.metadata) for d in _chunks(10)]
+    assert reader.get(7).metadata["start"] == 7 * 1.5
+
+
+def test_reader_sees_flushed_part_while_writing(tmp_path):
+    path = str(tmp_path / "chunks.jsonl")
+    with ChunkFileWriter(path) as writer:
+        writer.write_many(_chunks(3))
+        writer.flush()
+        assert len(ChunkFileReader(path)) == 3
+        writer.write_many(_chunks(2))
+    assert len(ChunkFileReader(path)) == 5
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from prep.rag_llm.context_packer import ContextPacker
+
+
+def _chunk(ids, start, end, audio="запись.wav"):
+    return {
+        "text": "passage: " + "\n".join(f"с{i}" for i in ids),
+        "meta": {"audio_title": audio, "start": start, "end": end, "segment_indices": json.dumps(ids)},
+    }
+
+
+def test_overlaps_merge_gaps_split_and_plain_chunks_kept():
+    chunks = [
+        _chunk([4, 5], 40.0, 60.0),                 # самый релевантный
+        _chunk([3, 4], 10.0, 45.0),                 # перекрывается с первым по сегменту 4
+        {"text": "passage: старый чанк\nбез разметки", "meta": {"audio_title": "старое.wav", "start": 5.0, "end": 9.0}},
+        _chunk([8, 9], 3700.0, 3720.0),             # разрыв после 5 — отдельный отрезок
+    ]
+    packer = ContextPacker(token_counter=lambda texts: [len(t.split()) for t in texts])
+
+    spans = packer.spans(chunks)
+    assert [s.text for s in spans] == ["с3 с4 с5", "старый чанк без разметки", "с8 с9"]
+
+    packed = packer.pack(chunks, max_tokens=100)
+    assert packed.text == "[1] с3 с4 с5\n[2] старый чанк без разметки\n[3] с8 с9"
+    assert packed.sources == [
+        ("запись.wav", "00:10 - 01:00"),
+        ("старое.wav", "00:05 - 00:09"),
+        ("запись.wav", "01:01:40 - 01:02:00"),
+    ]
+    assert packed.tokens == 9
+    assert packed.chunks == chunks                  # все чанки попали, в порядке выдачи
+
+    small = packer.pack(chunks, max_tokens=5)       # второй отрезок не влез, третий короче — влез
+    assert small.text == "[1] с3 с4 с5\n[2] с8 с9"
+    assert small.chunks == [chunks[0], chunks[1], chunks[3]]
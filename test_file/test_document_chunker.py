@@ -0,0 +1,31 @@
+from langchain_core.documents import Document
+
+from prep.rag_documetn_chunker.document_chunker import DocumentChunker
+
+
+def _docs(sizes):
+    return [
+        Document(page_content=" ".join(["слово"] * n), metadata={"audio_title": "/data/a.wav", "start": float(i), "end": i + 0.5, "segment_index": i})
+        for i, n in enumerate(sizes)
+    ]
+
+
+def _word_counter(texts):
+    return [len(t.split()) for t in texts]
+
+
+def test_token_windows_respect_budget_and_overlap():
+    chunker = DocumentChunker(max_tokens=100, overlap_tokens=35, token_counter=_word_counter)
+    chunks = chunker.chunk(_docs([10, 600, 20, 30, 40, 50, 5]))
+
+    # сегмент длиннее бюджета — отдельный чанк, остальные не выходят за 100 токенов
+    assert [c.metadata["segment_indices"] for c in chunks] == ["[0]", "[1]", "[2, 3, 4]", "[5, 6]"]
+    assert chunks[0].metadata["audio_title"] == "a.wav"
+
+
+def test_stream_matches_batch():
+    docs = _docs([12, 40, 7, 33, 60, 8, 21, 90, 4, 15, 27])
+    for kwargs in ({}, {"max_tokens": 64, "overlap_tokens": 20, "token_counter": _word_counter}):
+        batch = DocumentChunker(**kwargs).chunk(docs)
+        streamed = list(DocumentChunker(**kwargs).chunk_stream(iter(docs)))
+        assert [(c.page_content, c.metadata) for c in streamed] == [(c.page_content, c.metadata) for c in batch]
@@ -0,0 +1,67 @@
+import io
+import struct
+import zlib
+
+import pytest
+
+docx = pytest.importorskip("docx")
+
+from prep.razdel.docx_stream import iter_elements_with_images
+
+
+def make_png(seed, size=8):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    row = b"\x00" + bytes((seed + x) % 256 for x in range(size * 3))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * size)) + chunk(b"IEND", b""))
+
+
+def test_stream_yields_text_tables_and_inline_images_in_order(tmp_path):
+    doc = docx.Document()
+    doc.add_paragraph("Введение")
+    doc.add_picture(io.BytesIO(make_png(1)))
+    doc.add_paragraph("")
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "Счёт"
+    table.cell(0, 1).text = "60.01"
+    doc.add_paragraph("Заключение")
+    path = tmp_path / "doc.docx"
+    doc.save(path)
+
+    elements = list(iter_elements_with_images(path))
+    assert [e["type"] for e in elements] == ["text", "image", "text", "text"]
+    assert elements[1]["blob"] == make_png(1) and elements[1]["ext"] == "png"
+    assert elements[2]["text"] == "Счёт 60.01"
+    assert elements[3]["text"] == "Заключение"
+    assert list(iter_elements_with_images(path, images=False)) == [e for e in elements if e["type"] == "text"]
+
+
+def test_alternate_content_picture_and_textbox_yielded_once(tmp_path):
+    from copy import deepcopy
+    from docx.oxml import parse_xml
+
+    doc = docx.Document()
+    doc.add_picture(io.BytesIO(make_png(2)))
+    run = doc.paragraphs[-1].runs[0]._r
+    drawing = run[-1]
+    rid = drawing.xpath(".//a:blip/@r:embed")[0]
+    # как сохраняет Word: DrawingML с надписью в mc:Choice и та же картинка в VML в mc:Fallback
+    alternate = parse_xml(
+        '<mc:AlternateContent xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006" '
+        'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+        'xmlns:v="urn:schemas-microsoft-com:vml" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<mc:Choice Requires="wps"><w:t>Надпись</w:t></mc:Choice>'
+        f'<mc:Fallback><w:pict><v:shape><v:imagedata r:id="{rid}"/></v:shape>'
+        '<w:t>Надпись</w:t></w:pict></mc:Fallback>'
+        '</mc:AlternateContent>'
+    )
+    alternate[0].insert(0, deepcopy(drawing))
+    run.replace(drawing, alternate)
+    path = tmp_path / "alt.docx"
+    doc.save(path)
+
+    elements = list(iter_elements_with_images(path))
+    assert [e["type"] for e in elements] == ["text", "image"]
+    assert elements[0]["text"] == "Надпись" and elements[1]["blob"] == make_png(2)
@@ -25,18 +25,18 @@ def test_full_pipeline_with_mains(sample_audio_path, tmp_chroma_dir, tmp_path):
     assert "audio_title" in docs[0].metadata
     assert isinstance(docs[0].metadata["start"], float)
 
-    # 2) Чанкинг → chunks.pkl
-    chunks, out_pkl = run_chunker(docs=docs, out_pkl=str(tmp_path / "chunks.pkl"))
+    # 2) Чанкинг → chunks.jsonl (+ индекс .idx)
+    chunks, out_path = run_chunker(docs=docs, out_path=str(tmp_path / "chunks.jsonl"))
     logging.info(f"[Stage 2] Chunking completed")
     logging.info(f"  - Chunks count: {len(chunks)}")
-    logging.info(f"  - Saved to: {out_pkl}")
+    logging.info(f"  - Saved to: {out_path}")
 
     assert chunks and len(chunks) > 0
-    assert os.path.isfile(out_pkl)
+    assert os.path.isfile(out_path)
 
     # 3) Индексация → ChromaDB (persist в tmp_chroma_dir), манифест
     tmp_chroma_dir: str = "/Users/dmitriy.grishaev/Documents/Разработка/files/ChromaDB_season2"
-    manifest = run_index(docs_pkl=out_pkl, persist_dir=tmp_chroma_dir, collection="test_audio_chunks")
+    manifest = run_index(chunks_path=out_path, persist_dir=tmp_chroma_dir, collection="test_audio_chunks")
     logging.info(f"[Stage 3] Indexing completed")
     logging.info(f"  - Indexed chunks: {manifest['count_indexed']}")
     logging.info(f"  - Persist dir: {tmp_chroma_dir}")
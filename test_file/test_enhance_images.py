@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+pytest.importorskip("RealESRGAN")
+Image = pytest.importorskip("PIL.Image")
+
+from prep.image_enhancement import enhance_images
+
+
+class _StubESRGAN:
+    """Без весов: сеть не вызывается, _infer подменяется в тесте."""
+
+    class _Net:
+        def to(self, device):
+            return self
+
+        def eval(self):
+            return self
+
+        def half(self):
+            return self
+
+    def __init__(self, device, scale):
+        self.model = self._Net()
+
+    def load_weights(self, path, download=True):
+        pass
+
+
+def _enhancer(tmp_path, monkeypatch, **kwargs):
+    monkeypatch.setattr(enhance_images, "RealESRGAN", _StubESRGAN)
+    enhancer = enhance_images.ImageEnhancer(str(tmp_path / "up"), str(tmp_path / "res"), scale=2, **kwargs)
+    enhancer._infer = lambda patches: [p.repeat(2, axis=0).repeat(2, axis=1) for p in patches]
+    return enhancer
+
+
+def _images(tmp_path, n, size):
+    (tmp_path / "up").mkdir()
+    for i in range(n):
+        Image.fromarray(np.full((size, size, 3), 30 * i, np.uint8)).save(tmp_path / "up" / f"{i}.png")
+
+
+def _run(enhancer, timeout=20):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(enhancer.enhance_all()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "enhance_all завис"
+    return result
+
+
+def test_batch_larger_than_tiles_in_flight_does_not_hang(tmp_path, monkeypatch):
+    # по тайлу на картинку, MAX_INFLIGHT=4 картинки в памяти — неполный батч из 8 не набирается
+    _images(tmp_path, 7, 64)
+    enhancer = _enhancer(tmp_path, monkeypatch, tile_size=96, tile_overlap=8, batch_size=8)
+    assert 8 > enhancer.MAX_INFLIGHT * sum(1 for _ in enhancer._tiles(64, 64))
+
+    summary = _run(enhancer)
+    assert (summary["enhanced"], summary["failed"]) == (7, 0)
+    out = np.asarray(Image.open(tmp_path / "res" / "6.png"))
+    assert out.shape == (128, 128, 3) and (out == 180).all()
+    assert _run(enhancer)["skipped"] == 7          # манифест сохранён — второй запуск ничего не считает
+
+
+def test_failed_batch_fails_only_its_images(tmp_path, monkeypatch):
+    _images(tmp_path, 5, 64)
+    enhancer = _enhancer(tmp_path, monkeypatch, tile_size=96, tile_overlap=8, batch_size=2)
+    infer, calls = enhancer._infer, []
+
+    def flaky(patches):
+        calls.append(len(patches))
+        if len(calls) == 2:
+            raise RuntimeError("CUDA out of memory")
+        return infer(patches)
+
+    enhancer._infer = flaky
+    summary = _run(enhancer)
+    assert (summary["enhanced"], summary["failed"]) == (3, 2)    # во втором батче — две картинки
+    assert _run(enhancer)["skipped"] == 3
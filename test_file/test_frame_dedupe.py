@@ -0,0 +1,39 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from prep.create_file.frame_dedupe import FrameDeduper
+
+
+def _screen(seed):
+    rng = np.random.default_rng(seed)
+    img = np.full((720, 1280, 3), 235, dtype=np.uint8)
+    for _ in range(30):
+        x, y = int(rng.integers(0, 1200)), int(rng.integers(0, 680))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(img, (x, y), (x + int(rng.integers(40, 300)), y + int(rng.integers(10, 90))), color, -1)
+    return img
+
+
+def test_near_duplicates_collapse_and_reuse_one_image():
+    rng = np.random.default_rng(0)
+    frames = []
+    for seed in [1, 1, 2, 1]:
+        frame = _screen(seed)
+        x = int(rng.integers(0, 1200))
+        frame[300:316, x:x + 10] = 0      # курсор в разных местах
+        frames.append(frame)
+
+    deduper = FrameDeduper(drop_consecutive=True)
+    first, repeat, other, back = [deduper.add(f) for f in frames]
+    assert repeat is None            # тот же экран подряд — не вставляется
+    assert other != first
+    assert back is first             # возврат к экрану — те же байты, та же картинка в DOCX
+    assert cv2.imdecode(np.frombuffer(first, np.uint8), cv2.IMREAD_COLOR).shape[1] == deduper.width_px
+    assert (deduper.stats.unique, deduper.stats.dropped, deduper.stats.reused) == (2, 1, 1)
+
+    # по умолчанию (DOCX_DEDUPE=reuse) повтор подряд тоже вставляется — той же картинкой
+    reuse = FrameDeduper()
+    first, repeat = [reuse.add(f) for f in frames[:2]]
+    assert repeat is first and (reuse.stats.dropped, reuse.stats.reused) == (0, 1)
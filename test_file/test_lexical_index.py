@@ -0,0 +1,62 @@
+from prep.rag_llm.lexical_index import BM25Index
+
+
+def _index():
+    docs = [
+        "passage: настройка веб-сервиса в конфигурации",
+        "passage: проводки по счёту 60 в БИТ Финанс",
+        "passage: общие слова о настройке программы, настройке отчётов и настройке прав",
+        "passage: проводки",
+    ]
+    metas = [{"video_key": "a", "audio_title": f"{i}.wav", "start": float(i), "end": i + 1.0} for i in range(4)]
+    metas[3]["video_key"] = "b"
+    return BM25Index([f"c{i}" for i in range(4)], docs, metas)
+
+
+def _dense(*ids):
+    return [{"id": i, "text": i, "meta": {"score": 0.1 * n}} for n, i in enumerate(ids)]
+
+
+def test_tokenize_and_search():
+    assert BM25Index.tokenize("Проводками и НСИ в 1С") == ["провод", "нси", "1с"]
+
+    index = _index()
+    hits = index.search("Проводки БИТ", n=10)
+    assert [i for i, _ in hits] == [1, 3]            # «БИТ» есть только в первом
+    assert hits[0][1] > hits[1][1] > 0
+    assert index.search("проводки", n=10)[0][0] == 3  # короткий документ выше при том же tf
+    assert index.search("проводки", n=1) == index.search("проводки", n=10)[:1]
+    assert index.search("неизвестное слово", n=10) == []
+
+
+def test_fuse_dense_only_lexical_only_and_both():
+    index = _index()
+    # по словам ничего не найдено — порядок векторной выдачи
+    assert [c["id"] for c in index.fuse("zzz", _dense("c2", "c0"), n_results=5)] == ["c2", "c0"]
+
+    fused = index.fuse("проводки БИТ", _dense("c0", "c1"), n_results=3)
+    assert [c["id"] for c in fused] == ["c1", "c0", "c3"]   # c1 в обоих списках — первый
+    assert fused[0]["meta"]["score"] == 0.1                 # векторный чанк — как был
+    lexical_only = fused[2]
+    assert lexical_only["meta"]["score"] is None            # порог дистанции к нему не применяется
+    assert lexical_only["text"] == "passage: проводки"
+    assert lexical_only["meta"]["audio_title"] == "3.wav" and lexical_only["meta"]["start"] == 3.0
+
+
+def test_fuse_keep_filters_lexical_hits_only():
+    index = _index()
+    assert [c["id"] for c in index.fuse("проводки", _dense("c1", "c0"), n_results=5)] == ["c1", "c3", "c0"]
+    # c3 вне области (video_key=b) отброшен, хотя по BM25 он лучший
+    keep = lambda meta: meta.get("video_key") == "a"
+    assert [c["id"] for c in index.fuse("проводки", _dense("c1", "c0"), n_results=5, keep=keep)] == ["c1", "c0"]
+
+
+def test_from_collection_reads_all_pages(monkeypatch):
+    class _Collection:
+        def get(self, include, limit, offset):
+            ids = [f"c{i}" for i in range(offset, min(offset + limit, 5))]
+            return {"ids": ids, "documents": [f"текст {i}" for i in ids], "metadatas": [{} for _ in ids]}
+
+    monkeypatch.setattr(BM25Index, "PAGE", 2)
+    index = BM25Index.from_collection(_Collection())
+    assert len(index) == 5 and index.ids[-1] == "c4"
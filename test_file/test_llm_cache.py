@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+from prep.rag_llm.llm_cache import LLMCache, cache_key
+
+
+def test_key_covers_model_options_and_prompt():
+    key = cache_key("m", {"temperature": 0.1, "top_k": None}, "промпт")
+    assert key == cache_key("m", {"temperature": 0.1}, "промпт")
+    assert key != cache_key("m2", {"temperature": 0.1}, "промпт")
+    assert key != cache_key("m", {"temperature": 0.2}, "промпт")
+    assert key != cache_key("m", {"temperature": 0.1}, "промпт ")
+
+
+def test_roundtrip_persists_and_evicts_least_recently_used(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+    cache = LLMCache(path, max_bytes=10_000)
+    cache.put(cache_key("m", {}, "пусто"), "  ")           # пустой ответ не кешируется
+    for i in range(3):
+        cache.put(cache_key("m", {}, str(i)), f"ответ {i} " * 20)
+    assert cache.get(cache_key("m", {}, "пусто")) is None
+    assert LLMCache(path).get(cache_key("m", {}, "1")) == "ответ 1 " * 20
+
+    small = LLMCache(path, max_bytes=cache._total + 10)     # помещаются ровно три записи
+    small.get(cache_key("m", {}, "0"))                      # «0» использован последним — остаётся
+    small.put(cache_key("m", {}, "3"), "новый ответ " * 20)
+    assert small.get(cache_key("m", {}, "2")) is None       # давно не использованная — вытеснена
+    assert small.get(cache_key("m", {}, "0")) is not None
+    assert small.get(cache_key("m", {}, "3")) is not None
+    assert small._total <= small.max_bytes
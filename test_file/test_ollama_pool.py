@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from prep.rag_llm.ollama_pool import OllamaError, OllamaPool, OllamaText
+
+
+class _FakeOllama:
+    """Сервер /api/generate: запоминает запросы и максимум одновременных (свой и общий по всем серверам)."""
+
+    total = {"active": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def __init__(self, delay=0.05):
+        self.payloads = []
+        self.active = self.peak = 0
+        lock, total = self.lock, self.total
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with lock:
+                    fake.payloads.append(payload)
+                    fake.active += 1
+                    fake.peak = max(fake.peak, fake.active)
+                    total["active"] += 1
+                    total["peak"] = max(total["peak"], total["active"])
+                time.sleep(delay)
+                with lock:
+                    fake.active -= 1
+                    total["active"] -= 1
+                body = json.dumps({"response": "ответ: " + payload.get("prompt", "")}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def servers():
+    _FakeOllama.total.update(active=0, peak=0)
+    fakes = [_FakeOllama(), _FakeOllama()]
+    yield fakes
+    for fake in fakes:
+        fake.server.shutdown()
+
+
+def test_limits_and_least_loaded_routing(servers):
+    pool = OllamaPool([s.url for s in servers], model="m", keep_alive="10m", max_concurrency=3, endpoint_concurrency=2)
+    llm = OllamaText(pool, temperature=0.1, top_k=None)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        answers = list(executor.map(llm.invoke, [str(i) for i in range(12)]))
+
+    assert answers == [f"ответ: {i}" for i in range(12)]
+    assert all(s.peak <= 2 for s in servers)
+    assert _FakeOllama.total["peak"] <= 3
+    assert all(s.payloads for s in servers)          # нагрузка разошлась по обоим серверам
+    payload = servers[0].payloads[0]
+    assert payload["keep_alive"] == "10m" and payload["model"] == "m"
+    assert payload["options"] == {"temperature": 0.1}
+
+
+def test_unreachable_server_is_skipped(servers):
+    dead = "http://127.0.0.1:9"
+    pool = OllamaPool([dead, servers[0].url], model="m")
+    assert [pool.generate("x") for _ in range(3)] == ["ответ: x"] * 3
+    assert pool.endpoints[0].failed == 1              # после ошибки сервер в cooldown и не выбирается
+
+    with pytest.raises(OllamaError):
+        OllamaPool([dead], model="m").generate("x")
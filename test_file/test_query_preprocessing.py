@@ -0,0 +1,39 @@
+from prep.rag_llm.query_preprocessing import QueryEmbeddingCache, QueryPreprocessor
+
+
+class _CountingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return [float(len(text))]
+
+
+def test_normalization_glossary_and_prefix():
+    prep = QueryPreprocessor()
+    q = prep("Как настроить НСИ в «БИТ Финанс»?")
+    assert q.normalized == "как настроить нси в бит финанс"
+    assert q.terms == ["нси", "бит финанс"]
+    assert "нормативно-справочная информация" in q.expanded
+    assert q.text == "query: " + q.expanded
+    # обратное направление и отсутствие ложных совпадений внутри слов
+    assert "(осв)" in prep("Оборотно-сальдовая ведомость").expanded
+    assert prep("итоги по бит").terms == []
+
+
+def test_near_identical_questions_hit_cache():
+    prep, emb = QueryPreprocessor(), _CountingEmbeddings()
+    cache = QueryEmbeddingCache(emb, max_size=2)
+    for q in ["Где проводки?", "где  ПРОВОДКИ", "Где проводки"]:
+        cache.embed(prep(q).text)
+    assert len(emb.calls) == 1 and cache.hits == 2
+
+    cache.embed(prep("второй").text)
+    cache.embed(prep("третий").text)   # вытесняет самый старый
+    cache.embed(prep("где проводки").text)
+    assert len(emb.calls) == 4 and len(cache) == 2
+
+    cache.clear()                                    # eval_retrieval: замер без эмбеддингов прошлого прогона
+    cache.embed(prep("где проводки").text)
+    assert len(emb.calls) == 5 and len(cache) == 1
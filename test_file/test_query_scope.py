@@ -0,0 +1,85 @@
+import datetime
+
+import pytest
+
+from prep.rag_db.chunk_metadata import matches, source_metadata
+from prep.rag_llm.query_scope import QueryScope, parse_scoped_query
+
+
+def test_prefix_grammar():
+    question, scope = parse_scoped_query("[date:2025-03] [tag:#БИТ] [video:Инструкция по проводкам_PV.mp4] как провести?")
+    assert question == "как провести?"
+    assert (scope.date_from, scope.date_to) == (20250301, 20250331)
+    assert scope.tags == ["tag_бит"]
+    assert scope.video == "инструкция_по_проводкам"
+
+    _, scope = parse_scoped_query("[дата:2025-03-01..2025-03-15] вопрос")
+    assert (scope.date_from, scope.date_to) == (20250301, 20250315)
+    _, scope = parse_scoped_query("[date:2025-03-07] вопрос")
+    assert (scope.date_from, scope.date_to) == (20250307, 20250307)
+
+
+def test_mine_and_unknown_prefixes():
+    assert parse_scoped_query("[mine] вопрос", user_id=42)[1].uploader == "42"
+    assert parse_scoped_query("Только мои: вопрос", user_id=42) == ("вопрос", QueryScope(uploader="42"))
+    assert parse_scoped_query("[user:me] вопрос", user_id=7)[1].uploader == "7"
+
+    # без user_id «мои» не применяется и остаётся в вопросе
+    assert parse_scoped_query("[mine] вопрос") == ("[mine] вопрос", QueryScope())
+    # неизвестный префикс и неверная дата — часть вопроса, разбор на них останавливается
+    assert parse_scoped_query("[tag:бит] [foo:bar] вопрос") == ("[foo:bar] вопрос", QueryScope(tags=["tag_бит"]))
+    assert parse_scoped_query("[date:вчера] вопрос") == ("[date:вчера] вопрос", QueryScope())
+
+
+def _rows():
+    rows = []
+    for i, (day, uploader, tags, video) in enumerate([
+        (datetime.date(2025, 2, 28), "1", ["бит"], "Проводки_PV.mp4"),
+        (datetime.date(2025, 3, 1), "1", [], "Проводки_PV.mp4"),
+        (datetime.date(2025, 3, 15), "2", ["бит", "нси"], "НСИ.mp4"),
+        (datetime.date(2025, 3, 31), "2", ["нси"], "Проводки_PV.mp4"),
+        (datetime.date(2025, 4, 1), "1", ["бит"], "НСИ.mp4"),
+    ]):
+        meta = source_metadata(uploader=uploader, tags=tags, ingest_date=day)
+        meta["video_key"] = parse_scoped_query(f"[video:{video}] x")[1].video
+        rows.append((f"c{i}", meta))
+    return rows
+
+
+_QUERIES = [
+    "[date:2025-03] x",
+    "[date:2025-03-01..2025-03-15] [tag:бит] x",
+    "[mine] [video:Проводки] x",
+    "[tag:нси] [tag:бит] x",
+    "x",
+]
+
+
+def test_where_and_matches_agree():
+    rows = _rows()
+    expected = {
+        "[date:2025-03] x": {"c1", "c2", "c3"},
+        "[date:2025-03-01..2025-03-15] [tag:бит] x": {"c2"},
+        "[mine] [video:Проводки] x": {"c0", "c1"},
+        "[tag:нси] [tag:бит] x": {"c2"},
+        "x": {"c0", "c1", "c2", "c3", "c4"},
+    }
+    for query in _QUERIES:
+        where = parse_scoped_query(query, user_id=1)[1].to_where()
+        assert {cid for cid, meta in rows if matches(meta, where)} == expected[query], query
+
+
+def test_chroma_where_agrees_with_matches():
+    chromadb = pytest.importorskip("chromadb")
+    rows = _rows()
+    collection = chromadb.EphemeralClient().create_collection("scope_test")
+    collection.add(
+        ids=[cid for cid, _ in rows],
+        embeddings=[[float(i), 1.0] for i in range(len(rows))],
+        metadatas=[meta for _, meta in rows],
+        documents=[cid for cid, _ in rows],
+    )
+    for query in _QUERIES:
+        where = parse_scoped_query(query, user_id=1)[1].to_where()
+        found = set(collection.get(where=where)["ids"]) if where else set(collection.get()["ids"])
+        assert found == {cid for cid, meta in rows if matches(meta, where)}, query
@@ -0,0 +1,48 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_huggingface")
+
+from prep.rag_db.rag_index_to_chroma_db import RagIndexer
+
+
+def _readers_alive():
+    return [t for t in threading.enumerate() if t.name == "rag-prefetch"]
+
+
+def _wait_readers_gone(timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while _readers_alive() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not _readers_alive()
+
+
+def test_prefetch_keeps_order_and_reraises_reader_error():
+    assert list(RagIndexer.prefetch(iter([[1], [2], [3]]), depth=1)) == [[1], [2], [3]]
+
+    def broken():
+        yield [1]
+        raise OSError("файл чанков оборван")
+
+    with pytest.raises(OSError):
+        list(RagIndexer.prefetch(broken(), depth=1))
+    assert _wait_readers_gone()
+
+
+def test_prefetch_reader_exits_when_consumer_stops_with_full_queue():
+    def broken():
+        yield [1]
+        yield [2]
+        raise OSError("файл чанков оборван")
+
+    # потребитель остановился (ошибка индексации), пока очередь полна:
+    # поток чтения не должен навсегда зависнуть на put конца или ошибки
+    for batches in (iter([[1], [2]]), broken()):
+        gen = RagIndexer.prefetch(batches, depth=1)
+        assert next(gen) == [1]
+        time.sleep(0.2)             # [2] в очереди, поток ждёт места для конца / ошибки
+        gen.close()
+        assert _wait_readers_gone()
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from prep.rag_documetn_chunker.document_chunker import approx_token_count
+from prep.rag_llm.reranker import CrossEncoderReranker
+
+
+class _SlowModel:
+    """Оценка — число в начале текста чанка; ms_per_pair мс на пару, как у модели на CPU."""
+
+    def __init__(self, ms_per_pair):
+        self.ms_per_pair = ms_per_pair
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        time.sleep(self.ms_per_pair * len(pairs) / 1000)
+        return [float(text.split()[0]) for _, text in pairs]
+
+
+@pytest.fixture
+def reranker(monkeypatch):
+    def make(ms_per_pair=0.0, **kwargs):
+        monkeypatch.setitem(CrossEncoderReranker._models, "stub", _SlowModel(ms_per_pair))
+        return CrossEncoderReranker(model_name="stub", **kwargs)
+    return make
+
+
+def _chunks(*texts):
+    return [{"id": f"c{i}", "text": "passage: " + t, "meta": {}} for i, t in enumerate(texts)]
+
+
+def test_candidates_follow_time_budget_within_limits(reranker):
+    r = reranker(budget_ms=100, candidates=20)
+    r._adapt(200, 20)                       # 10 мс на кандидата — в бюджет влезает 10
+    assert r.candidates == 10
+    r._adapt(20, 20)                        # скользящее среднее: 10 + 0.3 * (1 - 10) = 7.3 мс
+    assert r.candidates == int(100 / 7.3)
+    r._adapt(1e6, 1)
+    assert r.candidates == CrossEncoderReranker.MIN_CANDIDATES
+    fast = reranker(budget_ms=100, candidates=20)
+    fast._adapt(0.1, 100)
+    assert fast.candidates == CrossEncoderReranker.MAX_CANDIDATES
+    assert reranker(candidates=1000).candidates == CrossEncoderReranker.MAX_CANDIDATES
+
+
+def test_slow_model_shrinks_candidates(reranker):
+    r = reranker(ms_per_pair=10, budget_ms=100, candidates=40)
+    ranked = r.rerank("вопрос", _chunks(*[f"{i} текст" for i in range(20)]))
+    assert [ch["meta"]["rerank_score"] for ch in ranked] == [float(i) for i in range(19, -1, -1)]
+    assert r.last_ms >= 200
+    assert CrossEncoderReranker.MIN_CANDIDATES <= r.candidates <= 10      # было 40
+
+
+def test_select_respects_top_k_and_token_budget(reranker):
+    r = reranker()
+    texts = ["3 " + "слово " * 30, "2 " + "слово " * 10, "1 коротко", "0 " + "слово " * 10]
+    sizes = approx_token_count(texts)
+
+    assert [ch["id"] for ch in r.select("вопрос", _chunks(*texts), top_k=2, max_tokens=10_000)] == ["c0", "c1"]
+    # второй по оценке не влезает в бюджет — пропускается, следующий короче — берётся
+    selected = r.select("вопрос", _chunks(*texts), top_k=0, max_tokens=sizes[0] + sizes[2])
+    assert [ch["id"] for ch in selected] == ["c0", "c2"]
+    # лучший чанк берётся, даже если один превышает бюджет
+    assert [ch["id"] for ch in r.select("вопрос", _chunks(*texts), top_k=3, max_tokens=1)] == ["c0"]
@@ -0,0 +1,41 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from prep.create_file.scene_detection import change_scores, find_changes, select_screenshots
+
+
+def _recording(rng, fps=2.0):
+    """20 с «записи экрана»: курсор всё время, новое окно на 5 с, мелкая правка на 12 с."""
+    screen = np.full((90, 160), 200, dtype=np.uint8)
+    frames = []
+    for i in range(int(20 * fps)):
+        t = i / fps
+        if t >= 5.0:
+            screen[10:80, 20:140] = 60            # открылась форма — ~58% кадра
+        if t >= 12.0:
+            screen[40:44, 30:60] = 0              # ввели значение в поле — <1%
+        frame = screen.copy()
+        x = int(rng.integers(0, 150))
+        frame[5:9, x:x + 4] = 255                 # курсор
+        frames.append(frame)
+    return iter(frames)
+
+
+def test_scene_changes_drive_screenshot_choice():
+    scores = change_scores(_recording(np.random.default_rng(0)), chunk=7)
+    assert scores.shape == (40,)
+    changes = find_changes(scores)
+    assert [c.time for c in changes] == [5.0, 12.0]
+    assert changes[0].score > 0.5 and changes[1].score < 0.08
+
+    asked = []
+    paragraph_ends = [3.0, 8.0, 10.0, 13.0, 20.0]
+    selected, stats = select_screenshots(paragraph_ends, changes, is_required=lambda idx: asked.append(idx) or True)
+    # форма — без LLM, правка поля — спросили LLM, абзацы без смен — без скриншота
+    assert selected == {2: 8.0, 4: 13.0}
+    assert asked == [4]
+    assert stats == {"scene": 1, "llm": 1, "skipped": 3}
+
+    selected, _ = select_screenshots([5.2], changes)
+    assert selected == {1: 5.5}    # не на самом переходе, а после него
@@ -0,0 +1,23 @@
+import json
+import re
+
+from prep.razdel.sectioning import Sectioner
+
+
+def test_windows_are_merged_into_contiguous_sections():
+    # 120 блоков, новый раздел каждые 20; модель ещё и считает началом первый блок каждого окна
+    blocks = [f"Тема {i // 20}: " + "слово " * 40 for i in range(120)]
+    windows_seen = []
+
+    def fake_llm(prompt):
+        ids = [int(x) for x in re.findall(r"Блок (\d+):", prompt)]
+        windows_seen.append((ids[0], ids[-1]))
+        starts = [ids[0]] + [i for i in ids if i % 20 == 0]
+        return json.dumps([{"start_block": i, "title": f"Раздел {i // 20}"} for i in starts], ensure_ascii=False)
+
+    sections = Sectioner(fake_llm, window_tokens=1000, overlap_blocks=2).section(blocks)
+
+    assert len(windows_seen) > 3
+    assert [s["start_block"] for s in sections] == [0, 20, 40, 60, 80, 100]
+    assert sections[0] == {"start_block": 0, "end_block": 19, "title": "Раздел 0"}
+    assert sections[-1]["end_block"] == 119
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+
+from prep.text_modifier import text_modifier
+
+
+class _FakeLLM:
+    """Ответ — текст абзаца заглавными; fail — всегда ошибка, flaky — пустой ответ, потом ошибка, потом успех."""
+
+    def __init__(self):
+        self.calls = []
+        self.active = self.peak = 0
+        self._lock = threading.Lock()
+        self._flaky = iter(["", RuntimeError("сервер занят")])
+
+    @staticmethod
+    def _text(prompt):
+        return prompt.rsplit("Вот текст для улучшения: ", 1)[1]
+
+    def cached(self, prompt):
+        return "ИЗ КЕША" if self._text(prompt) == "кеш" else None
+
+    def invoke(self, prompt):
+        text = self._text(prompt)
+        with self._lock:
+            self.calls.append(text)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(0.05 if text == "абзац 0" else 0.01)   # первый абзац отвечает последним
+            if text == "fail":
+                raise RuntimeError("модель недоступна")
+            if text == "flaky":
+                with self._lock:
+                    step = next(self._flaky, None)
+                if isinstance(step, Exception):
+                    raise step
+                if step is not None:
+                    return step
+            return text.upper()
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_improve_texts_parallel_ordered_retried_and_fallback(monkeypatch):
+    llm = _FakeLLM()
+    monkeypatch.setattr(text_modifier, "get_llm", lambda *args, **kwargs: llm)
+    monkeypatch.setattr(text_modifier.TextModify, "RETRY_DELAY", 0)
+    modifier = text_modifier.TextModify(concurrency=3, retries=2, cache=False)
+
+    paragraphs = ["абзац 0", "абзац 1", "   ", "кеш", "flaky", "абзац 1", "fail", "абзац 2", "абзац 3"]
+    # порядок исходный; «flaky» поправлен с третьей попытки, «fail» остался как был
+    assert modifier.improve_texts(paragraphs) == [
+        "АБЗАЦ 0", "АБЗАЦ 1", "   ", "ИЗ КЕША", "FLAKY", "АБЗАЦ 1", "fail", "АБЗАЦ 2", "АБЗАЦ 3",
+    ]
+    # повтор «абзац 1» и абзац из кеша к модели не уходят, пустой — тоже
+    assert sorted(set(llm.calls)) == ["fail", "flaky", "абзац 0", "абзац 1", "абзац 2", "абзац 3"]
+    assert llm.calls.count("абзац 1") == 1
+    assert llm.calls.count("flaky") == 3 and llm.calls.count("fail") == 3   # попытка + два повтора
+    assert 1 < llm.peak <= 3
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from prep.transcription_audio.transcript_store import TranscriptStore, TranscriptStoreWriter
+from prep.transcription_audio import transcript_io
+from prep.transcription_audio.transcript_io import TranscriptJsonWriter, iter_segments, read_audio_file, read_full_text
+
+
+def _sample_result():
+    segments = []
+    for i in range(20):
+        t = i * 2.0
+        words = [
+            {"word": f" слово{j}", "start": t + j * 0.3, "end": t + j * 0.3 + 0.2, "probability": 0.5 + j / 10}
+            for j in range(4)
+        ]
+        if i == 5:  # HF-бэкенд не отдаёт probability
+            words = [{"word": "ок", "start": t, "end": t + 0.4}]
+        segments.append({"id": i, "start": t, "end": t + 1.5, "text": "".join(w["word"] for w in words).strip(), "words": words})
+    return {"full_text": "Полный текст.", "segments": segments, "audio_file": "/data/запись.wav"}
+
+
+def test_roundtrip_matches_json(tmp_path):
+    result = _sample_result()
+    path = TranscriptStore.write(str(tmp_path / "t.tsb"), result)
+
+    with TranscriptStore(path) as store:
+        assert store.to_dict() == result
+        assert len(store) == 20
+        assert store.n_words == 19 * 4 + 1
+
+    json_path = tmp_path / "t.json"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    assert list(iter_segments(path)) == list(iter_segments(str(json_path)))
+    assert read_full_text(path) == "Полный текст."
+
+
+def test_time_range_access(tmp_path):
+    path = TranscriptStore.write(str(tmp_path / "t.tsb"), _sample_result())
+
+    with TranscriptStore(path) as store:
+        assert [s["id"] for s in store.segments_in_range(5.0, 9.0, with_words=False)] == [2, 3, 4]
+        assert "words" not in store.segment(0, with_words=False)
+        assert [w["start"] for w in store.words_in_range(6.0, 6.5)] == [6.0, 6.3]
+
+
+def test_empty_transcript(tmp_path):
+    path = TranscriptStore.write(str(tmp_path / "e.tsb"), {"segments": []})
+
+    with TranscriptStore(path) as store:
+        assert store.to_dict() == {"full_text": "", "segments": [], "audio_file": ""}
+        assert list(store.segments_in_range(0.0, 10.0)) == []
+
+
+def test_streaming_writers_match_whole_write(tmp_path):
+    result = _sample_result()
+    tsb, js = str(tmp_path / "s.tsb"), str(tmp_path / "s.json")
+    with TranscriptStoreWriter(tsb, result["audio_file"]) as store_writer, \
+            TranscriptJsonWriter(js, result["audio_file"]) as json_writer:
+        for part, text in [(result["segments"][:7], "Полный"), (result["segments"][7:], "текст.")]:
+            for writer in (store_writer, json_writer):
+                writer.add_text(text)
+                writer.add_segments(part)
+
+    with TranscriptStore(tsb) as store:
+        assert store.to_dict() == result
+    with open(js, encoding="utf-8") as f:
+        assert json.load(f) == result
+
+
+def test_failed_stream_leaves_no_file(tmp_path):
+    path = tmp_path / "f.tsb"
+    try:
+        with TranscriptStoreWriter(str(path)) as writer:
+            writer.add_segments(_sample_result()["segments"][:3])
+            raise RuntimeError("часть не распознана")
+    except RuntimeError:
+        pass
+    assert not path.exists()
+
+
+def test_json_read_without_loading_whole_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcript_io, "READ_CHUNK", 64)   # сегменты длиннее буфера — дочитываются
+    result = _sample_result()
+    ordered = {"audio_file": result["audio_file"], "segments": result["segments"], "full_text": result["full_text"]}
+    for name, indent in [("stream.json", None), ("pretty.json", 2)]:
+        path = str(tmp_path / name)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(ordered, f, ensure_ascii=False, indent=indent)
+        assert read_audio_file(path) == "/data/запись.wav"
+        assert list(iter_segments(path)) == result["segments"]
+
+    # .jsonl без заголовка — путь к аудио из соседнего .tsb
+    TranscriptStore.write(str(tmp_path / "stream.tsb"), result)
+    (tmp_path / "stream.jsonl").write_text("", encoding="utf-8")
+    assert read_audio_file(str(tmp_path / "stream.jsonl")) == "/data/запись.wav"
+    assert read_audio_file(str(tmp_path / "other.jsonl")) == ""
+
+    with open(tmp_path / "cut.json", "w", encoding="utf-8") as f:
+        f.write(json.dumps(ordered, ensure_ascii=False)[:500])
+    with pytest.raises(ValueError):
+        list(iter_segments(str(tmp_path / "cut.json")))
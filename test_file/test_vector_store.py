@@ -0,0 +1,74 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("hnswlib")
+
+from prep.rag_db.vector_store import HnswBackend
+
+
+def _unit(rng, n, dim=16):
+    v = rng.standard_normal((n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def test_hnsw_upsert_query_filter_delete_and_reopen(tmp_path):
+    rng = np.random.default_rng(0)
+    vecs = _unit(rng, 50)
+    ids = [f"c{i}" for i in range(50)]
+    metas = [{"video_key": "a" if i % 2 else "b", "start": float(i)} for i in range(50)]
+    docs = [f"passage: чанк {i}" for i in range(50)]
+
+    store = HnswBackend(str(tmp_path)).get_or_create("audio_chunks")
+    store.upsert(ids, vecs, metas, docs)
+    assert store.count() == 50
+
+    res = store.query(vecs[3], n_results=5)
+    assert res["ids"][0] == "c3" and res["distances"][0] == pytest.approx(0.0, abs=1e-4)
+    assert res["documents"][0] == "passage: чанк 3"
+
+    # фильтр и запрос больше, чем подходит записей
+    res = store.query(vecs[3], n_results=40, where={"video_key": "b"})
+    assert len(res["ids"]) == 25 and all(m["video_key"] == "b" for m in res["metadatas"])
+    store.EXACT_SUBSET = 0   # тот же фильтр через обход графа
+    store._subsets.clear()
+    assert store.query(vecs[3], n_results=40, where={"video_key": "b"})["ids"] == res["ids"]
+
+    # upsert существующего id заменяет запись, delete убирает из выдачи
+    store.upsert(["c3"], vecs[4:5], [{"video_key": "a", "start": 3.0}], ["новый"])
+    store.delete(["c4"])
+    assert store.count() == 49
+    store.persist()
+    store.delete(["c5"])   # после persist — только в журнале
+    store._log.flush()
+
+    reopened = HnswBackend(str(tmp_path)).get("audio_chunks")
+    assert reopened.count() == 48
+    res = reopened.query(vecs[4], n_results=3)
+    assert res["ids"][0] == "c3" and res["documents"][0] == "новый"
+    assert "c4" not in res["ids"] and "c5" not in reopened.query(vecs[5], n_results=5)["ids"]
+
+    page = reopened.get(include=("embeddings", "metadatas"), limit=10, offset=40)
+    assert len(page["ids"]) == 8 and len(page["embeddings"][0]) == 16
+
+
+def test_hnsw_missing_collection(tmp_path):
+    with pytest.raises(KeyError):
+        HnswBackend(str(tmp_path)).get("nope")
+
+
+def test_hnsw_reader_sees_chunks_persisted_by_another_backend(tmp_path):
+    rng = np.random.default_rng(1)
+    vecs = _unit(rng, 20)
+    writer = HnswBackend(str(tmp_path)).get_or_create("audio_chunks")
+    writer.upsert([f"c{i}" for i in range(10)], vecs[:10], [{}] * 10, ["d"] * 10)
+    writer.persist()
+
+    reader = HnswBackend(str(tmp_path)).get("audio_chunks")   # как бот: свой бэкенд, коллекция закеширована
+    assert reader.count() == 10
+
+    writer.upsert([f"c{i}" for i in range(10, 20)], vecs[10:], [{}] * 10, ["d"] * 10)
+    writer.delete(["c0"])
+    assert reader.count() == 10                                 # до persist() изменений не видно
+    writer.persist()
+    assert reader.count() == 19
+    assert reader.query(vecs[15], n_results=1)["ids"] == ["c15"]